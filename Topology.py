@@ -1,52 +1,130 @@
 import argparse
 import os
-import subprocess
-import sys
-import time
-import threading
 import random
+from bringup import BringupTimer, ContainerPool
+from capture import CaptureManager
 from comnetsemu.cli import CLI, spawnXtermDocker
-from comnetsemu.net import Containernet, VNFManager
-from mininet.link import TCLink
+from event_journal import EventJournal
+from host_exec import HostExecutor
+from link_scheduler import LinkScheduler, random_schedule, trace_schedule
+from link_shaping import LinkShaper
+from link_telemetry import TelemetrySampler, telemetry_cli
 from mininet.log import info, setLogLevel
-from mininet.node import Controller
-
-def add_streaming_container(manager, name, role, image, shared_dir):
-    return manager.addContainer(
-        name, role, image, '', docker_args={
-            'volumes': {
-                shared_dir: {'bind': '/home/pcap/', 'mode': 'rw'}
-            }
-        }
-    )
-
-def start_server():
-    subprocess.run(['docker', 'exec', '-it', 'streaming_server', 'bash', '-c', 'cd /home && python3 video_streaming2.py'])
-
-def start_client():
-    subprocess.run(['docker', 'exec', '-it', 'streaming_client', 'bash', '-c', 'cd /home && python3 get_video_streamed2.py'])
+from run_registry import RunRegistry
+from topology_spec import build_network, load_spec, spec_path
+from traffic_engine import TrafficEngine
+
+# Runs every command of the experiment as its own process, without blocking on host shells
+executor = HostExecutor()
+
+# Typed run events on the capture clock, written in the background to pcap/events.jsonl
+journal = EventJournal()
+
+def docker_exec(container, command):
+    # No TTY: the command runs detached from our terminal, its output still goes to it
+    return executor.run(None, ['docker', 'exec', container, 'bash', '-c', command], capture=False, label=container)
+
+def stream_names(streams=1, ladder=None):
+    # Same names as server/video_streaming2.py publishes
+    if ladder:
+        return [f'video_{item.split(":")[0]}.flv' for item in ladder.split(',')]
+    return ['video.flv'] if streams == 1 else [f'video_{i}.flv' for i in range(1, streams + 1)]
+
+def start_server(container='streaming_server', duration=600, streams=1, ladder=None, viewers=1):
+    options = f'--duration {duration} --streams {streams} --viewers {viewers}'
+    if ladder:
+        options += f' --ladder {ladder}'
+    journal.record('streaming_server_start', container=container, duration=duration, streams=streams,
+                   ladder=ladder, viewers=viewers)
+    return docker_exec(container, f'cd /home && python3 video_streaming2.py {options}')
+
+def start_client(container='streaming_client', duration=600, viewers=1, streams=('video.flv',), ramp=0, output=None):
+    options = f'--duration {duration} --viewers {viewers} --streams {",".join(streams)} --ramp {ramp}'
+    if output:
+        options += f' --output {output}'
+    journal.record('streaming_client_start', container=container, duration=duration, viewers=viewers,
+                   streams=list(streams), output=output)
+    return docker_exec(container, f'cd /home && python3 get_video_streamed2.py {options}')
+
+# Supervises the iperf flows and collects their reports
+traffic = TrafficEngine(executor)
 
 def start_iperf_server(host):
-    host.cmd('iperf -s -p 5001 -u &')
+    return traffic.iperf_server(host, port=5001, udp=True)
 
-def start_iperf_client(host):
-    host.cmd('iperf -c 10.0.0.6 -p 5001 -u -b 5M -t 120 &')
+def start_iperf_client(host, target):
+    flow = traffic.iperf_client(host, target, port=5001, udp=True, bandwidth='5M', duration=120)
+    journal.record('iperf_start', flow=traffic.flows[flow].label, host=host.name, target=target)
+    return flow
 
-def start_iperf_client2(host):
-    host.cmd('iperf -c 10.0.0.8 -p 5001 -u -b 5M -t 120 &')
+def stop_iperf_client(flow):
+    journal.record('iperf_stop', flow=traffic.flows[flow].label, host=traffic.flows[flow].host.name)
+    traffic.stop_flow(flow)
 
-def stop_iperf_client(host):
-    host.cmd('pkill iperf')
+# Keeps the qdisc state of the shaped links so changes only touch what differs
+shaper = LinkShaper()
 
 def change_link_properties(link, bw, delay, jitter=0, loss=0):
     info(f'*** Changing link properties: BW={bw} Mbps, Delay={delay} ms, Jitter={jitter} ms, Loss={loss}%\n')
-    link.intf1.config(bw=bw, delay=f'{delay}ms', jitter=f'{jitter}ms', loss=loss)
-    link.intf2.config(bw=bw, delay=f'{delay}ms', jitter=f'{jitter}ms', loss=loss)
+    shaper.change(link, bw=bw, delay=delay, jitter=jitter, loss=loss)
+    journal.record('link_change', intf=link.intf1.name, bw=bw, delay=delay, jitter=jitter, loss=loss)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Video streaming application with dynamic bandwidth and delay.')
     parser.add_argument('--autotest', dest='autotest', action='store_const', const=True, default=False,
                         help='Enables automatic testing of the topology and closes the streaming application.')
+    parser.add_argument('--spec', default='topology',
+                        help='Topology spec name in specs/ or path to a spec file (default: topology).')
+    parser.add_argument('--prefix', default='',
+                        help='Prefix for node and container names, to run several networks side by side.')
+    parser.add_argument('--run-id', default=None,
+                        help='Name under which the resources of this run are recorded for teardown '
+                             '(default: run-<pid>).')
+    parser.add_argument('--controller-port', type=int, default=None,
+                        help='OpenFlow port of the controller (default: Mininet default).')
+    parser.add_argument('--shared-dir', default=None,
+                        help='Directory for pcaps and results, mounted in the containers (default: ./pcap).')
+    parser.add_argument('--duration', type=int, default=600,
+                        help='Streaming duration in seconds (default: 600).')
+    parser.add_argument('--streams', type=int, default=1,
+                        help='Independent video streams published by the server (default: 1).')
+    parser.add_argument('--ladder', nargs='?', const='720p:720:2500,480p:480:1000,360p:360:600,240p:240:300',
+                        default=None, help="Publish an ABR rendition ladder 'name:height:kbps,...' instead.")
+    parser.add_argument('--viewers', type=int, default=1,
+                        help='Concurrent viewers in the streaming client container (default: 1).')
+    parser.add_argument('--viewer-ramp', type=float, default=10,
+                        help='Seconds over which the viewers join (default: 10).')
+    parser.add_argument('--client-output', choices=['file', 'null', 'frames'], default=None,
+                        help='What the viewers do with the stream: save it, discard it, or only log '
+                             'per-frame metadata to pcap/frames_*.bin (default: file for one viewer).')
+    parser.add_argument('--bw', type=float, default=None,
+                        help='Fixed middle-link bandwidth in Mbit/s; with --delay, replaces the dynamic changes.')
+    parser.add_argument('--delay', type=float, default=None, help='Fixed middle-link delay in ms.')
+    parser.add_argument('--jitter', type=float, default=0, help='Fixed middle-link jitter in ms (default: 0).')
+    parser.add_argument('--loss', type=float, default=0, help='Fixed middle-link loss in percent (default: 0).')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Maximum number of Docker hosts/containers created concurrently (default: 4).')
+    parser.add_argument('--prewarm', action='store_true',
+                        help='Create the streaming containers while the rest of the network is being set up.')
+    parser.add_argument('--trace', default=None,
+                        help='CSV trace (time,bw,delay[,jitter,loss]) replayed on the middle link instead of random changes.')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed of the random link changes (default: a random seed, printed and logged).')
+    parser.add_argument('--change-interval', type=float, default=120,
+                        help='Seconds between random link changes (default: 120).')
+    parser.add_argument('--rotate-seconds', type=int, default=60,
+                        help='Length of each middle-link capture segment in seconds (default: 60).')
+    parser.add_argument('--keep-segments', type=int, default=None,
+                        help='Maximum number of capture segments kept on disk (default: keep all).')
+    parser.add_argument('--capture-profile', choices=['full', 'headers', 'sampled', 'summary'], default='full',
+                        help='What the middle-link capture keeps: whole packets, headers only, every N-th '
+                             'packet or per-flow per-second counters (default: full).')
+    parser.add_argument('--sample', type=int, default=1,
+                        help='Keep one packet in N with --capture-profile sampled (default: 1).')
+    parser.add_argument('--telemetry-interval', type=float, default=0.05,
+                        help='Seconds between interface/qdisc samples of the middle link, 0 disables (default: 0.05).')
+    parser.add_argument('--telemetry-iface', action='append', default=[],
+                        help='Additional root-namespace interface to sample (repeatable).')
     args = parser.parse_args()
 
     # Predefined values for dynamic link changes
@@ -59,125 +137,128 @@ if __name__ == '__main__':
 
     # Shared directory for pcap files and other shared data
     script_directory = os.path.abspath(os.path.dirname(__file__))
-    shared_directory = os.path.join(script_directory, 'pcap')
+    shared_directory = os.path.abspath(args.shared_dir or os.path.join(script_directory, 'pcap'))
 
     if not os.path.exists(shared_directory):
         os.makedirs(shared_directory)
 
     setLogLevel('info')
-
-    net = Containernet(controller=Controller, link=TCLink, xterms=False)
-    mgr = VNFManager(net)
-
-    info('*** Add controller\n')
-    net.addController('c0')
-
-    info('*** Creating hosts\n')
-    server = net.addDockerHost(
-        'server', dimage='dev_test', ip='10.0.0.1', docker_args={'hostname': 'server'}
-    )
-    client = net.addDockerHost(
-        'client', dimage='dev_test', ip='10.0.0.2', docker_args={'hostname': 'client'}
-    )
-
-    h1 = net.addHost('h1', ip='10.0.0.3')
-    h2 = net.addHost('h2', ip='10.0.0.4')
-    h3 = net.addHost('h3', ip='10.0.0.5')
-    h6 = net.addHost('h6', ip='10.0.0.6')
-    h4 = net.addHost('h4', ip='10.0.0.7')
-    h5 = net.addHost('h5', ip='10.0.0.8')
-
-    info('*** Adding switches and links\n')
-    switch1 = net.addSwitch('s1')
-    switch2 = net.addSwitch('s2')
-
-    net.addLink(switch1, server)
-    net.addLink(switch1, h1)
-    # Create the middle link between switches with initial properties
-    middle_link = net.addLink(switch1, switch2, bw=10, delay='10ms')
-    net.addLink(switch2, client)
-    net.addLink(switch2, h2)
-    net.addLink(switch1, h3)
-    net.addLink(switch2, h6)
-    net.addLink(switch1, h4)
-    net.addLink(switch2, h5)
+    timer = BringupTimer()
+
+    # Build the network described by the topology spec
+    topo = build_network(load_spec(spec_path(args.spec)), shared_directory, workers=args.workers,
+                         prefix=args.prefix, controller_port=args.controller_port)
+    timer.mark('network_built')
+    pool = ContainerPool(topo, workers=args.workers)
+    if args.prewarm:
+        pool.warm_images()
+        pool.prewarm()
+    net = topo.net
+    server, client = topo['server'], topo['client']
+    # The middle link between switches with its initial properties
+    middle_link = topo.links['middle']
 
     info('\n*** Starting network\n')
     net.start()
+    timer.mark('network_started')
+    journal.open(os.path.join(shared_directory, 'events.jsonl'))
+    journal.record('network_started', spec=args.spec, hosts=len(net.hosts), switches=len(net.switches))
+    # Record what this run creates, so that only that is torn down (also after a crash)
+    registry = RunRegistry(args.run_id)
+    registry.register_topology(topo)
+    executor.start()
 
     # Test connectivity: ping from client to server
     info("*** Client host pings the server to test for connectivity: \n")
-    reply = client.cmd("ping -c 5 10.0.0.1")
+    reply = executor.check_output(client, ['ping', '-c', '5', server.IP()], timeout=30)
     print(reply)
 
-    # Start the tcpdump process to capture traffic on the middle link.
+    # Start the rotating capture of the traffic on the middle link.
     # We'll capture traffic on one side of the link (interface on switch1 or switch2).
     # Here we use the first interface of the middle_link.
     capture_interface = middle_link.intf1.name
-    capture_file = os.path.join(shared_directory, "middle_link_capture.pcap")
-    tcpdump_cmd = ["sudo", "tcpdump", "-i", capture_interface, "-w", capture_file]
-    info(f'*** Starting tcpdump on interface {capture_interface}, saving to {capture_file}\n')
-    tcpdump_proc = subprocess.Popen(tcpdump_cmd)
-
-    # Add streaming Docker containers
-    streaming_server = add_streaming_container(mgr, 'streaming_server', 'server', 'streaming_server_image', shared_directory)
-    streaming_client = add_streaming_container(mgr, 'streaming_client', 'client', 'streaming_client_image', shared_directory)
-
-    # Start streaming server and client applications in separate threads
-    server_thread = threading.Thread(target=start_server)
-    client_thread = threading.Thread(target=start_client)
-
-    server_thread.start()
-    client_thread.start()
-
-    # Start iperf servers on h6 and h5
-    start_iperf_server(h6)
-    start_iperf_server(h5)
-
-    # Thread to update the link properties dynamically every 120 seconds
-    def update_link_properties():
-        while True:
-            bw, delay = random.choice(bw_delay_pairs)
-            jitter = random.choice(jitter_values)
-            loss = random.choice(loss_values)
-
-            change_link_properties(middle_link, bw, delay, jitter, loss)
-
-            # Wait for 2 minutes (120 seconds) before changing the properties again
-            time.sleep(120)
-
-    dynamic_link_thread = threading.Thread(target=update_link_properties)
-    dynamic_link_thread.daemon = True  # Set as daemon so it exits when main thread finishes
-    dynamic_link_thread.start()
-
-    # Thread to start iperf clients after a delay and then stop them
-    def start_iperf_after_delay():
-        time.sleep(2)
-        start_iperf_client(h3)
-        start_iperf_client2(h4)
-        time.sleep(20)
-        stop_iperf_client(h3)
-        stop_iperf_client(h4)
-
-    iperf_thread = threading.Thread(target=start_iperf_after_delay)
-    iperf_thread.start()
-
-    # Wait for streaming and iperf threads to finish
-    server_thread.join()
-    client_thread.join()
-    iperf_thread.join()
+    capture = CaptureManager(capture_interface, shared_directory, 'middle_link_capture',
+                             rotate_seconds=args.rotate_seconds, keep=args.keep_segments, sudo=True,
+                             profile=args.capture_profile, sample=args.sample)
+    info(f'*** Starting tcpdump on interface {capture_interface}, segments indexed in {capture.index_path}\n')
+    capture.start()
+    registry.register_process(capture.proc)
+    journal.record('capture_start', intf=capture_interface, index=capture.index_path, profile=args.capture_profile)
+
+    # Sample the counters and queue occupancy of both ends of the middle link
+    telemetry = None
+    if args.telemetry_interval > 0:
+        telemetry = TelemetrySampler([middle_link.intf1, middle_link.intf2] + args.telemetry_iface,
+                                     args.telemetry_interval, os.path.join(shared_directory, 'link_telemetry'))
+        telemetry.start()
+
+    # Add streaming Docker containers (already being created when prewarmed)
+    if args.prewarm:
+        streaming_containers = pool.wait()
+    else:
+        streaming_containers = topo.add_containers(workers=args.workers)
+    registry.register_topology(topo)
+    timer.mark('containers_ready')
+    journal.record('containers_ready')
+
+    # Start streaming server and client applications
+    server_command = start_server(topo.container_name('streaming_server'), args.duration,
+                                  args.streams, args.ladder, args.viewers)
+    client_command = start_client(topo.container_name('streaming_client'), args.duration, args.viewers,
+                                  stream_names(args.streams, args.ladder), args.viewer_ramp, args.client_output)
+    timer.wait_first_packet(capture)
+    timer.save(os.path.join(shared_directory, 'bringup_times.json'))
+
+    # Start iperf servers (h6 and h5)
+    traffic.start()
+    for host in topo.role('iperf_server'):
+        start_iperf_server(host)
+
+    # Update the link properties dynamically, from a trace or from the seeded random model
+    # (every 120 seconds by default), on absolute deadlines from a single timer thread
+    scheduler = LinkScheduler({'middle': middle_link}, change_link_properties,
+                              log_path=os.path.join(shared_directory, 'link_changes.jsonl'))
+    if args.bw is not None and args.delay is not None:
+        scheduler.add_schedule([(0.0, 'middle', {'bw': args.bw, 'delay': args.delay,
+                                                 'jitter': args.jitter, 'loss': args.loss})])
+    elif args.trace:
+        scheduler.add_schedule(trace_schedule(args.trace, ['middle']))
+    else:
+        seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+        info(f'*** Random link changes with seed {seed}\n')
+        journal.record('link_schedule', seed=seed, interval=args.change_interval)
+        scheduler.add_schedule(random_schedule(['middle'], bw_delay_pairs, jitter_values, loss_values,
+                                               interval=args.change_interval, seed=seed))
+    scheduler.start()
+
+    # Start iperf clients after a delay (h3 -> h6 and h4 -> h5) and stop them 20 s later
+    iperf_flows = executor.after(2, lambda: [start_iperf_client(src, dst.IP()) for src, dst in topo.pairs['iperf']])
+    iperf_done = executor.after(22, lambda: [stop_iperf_client(flow) for flow in iperf_flows.result()])
+
+    # Wait for streaming and iperf to finish
+    server_command.wait()
+    client_command.wait()
+    iperf_done.result()
+    journal.record('streaming_done', server=server_command.returncode, client=client_command.returncode)
 
     # If not running in autotest mode, drop into an interactive CLI.
     if not autotest:
-        CLI(net)
+        telemetry_cli(CLI)(net, sampler=telemetry)
+
+    scheduler.stop()
+    if telemetry is not None:
+        telemetry.stop()
+    traffic.stop()
+    traffic.write_results(os.path.join(shared_directory, 'iperf_flows.csv'))
+    executor.stop()
 
     # Terminate tcpdump capture before cleanup
     info('*** Terminating tcpdump capture\n')
-    tcpdump_proc.terminate()
-    tcpdump_proc.wait()
-
-    # Cleanup Docker containers and stop the network
-    mgr.removeContainer('streaming_server')
-    mgr.removeContainer('streaming_client')
-    net.stop()
-    mgr.stop()
+    capture.stop()
+    journal.record('capture_stop', intf=capture_interface)
+
+    # Remove the containers, namespaces, switches and links of this run
+    timings = registry.teardown()
+    info(f'*** Teardown finished in {max(timings.values(), default=0):.1f} s\n')
+    journal.record('teardown', **timings)
+    journal.close()
@@ -1,62 +1,92 @@
 import argparse
+import json
 import os
-import subprocess
-import sys
-import time
-import threading
 import random
+from bringup import BringupTimer
+from capture import CaptureManager
 from comnetsemu.cli import CLI
-from comnetsemu.net import Containernet, VNFManager
-from mininet.link import TCLink
+from event_journal import EventJournal
+from host_exec import HostExecutor
+from link_scheduler import LinkScheduler, random_schedule, trace_schedule
+from link_shaping import LinkShaper
+from link_telemetry import TelemetrySampler, telemetry_cli
 from mininet.log import info, setLogLevel
-from mininet.node import Controller
+from run_registry import RunRegistry
+from topology_spec import build_network, load_spec, spec_path
+from traffic_engine import TrafficEngine
+from workload import Workload, parse_pairs, parse_size, poisson_arrivals
 
-def add_streaming_container(manager, name, role, image, shared_dir):
-    return manager.addContainer(
-        name, role, image, '', docker_args={
-            'volumes': {
-                shared_dir: {'bind': '/home/pcap/', 'mode': 'rw'}
-            }
-        }
-    )
+executor = HostExecutor()
+journal = EventJournal()
 
 def start_server():
-    subprocess.Popen([
-        'docker', 'exec', '-it', 'streaming_server',
+    journal.record('streaming_server_start', container='streaming_server')
+    return executor.run(None, [
+        'docker', 'exec', 'streaming_server',
         'bash', '-c', 'cd /home && python3 video_streaming2.py'
-    ])
+    ], capture=False)
 
 def start_client():
-    subprocess.Popen([
-        'docker', 'exec', '-it', 'streaming_client',
+    journal.record('streaming_client_start', container='streaming_client')
+    return executor.run(None, [
+        'docker', 'exec', 'streaming_client',
         'bash', '-c', 'cd /home && python3 get_video_streamed2.py'
-    ])
+    ], capture=False)
+
+traffic = TrafficEngine(executor)
 
 def start_iperf_server(host):
-    host.cmd('iperf -s -p 5001 -u &')
+    return traffic.iperf_server(host, port=5001, udp=True)
 
 def start_iperf_client(host, target, port=5001, bandwidth='5M', duration=120):
-    host.cmd(f'iperf -c {target} -p {port} -u -b {bandwidth} -t {duration} &')
+    flow = traffic.iperf_client(host, target, port=port, udp=True, bandwidth=bandwidth, duration=duration)
+    journal.record('iperf_start', flow=traffic.flows[flow].label, host=host.name, target=target, bandwidth=bandwidth)
+    return flow
+
+def stop_iperf_client(flow):
+    journal.record('iperf_stop', flow=traffic.flows[flow].label, host=traffic.flows[flow].host.name)
+    traffic.stop_flow(flow)
 
-def stop_iperf_client(host):
-    host.cmd('pkill iperf')
+def record_workload_flow(record):
+    journal.record('workload_flow', flow=record['flow'], src=record['src'], dst=record['dst'], bytes=record['bytes'])
 
-def start_file_transfer(host, target, size_mb):
-    host.cmd(f'iperf -c {target} -n {size_mb}M -t 10 &')
+shaper = LinkShaper()
 
 def change_link_properties(link, bw, delay, jitter=0, loss=0):
     info(f'*** Changing link: BW={bw}Mbps, delay={delay}ms, jitter={jitter}ms, loss={loss}%\n')
-    link.intf1.config(bw=bw, delay=f'{delay}ms', jitter=f'{jitter}ms', loss=loss)
-    link.intf2.config(bw=bw, delay=f'{delay}ms', jitter=f'{jitter}ms', loss=loss)
+    shaper.change(link, bw=bw, delay=delay, jitter=jitter, loss=loss)
+    journal.record('link_change', intf=link.intf1.name, bw=bw, delay=delay, jitter=jitter, loss=loss)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Combined streaming, iperf, file and web traffic topology')
     parser.add_argument('--autotest', action='store_true', help='Run without CLI and exit')
+    parser.add_argument('--spec', default='topology1', help='Topology spec name in specs/ or path to a spec file')
+    parser.add_argument('--run-id', help='Name under which the resources of this run are recorded for teardown')
+    parser.add_argument('--shared-dir', help='Directory for pcaps and results (default: pcap/ next to this script)')
+    parser.add_argument('--workers', type=int, default=4, help='Docker hosts/containers created concurrently')
+    parser.add_argument('--trace', help='CSV trace (time,bw,delay[,jitter,loss]) replayed on the middle link')
+    parser.add_argument('--seed', type=int, help='Seed of the random link changes and the workload')
+    parser.add_argument('--change-interval', type=float, default=120, help='Seconds between random link changes')
+    parser.add_argument('--workload-rate', type=float, default=10, help='Mean cross-traffic flow arrivals per second')
+    parser.add_argument('--workload-size', default='pareto,mean=50K,alpha=1.2',
+                        help="Cross-traffic flow sizes, e.g. 'pareto,mean=50K,alpha=1.2' or 'lognormal,mean=1M'")
+    parser.add_argument('--workload-pairs', default=None,
+                        help="Cross-traffic matrix 'src:dst[:weight],...' (default: the spec's iperf pairs)")
+    parser.add_argument('--workload-max-active', type=int, default=500, help='Running cross-traffic flows at most')
+    parser.add_argument('--web-rate', type=float, default=20, help='Mean web requests per second from h8')
+    parser.add_argument('--web-connections', type=int, default=8, help='Pooled web connections of h8')
+    parser.add_argument('--rotate-seconds', type=int, default=60, help='Capture segment length in seconds')
+    parser.add_argument('--keep-segments', type=int, default=None, help='Maximum capture segments kept per capture')
+    parser.add_argument('--capture-profile', choices=['full', 'headers', 'sampled', 'summary'], default='full',
+                        help='What the captures keep of each packet')
+    parser.add_argument('--sample', type=int, default=1, help='Keep one packet in N with --capture-profile sampled')
+    parser.add_argument('--telemetry-interval', type=float, default=0.05,
+                        help='Seconds between middle-link interface/qdisc samples (0 disables)')
     args = parser.parse_args()
 
     # Setup shared directory
     base_dir = os.path.abspath(os.path.dirname(__file__))
-    shared_dir = os.path.join(base_dir, 'pcap')
+    shared_dir = os.path.abspath(args.shared_dir or os.path.join(base_dir, 'pcap'))
     os.makedirs(shared_dir, exist_ok=True)
 
     # Link property options
@@ -65,106 +95,121 @@ if __name__ == '__main__':
     loss_vals = [0, 0.1]
 
     setLogLevel('info')
-    net = Containernet(controller=Controller, link=TCLink)
-    mgr = VNFManager(net)
-
-    info('*** Adding controller\n')
-    net.addController('c0')
-
-    info('*** Adding hosts\n')
-    server = net.addDockerHost('server', dimage='dev_test', ip='10.0.0.1')
-    client = net.addDockerHost('client', dimage='dev_test', ip='10.0.0.2')
-    h1 = net.addHost('h1', ip='10.0.0.3')
-    h2 = net.addHost('h2', ip='10.0.0.4')
-    h3 = net.addHost('h3', ip='10.0.0.5')
-    h6 = net.addHost('h6', ip='10.0.0.6')
-    h4 = net.addHost('h4', ip='10.0.0.7')
-    h5 = net.addHost('h5', ip='10.0.0.8')
-    h7 = net.addHost('h7', ip='10.0.0.9')  # web server
-    h8 = net.addHost('h8', ip='10.0.0.10') # web client
-
-    info('*** Adding switches and links\n')
-    s1 = net.addSwitch('s1')
-    s2 = net.addSwitch('s2')
-    net.addLink(s1, server)
-    net.addLink(s1, h1)
-    middle = net.addLink(s1, s2, bw=10, delay='10ms')
-    net.addLink(s2, client)
-    net.addLink(s2, h2)
-    net.addLink(s1, h3)
-    net.addLink(s2, h6)
-    net.addLink(s1, h4)
-    net.addLink(s2, h5)
-    net.addLink(s1, h7)
-    net.addLink(s2, h8)
+    timer = BringupTimer()
+    topo = build_network(load_spec(spec_path(args.spec)), shared_dir, workers=args.workers)
+    net = topo.net
+    h7, h8 = topo['h7'], topo['h8']
+    middle = topo.links['middle']
 
     info('*** Starting network\n')
     net.start()
+    timer.mark('network_started')
+    journal.open(os.path.join(shared_dir, 'events.jsonl'))
+    journal.record('network_started', spec=args.spec, hosts=len(net.hosts), switches=len(net.switches))
+    registry = RunRegistry(args.run_id)
+    registry.register_topology(topo)
+    executor.start()
 
     # Launch web server
-    h7.cmd('echo "<html><body><h1>Hello from h7</h1></body></html>" > /tmp/index.html')
-    h7.cmd('python3 -m http.server 80 --directory /tmp &')
+    web_server = executor.run(h7, ['python3', os.path.join(base_dir, 'server', 'Web_Server.py'), '--concurrent',
+                                   '--port', '80', '--stats', os.path.join(shared_dir, 'web_server_stats.csv')],
+                              capture=False)
 
     # Start tcpdump captures
     iface = middle.intf1.name
-    pcap_file1 = os.path.join(shared_dir, 'file_traffic.pcap')
-    pcap_file2 = os.path.join(shared_dir, 'web_traffic.pcap')
-    file_dump = subprocess.Popen(['sudo', 'tcpdump', '-i', iface, 'udp port 5001', '-w', pcap_file1])
-    web_dump  = subprocess.Popen(['sudo', 'tcpdump', '-i', iface, 'tcp port 80', '-w', pcap_file2])
+    file_dump = CaptureManager(iface, shared_dir, 'file_traffic', 'udp port 5001 or tcp port 5002',
+                               rotate_seconds=args.rotate_seconds, keep=args.keep_segments, sudo=True,
+                               profile=args.capture_profile, sample=args.sample).start()
+    web_dump = CaptureManager(iface, shared_dir, 'web_traffic', 'tcp port 80',
+                              rotate_seconds=args.rotate_seconds, keep=args.keep_segments, sudo=True,
+                              profile=args.capture_profile, sample=args.sample).start()
+    registry.register_process(file_dump.proc)
+    registry.register_process(web_dump.proc)
+    journal.record('capture_start', intf=iface, captures=['file_traffic', 'web_traffic'], profile=args.capture_profile)
+    # middle-link counters and queue occupancy
+    telemetry = None
+    if args.telemetry_interval > 0:
+        telemetry = TelemetrySampler([middle.intf1, middle.intf2], args.telemetry_interval,
+                                     os.path.join(shared_dir, 'link_telemetry')).start()
+
+    # Add the streaming containers the streaming commands exec into
+    topo.add_containers(workers=args.workers)
+    registry.register_topology(topo)
+    timer.mark('containers_ready')
+    journal.record('containers_ready')
 
     # Define dynamic updater
-    def update_link():
-        while True:
-            bw, dly = random.choice(bw_delay_pairs)
-            jit = random.choice(jitter_vals)
-            loss = random.choice(loss_vals)
-            change_link_properties(middle, bw, dly, jit, loss)
-            time.sleep(120)
-
-    # Define web fetcher
-    def web_fetch():
-        while True:
-            out = h8.cmd('curl -s http://10.0.0.9:80')
-            info(f'*** h8 fetched: {out}\n')
-            time.sleep(60)
-
-    # Define continuous transfer
-    def continuous(host, target, size, interval):
-        while True:
-            start_file_transfer(host, target, size)
-            time.sleep(interval)
+    scheduler = LinkScheduler({'middle': middle}, change_link_properties,
+                              log_path=os.path.join(shared_dir, 'link_changes.jsonl'))
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    if args.trace:
+        scheduler.add_schedule(trace_schedule(args.trace, ['middle']))
+    else:
+        info(f'*** Random link changes with seed {seed}\n')
+        journal.record('link_schedule', seed=seed, interval=args.change_interval)
+        scheduler.add_schedule(random_schedule(['middle'], bw_delay_pairs, jitter_vals, loss_vals,
+                                               interval=args.change_interval, seed=seed))
 
     # Start services concurrently
-    threads = []
     # streaming
-    threads += [threading.Thread(target=start_server, daemon=True),
-                threading.Thread(target=start_client, daemon=True)]
+    streaming = [start_server(), start_client()]
     # iperf servers
-    start_iperf_server(h6)
-    start_iperf_server(h5)
-    # initial iperf clients
-    threads.append(threading.Thread(target=lambda: (time.sleep(2), start_iperf_client(h3, '10.0.0.6'),
-                                                  start_iperf_client(h4, '10.0.0.8'), time.sleep(20),
-                                                  stop_iperf_client(h3), stop_iperf_client(h4)), daemon=True))
-    # continuous transfers
-    threads += [
-        threading.Thread(target=lambda: continuous(h3, '10.0.0.6', 50, 30), daemon=True),
-        threading.Thread(target=lambda: continuous(h4, '10.0.0.8', 200, 60), daemon=True)
-    ]
-    # web fetch
-    threads.append(threading.Thread(target=web_fetch, daemon=True))
+    traffic.start()
+    for host in topo.role('iperf_server'):
+        start_iperf_server(host)
+    # initial iperf clients, stopped after 20 s
+    initial_flows = executor.after(2, lambda: [start_iperf_client(src, dst.IP()) for src, dst in topo.pairs['iperf']])
+    executor.after(22, lambda: [stop_iperf_client(flow) for flow in initial_flows.result()])
+    # stochastic cross-traffic transfers to TCP iperf servers on port 5002
+    pairs = parse_pairs(args.workload_pairs) if args.workload_pairs else \
+        [(src.name, dst.name, 1.0) for src, dst in topo.pairs['iperf']]
+    for name in sorted({dst for _, dst, _ in pairs}):
+        traffic.iperf_server(topo[name], port=5002)
+    # the first arrival comes a second after the servers were started, once they listen
+    workload = Workload(traffic, poisson_arrivals(args.workload_rate, pairs, parse_size(args.workload_size), seed),
+                        {name: topo[name] for src, dst, _ in pairs for name in (src, dst)}, port=5002,
+                        max_active=args.workload_max_active, on_flow=record_workload_flow, seed=seed).start(delay=1.0)
+    journal.record('workload_start', seed=seed, rate=args.workload_rate, size=args.workload_size,
+                   pairs=[list(pair) for pair in pairs])
+    # open-loop web load from h8, latencies written next to the pcaps
+    web_load = executor.run(h8, ['python3', os.path.join(base_dir, 'client', 'Web_Client.py'), '--load',
+                                 '--url', f'http://{h7.IP()}:80/', '--rate', str(args.web_rate),
+                                 '--connections', str(args.web_connections),
+                                 '--out', os.path.join(shared_dir, 'web_latency')], capture=False)
+    journal.record('web_load_start', host=h8.name, server=h7.IP(), rate=args.web_rate,
+                   connections=args.web_connections)
     # dynamic link
-    threads.append(threading.Thread(target=update_link, daemon=True))
-
-    for t in threads:
-        t.start()
+    scheduler.start()
+    timer.wait_first_packet(file_dump)
+    timer.save(os.path.join(shared_dir, 'bringup_times.json'))
 
     # CLI holds until exit
     if not args.autotest:
-        CLI(net)
+        telemetry_cli(CLI)(net, sampler=telemetry)
 
     # cleanup
+    scheduler.stop()
+    if telemetry is not None:
+        telemetry.stop()
+    workload.stop()
+    workload.write(os.path.join(shared_dir, 'workload_flows.csv'))
+    journal.record('workload_stop', **workload.metadata())
+    web_load.stop()
+    # the h8 results: what it fetched, with which latencies
+    summary_path = os.path.join(shared_dir, 'web_latency_summary.json')
+    if os.path.exists(summary_path):
+        with open(summary_path) as f:
+            summary = json.load(f)
+        journal.record('web_load_done', host=h8.name, returncode=web_load.returncode,
+                       **{k: v for k, v in summary.items() if k != 'histogram_us'})
+    traffic.stop()
+    traffic.write_results(os.path.join(shared_dir, 'iperf_flows.csv'))
+    executor.stop()
     info('*** Terminating captures\n')
-    file_dump.terminate(); web_dump.terminate()
-    mgr.removeContainer('streaming_server'); mgr.removeContainer('streaming_client')
-    net.stop(); mgr.stop()
+    file_dump.stop(); web_dump.stop()
+    journal.record('capture_stop', intf=iface)
+    # only what this run created is removed
+    timings = registry.teardown()
+    info(f'*** Teardown finished in {max(timings.values(), default=0):.1f} s\n')
+    journal.record('teardown', **timings)
+    journal.close()
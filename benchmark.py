@@ -0,0 +1,293 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks of emulation fidelity and orchestration cost on the Topology.py network.
+
+Three groups of measurements are taken:
+    startup   wall time of building the network, net.start(), creating the streaming
+              containers and tearing everything down, for a growing number of extra
+              host pairs
+    shaping   latency of a middle-link change (incremental and full qdisc rebuild), and
+              achieved vs configured RTT and TCP throughput at every bw/delay setting
+    flows     aggregate throughput and fairness of 1..N parallel TCP flows across the
+              middle link
+
+The results are written as JSON. When a baseline file exists, every metric is compared
+with it and the run fails if one got worse by more than the tolerance; --save-baseline
+stores the current results as the new baseline. Must be run as root, like the topology
+scripts.
+
+Usage:
+    sudo python3 benchmark.py --hosts 0 8 16 --flows 1 2 4 8
+"""
+
+import argparse
+import copy
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+from mininet.log import info, setLogLevel
+
+from host_exec import HostExecutor
+from link_shaping import LinkShaper
+from topology_spec import build_network, load_spec, spec_path
+from traffic_engine import TrafficEngine
+
+# The bw/delay settings of Topology.py's dynamic link changes
+BW_DELAY_PAIRS = [(30, 60), (35, 70), (40, 80), (45, 90), (50, 100)]
+
+# Compared metrics per section: key fields identifying a row, and for each metric whether
+# lower or higher is better and the smallest change that counts (in the metric's unit)
+METRICS = {
+    'startup': (('extra_pairs',), {
+        'build_s': ('lower', 0.2), 'start_s': ('lower', 0.2), 'containers_s': ('lower', 0.5),
+        'teardown_s': ('lower', 0.2)}),
+    'shaping': (('bw', 'delay'), {
+        'change_ms': ('lower', 2.0), 'full_ms': ('lower', 5.0), 'rtt_error_ms': ('lower', 1.0),
+        'throughput_ratio': ('higher', 0.02)}),
+    'flows': (('flows',), {
+        'aggregate_ratio': ('higher', 0.02), 'fairness': ('higher', 0.02)}),
+}
+
+
+def scaled_spec(spec, extra_pairs):
+    """
+    Adding host pairs across the middle link to a spec (one host on s1, one on s2), listed
+    as 'bench' pairs.
+    """
+    spec = copy.deepcopy(spec)
+    pairs = []
+    for i in range(1, extra_pairs + 1):
+        left, right = f'b{i}l', f'b{i}r'
+        spec.setdefault('hosts', []).extend([{'name': left, 'ip': f'10.0.1.{i}'}, {'name': right, 'ip': f'10.0.2.{i}'}])
+        spec['links'].extend([{'nodes': ['s1', left]}, {'nodes': ['s2', right]}])
+        pairs.append([left, right])
+    spec.setdefault('pairs', {})['bench'] = pairs
+    return spec
+
+
+def without_docker(spec):
+    """Replacing the Docker hosts of a spec by plain hosts and dropping its containers."""
+    spec = copy.deepcopy(spec)
+    spec['hosts'] = [{'name': h['name'], 'ip': h['ip']} for h in spec.pop('docker_hosts', [])] + spec.get('hosts', [])
+    spec['containers'] = []
+    return spec
+
+
+def parse_rtt(output):
+    """Returning the average RTT in ms from ping's summary line, or None."""
+    match = re.search(r'= [\d.]+/([\d.]+)/[\d.]+', output or '')
+    return float(match.group(1)) if match else None
+
+
+def jain_fairness(rates):
+    """Jain's fairness index of a list of rates (1.0 = perfectly fair)."""
+    if not rates or not any(rates):
+        return 0.0
+    return sum(rates) ** 2 / (len(rates) * sum(r * r for r in rates))
+
+
+def bench_startup(spec, extra_pairs, shared_dir, workers, containers):
+    """Timing the bring-up and teardown phases of the network with extra host pairs."""
+    row = {'extra_pairs': extra_pairs, 'hosts': len(spec.get('hosts', [])) + 2 * extra_pairs}
+    started = time.perf_counter()
+    topo = build_network(scaled_spec(spec, extra_pairs), shared_dir, workers=workers)
+    row['build_s'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    topo.net.start()
+    row['start_s'] = time.perf_counter() - started
+
+    if containers:
+        started = time.perf_counter()
+        topo.add_containers(workers=workers)
+        row['containers_s'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if containers:
+        topo.remove_containers()
+    topo.net.stop()
+    topo.mgr.stop()
+    row['teardown_s'] = time.perf_counter() - started
+    info(f'*** startup with {row["hosts"]} hosts: {row}\n')
+    return row
+
+
+def bench_shaping(topo, shaper, executor, traffic, pairs, duration, pings):
+    """Measuring change latency, RTT and throughput at every bw/delay setting."""
+    middle = topo.links['middle']
+    src, dst = topo.pairs['bench'][0]
+    server = traffic.iperf_server(dst, port=5201)
+
+    shaper.change(middle, bw=pairs[0][0], delay=0, jitter=0, loss=0)
+    base_rtt = parse_rtt(executor.check_output(src, ['ping', '-c', str(pings), '-i', '0.2', dst.IP()],
+                                               timeout=pings + 10))
+    rows = []
+    for bw, delay in pairs:
+        row = {'bw': bw, 'delay': delay}
+        row['full_ms'] = shaper.change(middle, bw=bw, delay=delay, full=True)
+        # Changing away and back, so the timed change is a real incremental update
+        shaper.change(middle, bw=bw + 1, delay=delay + 1)
+        row['change_ms'] = shaper.change(middle, bw=bw, delay=delay)
+
+        rtt = parse_rtt(executor.check_output(src, ['ping', '-c', str(pings), '-i', '0.2', dst.IP()],
+                                              timeout=pings + 10))
+        # The middle link delays both directions
+        row['rtt_ms'] = rtt
+        row['expected_rtt_ms'] = (base_rtt or 0) + 2 * delay
+        row['rtt_error_ms'] = abs(rtt - row['expected_rtt_ms']) if rtt is not None else None
+
+        flow = traffic.iperf_client(src, dst.IP(), port=5201, duration=duration)
+        result = traffic.wait_flow(flow, timeout=duration + 30)
+        mbps = (result.get('bits_per_second') or 0) / 1e6
+        row['throughput_mbps'] = mbps
+        row['throughput_ratio'] = mbps / bw
+        info(f'*** shaping {bw} Mbit/s {delay} ms: {row}\n')
+        rows.append(row)
+    traffic.stop_flow(server)
+    return rows
+
+
+def bench_flows(topo, shaper, traffic, counts, bw, delay, duration):
+    """Measuring aggregate throughput and fairness of parallel TCP flows."""
+    middle = topo.links['middle']
+    shaper.change(middle, bw=bw, delay=delay, jitter=0, loss=0)
+    bench_pairs = topo.pairs['bench']
+    servers = [traffic.iperf_server(dst, port=5202) for _, dst in bench_pairs[:max(counts)]]
+    rows = []
+    for count in counts:
+        flows = [traffic.iperf_client(src, dst.IP(), port=5202, duration=duration)
+                 for src, dst in bench_pairs[:count]]
+        rates = [(traffic.wait_flow(flow, timeout=duration + 30).get('bits_per_second') or 0) / 1e6
+                 for flow in flows]
+        row = {'flows': count, 'bw': bw, 'delay': delay, 'aggregate_mbps': sum(rates),
+               'aggregate_ratio': sum(rates) / bw, 'min_mbps': min(rates), 'max_mbps': max(rates),
+               'fairness': jain_fairness(rates)}
+        info(f'*** {count} parallel flows: {row}\n')
+        rows.append(row)
+    for server in servers:
+        traffic.stop_flow(server)
+    return rows
+
+
+def compare(results, baseline, tolerance):
+    """
+    Comparing results with a baseline.
+
+    Args:
+        tolerance (float): Relative change of a metric that is still accepted.
+    Returns:
+        list: One dict per compared metric, with 'regression' set where it got worse.
+    """
+    report = []
+    for section, (keys, metrics) in METRICS.items():
+        old_rows = {tuple(row.get(k) for k in keys): row for row in baseline.get(section, [])}
+        for row in results.get(section, []):
+            key = tuple(row.get(k) for k in keys)
+            old = old_rows.get(key)
+            if old is None:
+                continue
+            for metric, (better, floor) in metrics.items():
+                new_value, old_value = row.get(metric), old.get(metric)
+                if new_value is None or old_value is None:
+                    continue
+                worse = new_value - old_value if better == 'lower' else old_value - new_value
+                allowed = max(tolerance * abs(old_value), floor)
+                report.append({'section': section, 'key': dict(zip(keys, key)), 'metric': metric,
+                               'baseline': old_value, 'value': new_value, 'regression': worse > allowed})
+    return report
+
+
+def metadata():
+    """Describing the machine and revision the benchmark ran on."""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL, universal_newlines=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        revision = None
+    return {'time': time.time(), 'host': platform.node(), 'kernel': platform.release(),
+            'cpus': os.cpu_count(), 'python': platform.python_version(), 'revision': revision or None}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark emulation fidelity and orchestration cost.')
+    parser.add_argument('--spec', default='topology', help='Topology spec (default: topology)')
+    parser.add_argument('--hosts', type=int, nargs='+', default=[0, 8, 16],
+                        help='Extra host pairs of the startup runs (default: 0 8 16)')
+    parser.add_argument('--flows', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='Parallel flow counts (default: 1 2 4 8)')
+    parser.add_argument('--duration', type=int, default=10, help='Seconds per throughput measurement (default: 10)')
+    parser.add_argument('--pings', type=int, default=20, help='Pings per RTT measurement (default: 20)')
+    parser.add_argument('--workers', type=int, default=4, help='Docker hosts/containers created concurrently')
+    parser.add_argument('--no-containers', action='store_true',
+                        help='Skip the streaming containers (and Docker hosts) in the startup runs')
+    parser.add_argument('--skip', nargs='*', default=[], choices=sorted(METRICS), help='Sections not run')
+    parser.add_argument('--out', default='pcap/benchmark.json', help='Results file (default: pcap/benchmark.json)')
+    parser.add_argument('--baseline', default='benchmarks/baseline.json',
+                        help='Baseline compared against, when it exists (default: benchmarks/baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Accepted relative degradation of a metric (default: 0.25)')
+    args = parser.parse_args()
+
+    setLogLevel('info')
+    base_dir = os.path.abspath(os.path.dirname(__file__))
+    shared_dir = os.path.join(base_dir, 'pcap')
+    os.makedirs(shared_dir, exist_ok=True)
+    spec = load_spec(spec_path(args.spec))
+    results = {'meta': metadata(), 'settings': vars(args)}
+
+    if 'startup' not in args.skip:
+        startup_spec = without_docker(spec) if args.no_containers else spec
+        results['startup'] = [bench_startup(startup_spec, n, shared_dir, args.workers, not args.no_containers)
+                              for n in args.hosts]
+
+    if 'shaping' not in args.skip or 'flows' not in args.skip:
+        # The fidelity runs only need the switches and plain hosts
+        topo = build_network(scaled_spec(without_docker(spec), max(args.flows)), shared_dir, workers=args.workers)
+        topo.net.start()
+        executor = HostExecutor().start()
+        traffic = TrafficEngine(executor).start()
+        shaper = LinkShaper()
+        try:
+            if 'shaping' not in args.skip:
+                results['shaping'] = bench_shaping(topo, shaper, executor, traffic, BW_DELAY_PAIRS,
+                                                   args.duration, args.pings)
+            if 'flows' not in args.skip:
+                bw, delay = BW_DELAY_PAIRS[0]
+                results['flows'] = bench_flows(topo, shaper, traffic, args.flows, bw, delay, args.duration)
+        finally:
+            traffic.stop()
+            executor.stop()
+            topo.net.stop()
+            topo.mgr.stop()
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=1)
+    info(f'*** Results written to {args.out}\n')
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            report = compare(results, json.load(f), args.tolerance)
+        regressions = [r for r in report if r['regression']]
+        for r in report:
+            flag = 'REGRESSION' if r['regression'] else 'ok'
+            print(f"{flag:>10}  {r['section']} {r['key']} {r['metric']}: {r['baseline']:.3f} -> {r['value']:.3f}")
+        print(f'{len(report)} metrics compared with {args.baseline}, {len(regressions)} regressions')
+    else:
+        print(f'No baseline at {args.baseline}; run with --save-baseline to store one')
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f'Baseline saved to {args.baseline}')
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,131 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Parallel bring-up of Docker hosts and VNF containers.
+
+Docker create/start round-trips of independent containers are issued from a bounded
+thread pool instead of one after another. ContainerPool starts creating the VNF
+containers of a topology as soon as their Docker hosts exist, so that they come up
+while switches and links are still being configured, and BringupTimer reports how
+long each phase took, up to the first packet seen by the capture.
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mininet.log import info
+
+DEFAULT_WORKERS = 4
+
+
+def parallel_map(fn, items, workers=DEFAULT_WORKERS):
+    """
+    Calling fn on every item from a bounded thread pool.
+
+    Returns:
+        list: The results, in the order of items. The first exception is re-raised
+        once every call has finished.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        futures = [pool.submit(fn, item) for item in items]
+    return [future.result() for future in futures]
+
+
+class ContainerPool:
+    """
+    Creating the VNF containers of a compiled topology ahead of time.
+
+    VNF containers live in the network namespace of their Docker host, so they can only
+    be created once that host exists. prewarm() submits them to a background pool right
+    after build_network() returns; wait() blocks until all of them are up. warm_images()
+    pulls missing images once, which is the part that carries over to later runs.
+
+    Args:
+        topo (CompiledTopology): The topology whose containers are pooled.
+        workers (int): Maximum number of concurrent Docker round-trips.
+    """
+
+    def __init__(self, topo, workers=DEFAULT_WORKERS):
+        self.topo = topo
+        self.workers = workers
+        self._executor = None
+        self._futures = {}
+
+    def warm_images(self):
+        """Pulling the container images that are not available locally."""
+        import docker
+
+        client = docker.from_env()
+        images = sorted({entry['image'] for entry in self.topo.container_specs()})
+
+        def ensure(image):
+            try:
+                client.images.get(image)
+            except docker.errors.ImageNotFound:
+                info(f'*** Pulling {image}\n')
+                client.images.pull(image)
+
+        parallel_map(ensure, images, self.workers)
+        return images
+
+    def prewarm(self):
+        """Starting the creation of every container of the spec in the background."""
+        entries = self.topo.container_specs()
+        if not entries:
+            return self
+        self._executor = ThreadPoolExecutor(max_workers=min(self.workers, len(entries)))
+        for entry in entries:
+            self._futures[entry['name']] = self._executor.submit(self.topo.add_container, entry)
+        return self
+
+    def wait(self):
+        """Waiting for the prewarmed containers and returning them by name."""
+        containers = {name: future.result() for name, future in self._futures.items()}
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        return containers
+
+
+class BringupTimer:
+    """
+    Recording how long each bring-up phase takes, relative to the moment the timer
+    was created (normally the start of the script).
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.phases = {}
+
+    def mark(self, phase):
+        """Recording the end of a phase."""
+        self.phases[phase] = time.time() - self.start
+        info(f'*** {phase}: {self.phases[phase]:.2f} s after start\n')
+        return self.phases[phase]
+
+    def wait_first_packet(self, capture, timeout=120.0, poll_interval=0.2):
+        """
+        Waiting until the capture has seen its first packet and recording the
+        time-to-first-packet from that packet's capture timestamp.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            capture.refresh()
+            first = capture.first_timestamp()
+            if first is not None:
+                self.phases['first_packet'] = first - self.start
+                info(f'*** Time to first packet: {self.phases["first_packet"]:.2f} s\n')
+                return self.phases['first_packet']
+            time.sleep(poll_interval)
+        info(f'*** No packet captured within {timeout:.0f} s\n')
+        return None
+
+    def save(self, path):
+        """Writing the phase timings as JSON."""
+        with open(path, 'w') as f:
+            json.dump({'start': self.start, 'phases': self.phases}, f, indent=1)
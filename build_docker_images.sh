@@ -10,7 +10,9 @@ declare -A build_configs=(
 )
 
 # Looping through the associative array
+# The build context is the repository root so that shared modules (e.g. capture.py)
+# can be copied into both images; see .dockerignore for what is excluded.
 for image_tag in "${!build_configs[@]}"; do
     echo "Building docker image for ${build_configs[$image_tag]} streaming"
-    docker build -t "$image_tag" --file "./${build_configs[$image_tag]}/Dockerfile.${build_configs[$image_tag]}" "./${build_configs[$image_tag]}"
+    docker build -t "$image_tag" --file "./${build_configs[$image_tag]}/Dockerfile.${build_configs[$image_tag]}" .
 done
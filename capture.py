@@ -0,0 +1,588 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Rotating tcpdump capture with a retention cap and a per-segment sidecar index.
+
+Instead of one ever-growing pcap per run, tcpdump writes time- or size-rotated
+segments. A monitor thread keeps <prefix>.index.json up to date (segment -> first/last
+timestamp, packet count, bytes) and deletes the oldest segments beyond the retention
+cap. follow() lets another thread or process tail the newest segment while the
+capture is still running.
+
+Capture profiles bound what reaches the disk:
+    full      whole packets (tcpdump -s0)
+    headers   packets truncated to the snaplen (128 bytes by default: link, IP and
+              transport headers)
+    sampled   every N-th packet; tcpdump writes to a pipe and the kept packets are
+              written to rotated segments here
+    summary   no pcap at all; per-flow, per-second counters (packets, bytes, TCP
+              SYN/FIN/RST and retransmissions) are kept in memory and appended to
+              <prefix>_summary.csv once each second is complete
+
+Only the standard library is used, so this module also runs inside the containers.
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import signal
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+PCAP_MAGICS = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1e6),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e9),
+    b'\xa1\xb2\xc3\xd4': ('>', 1e6),
+    b'\xa1\xb2\x3c\x4d': ('>', 1e9),
+}
+GLOBAL_HEADER_LEN = 24
+RECORD_HEADER_LEN = 16
+# Sidecar of a segment written by pcap_index.py
+TIME_INDEX_SUFFIX = '.tidx'
+
+# Default snaplen of every capture profile (0: whole packets)
+PROFILES = {'full': 0, 'headers': 128, 'sampled': 0, 'summary': 128}
+SUMMARY_FIELDS = ['second', 'src', 'dst', 'sport', 'dport', 'proto', 'packets', 'bytes', 'syn', 'fin', 'rst',
+                  'retransmits']
+
+
+def segment_files(directory, prefix):
+    """
+    Returning the segment files of one capture, oldest first: time-rotated
+    <prefix>_YYYYmmdd-HHMMSS.pcap or size-rotated <prefix>.pcap, <prefix>.pcap1, ...
+    Other captures whose names start with the same text (e.g. server_h6_*.pcap next to
+    server_*.pcap) and the time index sidecars are left out.
+    """
+    name = re.compile(re.escape(prefix) + r'(_\d{8}-\d{6}\.pcap|\.pcap\d*)')
+    paths = glob.glob(os.path.join(glob.escape(directory), glob.escape(prefix) + '[._]*'))
+    return sorted((path for path in paths if name.fullmatch(os.path.basename(path))), key=_segment_key)
+
+
+def _segment_key(path):
+    """
+    Sorting key for segment file names. Time-rotated names sort lexicographically,
+    size-rotated ones (name.pcap, name.pcap1, name.pcap2, ...) by their numeric suffix.
+    """
+    name = os.path.basename(path)
+    match = re.match(r'(.*?)(\d*)$', name)
+    return match.group(1), int(match.group(2) or 0)
+
+
+def _ip_offset(linktype, data):
+    """Returning the offset of the IPv4 header in a packet, or None for other packets."""
+    if linktype == 1:
+        # Ethernet, possibly with VLAN tags
+        offset, ethertype = 14, data[12:14]
+        while ethertype in (b'\x81\x00', b'\x88\xa8') and len(data) >= offset + 4:
+            ethertype = data[offset + 2:offset + 4]
+            offset += 4
+    elif linktype == 113:
+        # Linux cooked capture (tcpdump -i any)
+        offset, ethertype = 16, data[14:16]
+    elif linktype == 276:
+        # Linux cooked capture v2
+        offset, ethertype = 20, data[0:2]
+    elif linktype in (12, 14, 101):
+        return 0 if data and data[0] >> 4 == 4 else None
+    else:
+        return None
+    return offset if ethertype == b'\x08\x00' else None
+
+
+class FlowSummary:
+    """
+    Per-flow, per-second packet counters, written as CSV rows once a second is complete.
+
+    A TCP segment counts as a retransmission when it carries payload that ends at or
+    before the highest sequence number already seen for its direction of the flow.
+    """
+
+    def __init__(self, path, linktype):
+        self.linktype = linktype
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(SUMMARY_FIELDS)
+        self.counters = {}
+        self.seq_end = {}
+        self.current = None
+        self.rows = 0
+
+    def add(self, ts, length, data):
+        second = int(ts)
+        if self.current is None or second > self.current:
+            if self.current is not None:
+                self.flush(second)
+            self.current = second
+        flow, flags, retransmit = ('-', '-', 0, 0, 0), 0, False
+        offset = _ip_offset(self.linktype, data)
+        if offset is not None and len(data) >= offset + 20:
+            ihl = (data[offset] & 0x0F) * 4
+            total = struct.unpack_from('!H', data, offset + 2)[0]
+            proto = data[offset + 9]
+            fragment = struct.unpack_from('!H', data, offset + 6)[0] & 0x1FFF
+            src, dst = socket.inet_ntoa(data[offset + 12:offset + 16]), socket.inet_ntoa(data[offset + 16:offset + 20])
+            l4 = offset + ihl
+            flow = (src, dst, 0, 0, proto)
+            if proto in (6, 17) and not fragment and len(data) >= l4 + 4:
+                sport, dport = struct.unpack_from('!HH', data, l4)
+                flow = (src, dst, sport, dport, proto)
+                if proto == 6 and len(data) >= l4 + 14:
+                    seq = struct.unpack_from('!I', data, l4 + 4)[0]
+                    flags = data[l4 + 13]
+                    payload = total - ihl - (data[l4 + 12] >> 4) * 4
+                    if payload > 0:
+                        end = (seq + payload) & 0xFFFFFFFF
+                        highest = self.seq_end.get(flow)
+                        # Sequence numbers wrap around, so they are compared modulo 2^32
+                        if highest is not None and (end == highest or (end - highest) & 0xFFFFFFFF >= 0x80000000):
+                            retransmit = True
+                        else:
+                            self.seq_end[flow] = end
+        counters = self.counters.get((second, flow))
+        if counters is None:
+            counters = self.counters[(second, flow)] = [0, 0, 0, 0, 0, 0]
+        counters[0] += 1
+        counters[1] += length
+        counters[2] += bool(flags & 0x02)
+        counters[3] += bool(flags & 0x01)
+        counters[4] += bool(flags & 0x04)
+        counters[5] += retransmit
+
+    def flush(self, before=None):
+        """Writing the counters of every second before the given one (all when None)."""
+        done = sorted(key for key in self.counters if before is None or key[0] < before)
+        for key in done:
+            second, flow = key
+            self.writer.writerow([second, *flow, *self.counters.pop(key)])
+        self.rows += len(done)
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class SegmentWriter:
+    """Writing packets to rotated pcap segments named like tcpdump's own (-G or -C)."""
+
+    def __init__(self, directory, prefix, header, rotate_seconds=None, rotate_mb=None):
+        self.directory = directory
+        self.prefix = prefix
+        self.header = header
+        self.rotate_seconds = rotate_seconds
+        self.rotate_bytes = (rotate_mb or 100) * 1000 * 1000
+        self.file = None
+        self.opened = None
+        self.written = 0
+        self.count = 0
+
+    def _open(self, ts):
+        if self.file is not None:
+            self.file.close()
+        if self.rotate_seconds:
+            # Like tcpdump -G: the first segment starts with the capture, the next ones
+            # when a packet arrives rotate_seconds or more after the current one started
+            self.opened = ts
+            name = f'{self.prefix}_{time.strftime("%Y%m%d-%H%M%S", time.localtime(self.opened))}.pcap'
+        else:
+            name = f'{self.prefix}.pcap{self.count or ""}'
+        self.count += 1
+        self.file = open(os.path.join(self.directory, name), 'wb')
+        self.file.write(self.header)
+        self.written = len(self.header)
+
+    def write(self, ts, record):
+        if self.file is None or (self.rotate_seconds and ts >= self.opened + self.rotate_seconds) or \
+                (not self.rotate_seconds and self.written >= self.rotate_bytes):
+            self._open(ts)
+        self.file.write(record)
+        self.written += len(record)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class SegmentScanner:
+    """
+    Incrementally scanning the record headers of one pcap segment.
+
+    Every call to scan() continues from where the previous one stopped, so a segment
+    that is still being written is only read once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.endian = None
+        self.divisor = None
+        self.first_ts = None
+        self.last_ts = None
+        self.packets = 0
+        self.bytes = 0
+        self.complete = False
+
+    def scan(self):
+        """Reading the records appended since the last scan."""
+        try:
+            with open(self.path, 'rb') as f:
+                if self.endian is None:
+                    header = f.read(GLOBAL_HEADER_LEN)
+                    if len(header) < GLOBAL_HEADER_LEN:
+                        return
+                    if header[:4] not in PCAP_MAGICS:
+                        raise ValueError(f'{self.path}: not a pcap file')
+                    self.endian, self.divisor = PCAP_MAGICS[header[:4]]
+                    self.offset = GLOBAL_HEADER_LEN
+                record = struct.Struct(self.endian + 'IIII')
+                size = os.fstat(f.fileno()).st_size
+                f.seek(self.offset)
+                # Only the record headers are read; the packet data is skipped
+                while self.offset + RECORD_HEADER_LEN <= size:
+                    sec, frac, caplen, length = record.unpack(f.read(RECORD_HEADER_LEN))
+                    if self.offset + RECORD_HEADER_LEN + caplen > size:
+                        break
+                    f.seek(caplen, os.SEEK_CUR)
+                    ts = sec + frac / self.divisor
+                    if self.first_ts is None:
+                        self.first_ts = ts
+                    self.last_ts = ts
+                    self.packets += 1
+                    self.bytes += length
+                    self.offset += RECORD_HEADER_LEN + caplen
+        except FileNotFoundError:
+            pass
+
+    def as_dict(self):
+        return {
+            'file': os.path.basename(self.path),
+            'first_ts': self.first_ts,
+            'last_ts': self.last_ts,
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'complete': self.complete,
+        }
+
+
+class CaptureManager:
+    """
+    Running tcpdump with rotated output segments, a retention cap and a sidecar index.
+
+    Args:
+        interface (str): Interface to capture on.
+        directory (str): Directory the segments and the index are written to.
+        prefix (str): Base name of the segments, e.g. 'middle_link_capture'.
+        bpf_filter (list or str): Optional capture filter.
+        rotate_seconds (int): Starting a new segment every this many seconds.
+        rotate_mb (int): Starting a new segment every this many megabytes (used when
+            rotate_seconds is not given).
+        keep (int): Maximum number of segments kept on disk (None keeps all of them).
+        snaplen (int): Bytes captured per packet, 0 for the full packet (default: the
+            profile's snaplen).
+        sudo (bool): Running tcpdump through sudo.
+        poll_interval (float): Seconds between index updates.
+        profile (str): 'full', 'headers', 'sampled' or 'summary' (see the module docstring).
+        sample (int): Keeping one packet in sample with the 'sampled' profile.
+    """
+
+    def __init__(self, interface, directory, prefix, bpf_filter=None, rotate_seconds=60, rotate_mb=None,
+                 keep=None, snaplen=None, sudo=False, poll_interval=1.0, profile='full', sample=1):
+        if profile not in PROFILES:
+            raise ValueError(f'Unknown capture profile {profile}, expected one of {", ".join(PROFILES)}')
+        self.interface = interface
+        self.directory = directory
+        self.prefix = prefix
+        if isinstance(bpf_filter, str):
+            bpf_filter = bpf_filter.split()
+        self.bpf_filter = list(bpf_filter or [])
+        self.rotate_seconds = rotate_seconds
+        self.rotate_mb = rotate_mb
+        self.keep = keep
+        self.snaplen = PROFILES[profile] if snaplen is None else snaplen
+        self.sudo = sudo
+        self.poll_interval = poll_interval
+        self.profile = profile
+        self.sample = max(1, int(sample)) if profile == 'sampled' else 1
+        # Sampled and summary captures read tcpdump's output from a pipe
+        self.piped = profile in ('sampled', 'summary')
+        self.index_path = os.path.join(directory, f'{prefix}.index.json')
+        self.summary_path = os.path.join(directory, f'{prefix}_summary.csv') if profile == 'summary' else None
+        self.packets_seen = 0
+
+        self.proc = None
+        self.ready = threading.Event()
+        self._scanners = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._monitor = None
+        self._reader = None
+        self._first_ts = None
+
+    def command(self):
+        """Building the tcpdump command line."""
+        cmd = ['sudo'] if self.sudo else []
+        cmd += ['tcpdump', '-U', '-n', '-s', str(self.snaplen), '-i', self.interface, '-Z', 'root']
+        if self.piped:
+            cmd += ['-w', '-']
+        elif self.rotate_seconds:
+            pattern = os.path.join(self.directory, f'{self.prefix}_%Y%m%d-%H%M%S.pcap')
+            cmd += ['-G', str(self.rotate_seconds), '-w', pattern]
+        else:
+            cmd += ['-C', str(self.rotate_mb or 100), '-w', os.path.join(self.directory, f'{self.prefix}.pcap')]
+        return cmd + self.bpf_filter
+
+    def start(self, timeout=5.0):
+        """
+        Starting tcpdump and the index monitor.
+        Waits until tcpdump reports that it is listening, or until timeout expires.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.proc = subprocess.Popen(self.command(), stdout=subprocess.PIPE if self.piped else subprocess.DEVNULL,
+                                     stderr=subprocess.PIPE, universal_newlines=False)
+        threading.Thread(target=self._watch_stderr, daemon=True).start()
+        if self.piped:
+            self._reader = threading.Thread(target=self._read_pipe, daemon=True)
+            self._reader.start()
+        self._monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+        self._monitor.start()
+        self.ready.wait(timeout)
+        return self
+
+    def stop(self):
+        """Stopping tcpdump gracefully with SIGINT and writing the final index."""
+        if self.proc is not None and self.proc.poll() is None:
+            try:
+                self.proc.send_signal(signal.SIGINT)
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+            except OSError as e:
+                print(f'Error stopping capture: {e}')
+        if self._reader is not None:
+            self._reader.join()
+        self._stop.set()
+        if self._monitor is not None:
+            self._monitor.join()
+        self.refresh(final=True)
+
+    def _watch_stderr(self):
+        """Forwarding tcpdump's stderr and flagging readiness once it is listening."""
+        for line in self.proc.stderr:
+            line = line.decode(errors='replace')
+            if 'listening on' in line:
+                self.ready.set()
+            else:
+                print(f'tcpdump[{self.interface}]: {line.rstrip()}')
+        self.ready.set()
+
+    def _read_pipe(self):
+        """Sampling or summarizing the packets tcpdump writes to its standard output."""
+        stream = self.proc.stdout
+        header = stream.read(GLOBAL_HEADER_LEN)
+        if len(header) < GLOBAL_HEADER_LEN or header[:4] not in PCAP_MAGICS:
+            return
+        endian, divisor = PCAP_MAGICS[header[:4]]
+        record = struct.Struct(endian + 'IIII')
+        if self.profile == 'summary':
+            sink = FlowSummary(self.summary_path, struct.unpack(endian + 'I', header[20:24])[0])
+        else:
+            sink = SegmentWriter(self.directory, self.prefix, header, self.rotate_seconds, self.rotate_mb)
+        try:
+            while True:
+                record_header = stream.read(RECORD_HEADER_LEN)
+                if len(record_header) < RECORD_HEADER_LEN:
+                    break
+                sec, frac, caplen, length = record.unpack(record_header)
+                data = stream.read(caplen)
+                if len(data) < caplen:
+                    break
+                ts = sec + frac / divisor
+                if self._first_ts is None:
+                    self._first_ts = ts
+                if self.profile == 'summary':
+                    sink.add(ts, length, data)
+                elif self.packets_seen % self.sample == 0:
+                    sink.write(ts, record_header + data)
+                self.packets_seen += 1
+        finally:
+            sink.close()
+
+    def _monitor_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            self.refresh()
+
+    def segment_paths(self):
+        """Returning the segment files currently on disk, oldest first."""
+        return segment_files(self.directory, self.prefix)
+
+    def refresh(self, final=False):
+        """Scanning new records, enforcing the retention cap and rewriting the index."""
+        with self._lock:
+            paths = self.segment_paths()
+            for path in paths:
+                if path not in self._scanners:
+                    self._scanners[path] = SegmentScanner(path)
+            # Every segment but the newest one is closed by tcpdump
+            for i, path in enumerate(paths):
+                scanner = self._scanners[path]
+                if not scanner.complete:
+                    try:
+                        scanner.scan()
+                    except (ValueError, OSError) as e:
+                        # Not a readable pcap: left out of the index instead of ending the monitor thread
+                        print(f'Skipping segment: {e}')
+                        scanner.complete = True
+                        continue
+                    scanner.complete = final or i < len(paths) - 1
+
+            if self.keep is not None and len(paths) > self.keep:
+                for path in paths[:len(paths) - self.keep]:
+                    for stale in (path, path + TIME_INDEX_SUFFIX):
+                        try:
+                            os.remove(stale)
+                        except FileNotFoundError:
+                            pass
+                paths = paths[len(paths) - self.keep:]
+            for path in list(self._scanners):
+                if path not in paths:
+                    del self._scanners[path]
+
+            index = {
+                'interface': self.interface,
+                'filter': ' '.join(self.bpf_filter),
+                'snaplen': self.snaplen,
+                'profile': self.profile,
+                'sample': self.sample,
+                'packets_seen': self.packets_seen if self.piped else None,
+                'summary': os.path.basename(self.summary_path) if self.summary_path else None,
+                'segments': [self._scanners[path].as_dict() for path in paths],
+            }
+            tmp = self.index_path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(index, f, indent=1)
+            os.replace(tmp, self.index_path)
+            return index
+
+    def first_timestamp(self):
+        """Returning the timestamp of the first captured packet, or None."""
+        with self._lock:
+            stamps = [s.first_ts for s in self._scanners.values() if s.first_ts is not None]
+        if self._first_ts is not None:
+            # Piped captures see packets before (or without) any segment on disk
+            stamps.append(self._first_ts)
+        return min(stamps) if stamps else None
+
+
+def read_index(directory, prefix):
+    """Loading the sidecar index written by a CaptureManager."""
+    with open(os.path.join(directory, f'{prefix}.index.json')) as f:
+        return json.load(f)
+
+
+def follow(directory, prefix, poll_interval=0.5, stop_event=None, from_start=False):
+    """
+    Tailing a rotating capture, following tcpdump from one segment to the next.
+
+    Args:
+        directory (str): Capture directory.
+        prefix (str): Segment base name.
+        poll_interval (float): Seconds to wait when no new record is available.
+        stop_event (threading.Event): Ending the generator once set and drained.
+        from_start (bool): Starting at the oldest segment instead of the newest one.
+    Yields:
+        tuple: (timestamp, wire length, captured bytes) for every new packet.
+    """
+    current = None
+    handle = None
+    record = None
+    divisor = None
+    while True:
+        paths = segment_files(directory, prefix)
+        if current is None and paths:
+            current = paths[0] if from_start else paths[-1]
+        if current is not None and handle is None:
+            try:
+                handle = open(current, 'rb')
+            except FileNotFoundError:
+                # Deleted by the retention cap before we got to it
+                later = [p for p in paths if _segment_key(p) > _segment_key(current)]
+                current = later[0] if later else None
+                continue
+            record = None
+
+        progressed = False
+        if handle is not None:
+            if record is None:
+                header = handle.read(GLOBAL_HEADER_LEN)
+                if len(header) == GLOBAL_HEADER_LEN and header[:4] in PCAP_MAGICS:
+                    endian, divisor = PCAP_MAGICS[header[:4]]
+                    record = struct.Struct(endian + 'IIII')
+                else:
+                    handle.seek(0)
+            while record is not None:
+                pos = handle.tell()
+                header = handle.read(RECORD_HEADER_LEN)
+                if len(header) == RECORD_HEADER_LEN:
+                    sec, frac, caplen, length = record.unpack(header)
+                    data = handle.read(caplen)
+                    if len(data) == caplen:
+                        progressed = True
+                        yield sec + frac / divisor, length, data
+                        continue
+                handle.seek(pos)
+                break
+
+            later = [p for p in paths if _segment_key(p) > _segment_key(current)]
+            if not progressed and later:
+                # tcpdump has moved on; the current segment will not grow any more
+                handle.close()
+                handle = None
+                current = later[0]
+                continue
+
+        if not progressed:
+            if stop_event is not None and stop_event.is_set():
+                break
+            time.sleep(poll_interval)
+    if handle is not None:
+        handle.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rotating tcpdump capture with a per-segment index.')
+    parser.add_argument('-i', '--interface', required=True, help='Interface to capture on')
+    parser.add_argument('-d', '--directory', default='pcap', help='Output directory (default: pcap)')
+    parser.add_argument('-p', '--prefix', default='capture', help='Segment base name (default: capture)')
+    parser.add_argument('--rotate-seconds', type=int, default=60, help='Segment length in seconds (default: 60)')
+    parser.add_argument('--rotate-mb', type=int, help='Rotate by size instead of time')
+    parser.add_argument('--keep', type=int, help='Maximum number of segments kept on disk')
+    parser.add_argument('--snaplen', type=int, default=None, help="Bytes captured per packet (default: the profile's)")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='full', help='Capture profile (default: full)')
+    parser.add_argument('--sample', type=int, default=1, help='Keep one packet in N with --profile sampled')
+    parser.add_argument('--duration', type=float, help='Stop after this many seconds')
+    parser.add_argument('filter', nargs='*', help='Optional BPF filter')
+    args = parser.parse_args()
+
+    manager = CaptureManager(args.interface, args.directory, args.prefix, args.filter,
+                             rotate_seconds=None if args.rotate_mb else args.rotate_seconds,
+                             rotate_mb=args.rotate_mb, keep=args.keep, snaplen=args.snaplen,
+                             profile=args.profile, sample=args.sample)
+    manager.start()
+    try:
+        if args.duration:
+            time.sleep(args.duration)
+        else:
+            manager.proc.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.stop()
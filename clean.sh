@@ -1,5 +1,14 @@
 #!/bin/bash
 
+# By default only the runs whose script has exited are cleaned up, using what each run
+# recorded in /tmp/topology_runs/. './clean.sh --full' wipes the whole machine as before.
+if [ "$1" != "--full" ]; then
+    echo "Tearing down the resources of stale runs..."
+    sudo python3 "$(dirname "$0")/run_registry.py" --stale
+    echo "Cleanup complete."
+    exit 0
+fi
+
 # Cleaning up Mininet
 echo "Cleaning up Mininet..."
 sudo mn -c
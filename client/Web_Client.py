@@ -2,10 +2,24 @@
 # -*- coding: utf-8 -*-
 
 # Importing necessary libraries
-import requests
+import argparse
+import csv
+import http.client
+import json
+import queue
+import random
+import signal
 import subprocess
+import threading
 import time
 import os
+from urllib.parse import urlsplit
+
+try:
+    import requests
+except ImportError:
+    # Only the sample-page loop needs requests; the load generator uses http.client
+    requests = None
 
 def start_tcpdump():
     """
@@ -37,22 +51,275 @@ def fetch_web_page():
         print("Server shut down.")
         raise
 
-if __name__ == "__main__":
-    # Starting the tcpdump process
-    tcpdump_proc = start_tcpdump()
-    # Waiting for 1 second to give tcpdump a moment to start
-    time.sleep(1)
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram of latencies in microseconds.
+    Values below 2^bits are counted exactly; above that, every power of two is split into
+    2^(bits-1) equal buckets, so the relative error stays below 2^-(bits-1) at any scale.
+    Args:
+        bits (int): Sub-bucket precision (7 gives < 1.6% error).
+        max_us (int): Largest recordable value; larger values are clamped to it.
+    """
+    def __init__(self, bits=7, max_us=60 * 10 ** 6):
+        self.bits = bits
+        self.half = 1 << (bits - 1)
+        self.max_us = max_us
+        self.counts = [0] * (self._index(max_us) + 1)
+        self.total = 0
+        self.max = 0
 
-    try:
-        # Continuously fetching the web page until the server shuts down
+    def _index(self, value):
+        if value < (1 << self.bits):
+            return value
+        shift = value.bit_length() - self.bits
+        return (1 << self.bits) + (shift - 1) * self.half + ((value >> shift) - self.half)
+
+    def _value(self, index):
+        """Returning the upper bound of a bucket."""
+        if index < (1 << self.bits):
+            return index
+        shift, offset = divmod(index - (1 << self.bits), self.half)
+        shift += 1
+        return (((offset + self.half) + 1) << shift) - 1
+
+    def record(self, us):
+        us = min(max(int(us), 0), self.max_us)
+        self.counts[self._index(us)] += 1
+        self.total += 1
+        self.max = max(self.max, us)
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        """Returning the latency (us) below which q percent of the recorded values lie."""
+        if not self.total:
+            return 0
+        rank = max(1, int(round(q / 100.0 * self.total)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._value(index), self.max)
+        return self.max
+
+    def buckets(self):
+        """Returning the non-empty buckets as (upper bound us, count) pairs."""
+        return [(self._value(index), count) for index, count in enumerate(self.counts) if count]
+
+def poisson_arrivals(rate, duration, seed=None):
+    """
+    Generating open-loop arrival offsets of a Poisson process.
+    Args:
+        rate (float): Mean requests per second.
+        duration (float): Seconds to generate arrivals for (None: forever).
+    Yields:
+        tuple: (offset in seconds, path or None).
+    """
+    rng = random.Random(seed)
+    offset = 0.0
+    while True:
+        offset += rng.expovariate(rate)
+        if duration is not None and offset > duration:
+            return
+        yield offset, None
+
+def trace_arrivals(path):
+    """
+    Reading arrival offsets from a CSV trace with lines 'time[,path]' (seconds since the start).
+    Yields:
+        tuple: (offset in seconds, path or None).
+    """
+    with open(path) as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith('#'):
+                continue
+            try:
+                offset = float(row[0])
+            except ValueError:
+                # Header line
+                continue
+            yield offset, (row[1].strip() if len(row) > 1 and row[1].strip() else None)
+
+class LoadGenerator:
+    """
+    Issuing open-loop GET requests over a pool of persistent connections.
+    Requests are released at their arrival times whether or not earlier ones have
+    completed; a request waits in the queue while all connections are busy, and its
+    latency is measured from its scheduled arrival, so queueing delay is included.
+    Args:
+        url (str): Base URL, e.g. http://10.0.0.9:80/.
+        connections (int): Number of pooled keep-alive connections (worker threads).
+        arrivals: Iterable of (offset, path) pairs.
+        interval (float): Seconds between reported percentiles.
+        out_prefix (str): Results prefix; writes <prefix>.csv and <prefix>_summary.json.
+        timeout (float): Socket timeout of a request.
+    """
+    def __init__(self, url, connections, arrivals, interval=1.0, out_prefix=None, timeout=10.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or '/'
+        self.connections = connections
+        self.arrivals = arrivals
+        self.interval = interval
+        self.out_prefix = out_prefix
+        self.timeout = timeout
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.current = LatencyHistogram()
+        self.overall = LatencyHistogram()
+        self.errors = 0
+        self.total_errors = 0
+        self.bytes = 0
+        self.stopped = threading.Event()
+
+    def _connect(self):
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _worker(self):
+        conn = self._connect()
         while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            scheduled, path = item
             try:
-                fetch_web_page()  # Fetching the web page
-            except requests.exceptions.ConnectionError:
-                print("Server shut down.")
-                break  # Exiting the loop if the server shuts down
-            # Waiting for 1 second before fetching the web page again
-            time.sleep(1)
-    finally:
-        # Stopping the tcpdump process
-        stop_tcpdump(tcpdump_proc)
+                conn.request('GET', path or self.path)
+                response = conn.getresponse()
+                size = len(response.read())
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                # Reopening the connection; the request counts as an error
+                conn.close()
+                conn = self._connect()
+                size, ok = 0, False
+            latency = (time.monotonic() - scheduled) * 1e6
+            with self.lock:
+                if ok:
+                    self.current.record(latency)
+                    self.bytes += size
+                else:
+                    self.errors += 1
+        conn.close()
+
+    def _dispatch(self, start):
+        for offset, path in self.arrivals:
+            scheduled = start + offset
+            if self.stopped.wait(max(0.0, scheduled - time.monotonic())):
+                break
+            self.queue.put((scheduled, path))
+        self.stopped.set()
+
+    def run(self):
+        """
+        Running until the arrivals are exhausted or stop() is called.
+        Returns:
+            dict: Overall summary (requests, errors, percentiles in ms).
+        """
+        workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.connections)]
+        for worker in workers:
+            worker.start()
+        start = time.monotonic()
+        dispatcher = threading.Thread(target=self._dispatch, args=(start,), daemon=True)
+        dispatcher.start()
+
+        out = open(self.out_prefix + '.csv', 'w', newline='') if self.out_prefix else None
+        writer = csv.writer(out) if out else None
+        if writer:
+            writer.writerow(['time', 'requests', 'errors', 'queued', 'mbit_per_s', 'p50_ms', 'p99_ms', 'p999_ms', 'max_ms'])
+        deadline = start
+        try:
+            while True:
+                deadline += self.interval
+                finished = self.stopped.wait(max(0.0, deadline - time.monotonic()))
+                if finished:
+                    # Letting the queued requests drain before the last report
+                    for _ in workers:
+                        self.queue.put(None)
+                    for worker in workers:
+                        worker.join(self.timeout)
+                self._report(writer)
+                if finished:
+                    break
+        finally:
+            self.stopped.set()
+            if out:
+                out.close()
+        return self._summary()
+
+    def _report(self, writer):
+        with self.lock:
+            hist, self.current = self.current, LatencyHistogram()
+            errors, self.errors = self.errors, 0
+            sent, self.bytes = self.bytes, 0
+        self.overall.merge(hist)
+        self.total_errors += errors
+        row = [f'{time.time():.3f}', hist.total, errors, self.queue.qsize(), f'{sent * 8 / self.interval / 1e6:.3f}',
+               f'{hist.percentile(50) / 1e3:.2f}', f'{hist.percentile(99) / 1e3:.2f}',
+               f'{hist.percentile(99.9) / 1e3:.2f}', f'{hist.max / 1e3:.2f}']
+        print(f"{hist.total} req, {errors} err, {row[4]} Mbit/s, p50 {row[5]} ms, p99 {row[6]} ms, p99.9 {row[7]} ms")
+        if writer:
+            writer.writerow(row)
+
+    def _summary(self):
+        hist = self.overall
+        summary = {
+            'requests': hist.total, 'errors': self.total_errors, 'connections': self.connections,
+            'p50_ms': hist.percentile(50) / 1e3, 'p90_ms': hist.percentile(90) / 1e3,
+            'p99_ms': hist.percentile(99) / 1e3, 'p999_ms': hist.percentile(99.9) / 1e3, 'max_ms': hist.max / 1e3,
+            'histogram_us': hist.buckets(),
+        }
+        if self.out_prefix:
+            with open(self.out_prefix + '_summary.json', 'w') as f:
+                json.dump(summary, f, indent=1)
+        return summary
+
+    def stop(self):
+        self.stopped.set()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sample web client and open-loop load generator')
+    parser.add_argument('--load', action='store_true', help='Run the open-loop load generator instead of the sample loop')
+    parser.add_argument('--url', default='http://10.0.0.4:8000/', help='Base URL of the server')
+    parser.add_argument('--connections', type=int, default=8, help='Pooled keep-alive connections')
+    parser.add_argument('--rate', type=float, default=20.0, help='Mean Poisson arrival rate in requests per second')
+    parser.add_argument('--trace', default=None, help="CSV of arrival offsets 'time[,path]' replacing the Poisson arrivals")
+    parser.add_argument('--duration', type=float, default=None, help='Seconds to generate load for (default: until interrupted)')
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between latency reports')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the Poisson arrivals')
+    parser.add_argument('--out', default='pcap/web_latency', help='Results prefix (<out>.csv, <out>_summary.json)')
+    args = parser.parse_args()
+
+    if args.load:
+        arrivals = trace_arrivals(args.trace) if args.trace else poisson_arrivals(args.rate, args.duration, args.seed)
+        generator = LoadGenerator(args.url, args.connections, arrivals, args.interval, args.out)
+        # Stopping cleanly (and writing the results) when the topology script terminates us
+        signal.signal(signal.SIGTERM, lambda signum, frame: generator.stop())
+        signal.signal(signal.SIGINT, lambda signum, frame: generator.stop())
+        summary = generator.run()
+        print(f"{summary['requests']} requests, {summary['errors']} errors, p50 {summary['p50_ms']:.2f} ms, "
+              f"p99 {summary['p99_ms']:.2f} ms, p99.9 {summary['p999_ms']:.2f} ms")
+    else:
+        # Starting the tcpdump process
+        tcpdump_proc = start_tcpdump()
+        # Waiting for 1 second to give tcpdump a moment to start
+        time.sleep(1)
+
+        try:
+            # Continuously fetching the web page until the server shuts down
+            while True:
+                try:
+                    fetch_web_page()  # Fetching the web page
+                except requests.exceptions.ConnectionError:
+                    print("Server shut down.")
+                    break  # Exiting the loop if the server shuts down
+                # Waiting for 1 second before fetching the web page again
+                time.sleep(1)
+        finally:
+            # Stopping the tcpdump process
+            stop_tcpdump(tcpdump_proc)
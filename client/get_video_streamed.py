@@ -6,42 +6,46 @@ import os
 import signal
 import time
 
-def start_capture():
+from capture import CaptureManager
+from qoe_telemetry import ProgressRecorder
+
+def start_capture(profile="full"):
     """
     Starting capturing network traffic using tcpdump.
+    Packets are written to rotated pcap/client_*.pcap segments indexed in pcap/client.index.json.
+    The default 'full' profile keeps whole packets, as video_server.py replays them;
+    'headers' truncates them to their headers.
     """
-    proc = subprocess.Popen(["tcpdump", "-U", "-s0", "-i", "client-eth0", "src", "port", "1935", "-w", "pcap/client.pcap"])
-    return proc.pid
+    return CaptureManager("client-eth0", "pcap", "client", ["src", "port", "1935"], rotate_seconds=60,
+                          profile=profile).start()
 
-def stop_capture(pid):
+def stop_capture(capture):
     """
     Stopping the tcpdump process gracefully by sending a SIGINT signal.
     """
-    try:
-        os.kill(pid, signal.SIGINT)
-        print("Capture stopped successfully.")
-    except OSError as e:
-        print(f"Error stopping capture: {e}")
+    capture.stop()
+    print("Capture stopped successfully.")
 
 def get_video_stream():
     """
     Main function to handle video streaming.
     """
     out_file = "stream_output.flv"
+    qoe_file = "pcap/qoe_client.bin"
     capture_traffic = True
+    capture_profile = "full"  # "headers" keeps every packet but not the video payload
 
     if capture_traffic:
-        pid = start_capture() # Starting to capture traffic
-        time.sleep(2)
+        capture = start_capture(capture_profile) # Starting to capture traffic, returns once tcpdump is listening
 
     ffmpeg_command = [
         "ffmpeg", "-loglevel", "info", "-stats", "-i", "rtmp://10.0.0.1:1935/live/video.flv",
         "-t", "600", "-probesize", "80000", "-analyzeduration", "15", "-c:a", "copy", "-c:v", "copy", out_file
     ]
-    subprocess.run(ffmpeg_command)
+    ProgressRecorder(qoe_file).run(ffmpeg_command)
 
     if capture_traffic:
-        stop_capture(pid) # Stopping the capturing
+        stop_capture(capture) # Stopping the capturing
 
 
 
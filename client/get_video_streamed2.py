@@ -1,27 +1,79 @@
 #!/bin/env python3
 # -*- coding: utf-8 -*-
 
-import subprocess
+import argparse
+import socket
+import threading
+import time
 
-def get_video_stream():
+from qoe_telemetry import FrameRecorder, ProgressRecorder
+
+SERVER_URL = "rtmp://10.0.0.1:1935/live"
+
+def viewer_command(stream, duration, out_file=None):
     """
-    Main function to handle video streaming.
-    Streams from an RTMP source and writes the output to a file.
+    Building the ffmpeg command of one viewer. Without an output file the stream is
+    only demuxed and discarded, so that hundreds of viewers don't fill the disk.
     """
-    out_file = "stream_output.flv"
-
-    ffmpeg_command = [
-        "ffmpeg", "-loglevel", "info", "-stats",
-        "-i", "rtmp://10.0.0.1:1935/live/video.flv",
-        "-t", "600",              # Stream duration in seconds
+    command = [
+        "ffmpeg", "-loglevel", "warning", "-stats",
+        "-i", f"{SERVER_URL}/{stream}",
+        "-t", str(duration),      # Stream duration in seconds
         "-probesize", "80000",
         "-analyzeduration", "15",
         "-c:a", "copy",           # Copy audio without re-encoding
         "-c:v", "copy",           # Copy video without re-encoding
-        out_file
     ]
-    
-    subprocess.run(ffmpeg_command)
+    return command + ([out_file] if out_file else ["-f", "null", "-"])
+
+def start_viewer(stream, duration, output, suffix):
+    """
+    Pulling one stream until it ends, in the given output mode:
+    'file' saves the stream to stream_output<suffix>.flv, 'null' discards it, and 'frames' only
+    logs per-frame metadata (pts, size, keyframe, arrival time) to pcap/frames_<host>.bin.
+    """
+    hostname = socket.gethostname()
+    if output == "frames":
+        FrameRecorder(f"pcap/frames_{hostname}{suffix}.bin").run(f"{SERVER_URL}/{stream}", duration)
+    else:
+        # Every viewer writes its own file
+        out_file = f"stream_output{suffix}.flv" if output == "file" else None
+        ProgressRecorder(f"pcap/qoe_{hostname}{suffix}.bin").run(viewer_command(stream, duration, out_file))
+
+def get_video_stream(duration=600, viewers=1, streams=("video.flv",), ramp=0.0, output=None):
+    """
+    Main function to handle video streaming.
+    Pulls the RTMP stream(s) with the given number of concurrent viewers, assigned to the
+    streams round-robin and started evenly over ramp seconds. The QoE samples (bitrate,
+    fps, speed, stalls) or frame logs of every viewer are recorded to the shared pcap/ volume.
+    """
+    if viewers == 1:
+        # A single viewer keeps the previous behaviour: the stream is saved to a file
+        start_viewer(streams[0], duration, output or "file", "")
+        return
+
+    threads = []
+    for i in range(viewers):
+        stream = streams[i % len(streams)]
+        thread = threading.Thread(target=start_viewer, args=(stream, duration, output or "null", f"_{i + 1}"),
+                                  daemon=True)
+        thread.start()
+        threads.append(thread)
+        if ramp:
+            time.sleep(ramp / viewers)
+    print(f"Started {viewers} viewers on {len(streams)} stream(s)")
+    for thread in threads:
+        thread.join()
 
 if __name__ == "__main__":
-    get_video_stream()
+    parser = argparse.ArgumentParser(description="Pull the RTMP stream and record QoE telemetry.")
+    parser.add_argument("--duration", type=int, default=600, help="Stream duration in seconds (default: 600)")
+    parser.add_argument("--viewers", type=int, default=1, help="Concurrent viewers in this container (default: 1)")
+    parser.add_argument("--streams", default="video.flv",
+                        help="Comma-separated stream names the viewers are spread over (default: video.flv)")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds over which the viewers join (default: 0)")
+    parser.add_argument("--output", choices=["file", "null", "frames"], default=None,
+                        help="Save the stream to a file, discard it, or only log per-frame metadata "
+                             "(default: file for one viewer, null for several)")
+    args = parser.parse_args()
+    get_video_stream(args.duration, args.viewers, args.streams.split(","), args.ramp, args.output)
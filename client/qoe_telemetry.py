@@ -0,0 +1,322 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Live QoE telemetry for the ffmpeg streaming client.
+
+ffmpeg is run with '-progress pipe:1', which prints blocks of key=value lines ending
+with 'progress=continue' (or 'progress=end'). Each block becomes one fixed-size binary
+sample (bitrate, fps, frame count, speed, drop/dup counters) appended to a file in the
+shared pcap/ volume, and stalls are detected while the stream is running: playback is
+stalled while ffmpeg's speed stays below 1.0x or the frame counter stops advancing for
+longer than the stall threshold.
+
+FrameRecorder is the disk-free alternative: ffprobe pulls the stream and prints one line
+per video packet (pts, size, keyframe flag) without muxing it anywhere, and each packet
+becomes a fixed-size record with its arrival wall-clock time. Startup delay, rebuffering
+(replaying the arrivals through a playout buffer) and frame-gap statistics are computed
+from that log afterwards, without keeping any media.
+
+Usage of the reader:
+    python3 qoe_telemetry.py pcap/qoe_client.bin
+    python3 qoe_telemetry.py pcap/frames_client.bin
+"""
+
+import argparse
+import shutil
+import struct
+import subprocess
+import time
+
+MAGIC = b'QOE1'
+# wall time, media time (s), frame, fps, bitrate (kbit/s), speed, total size, drop, dup, stalled
+RECORD = struct.Struct('<ddIfffQIIB')
+FIELDS = ('wall', 'media_time', 'frame', 'fps', 'bitrate', 'speed', 'total_size', 'drop_frames',
+          'dup_frames', 'stalled')
+
+FRAME_MAGIC = b'FRM1'
+# arrival wall time, pts (s), packet size, keyframe
+FRAME_RECORD = struct.Struct('<ddIB')
+FRAME_FIELDS = ('wall', 'pts', 'size', 'key')
+
+
+def _number(value, suffix=''):
+    """Parsing ffmpeg progress values such as '1234.5kbits/s', '1.02x' or 'N/A'."""
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+class StallDetector:
+    """
+    Tracking stalls from successive progress samples.
+
+    Args:
+        threshold (float): Seconds the speed has to stay below min_speed (or the frame
+            counter has to stay flat) before a stall is declared.
+        min_speed (float): Playback speed below which the client is falling behind.
+    """
+
+    def __init__(self, threshold=1.0, min_speed=1.0):
+        self.threshold = threshold
+        self.min_speed = min_speed
+        self.stalls = []
+        self._slow_since = None
+        self._last_frame = None
+        self._stalled = False
+
+    def update(self, wall, frame, speed):
+        """Feeding one sample and returning whether playback is stalled."""
+        advancing = self._last_frame is None or frame > self._last_frame
+        self._last_frame = frame
+        slow = speed < self.min_speed or not advancing
+        if not slow:
+            if self._stalled:
+                self.stalls[-1][1] = wall
+            self._slow_since = None
+            self._stalled = False
+        elif self._slow_since is None:
+            self._slow_since = wall
+        elif not self._stalled and wall - self._slow_since >= self.threshold:
+            self._stalled = True
+            self.stalls.append([self._slow_since, None])
+        return self._stalled
+
+
+class ProgressRecorder:
+    """
+    Running an ffmpeg command with a machine-readable progress channel and recording
+    its samples.
+
+    Args:
+        out_path (str): Binary time-series file.
+        stall_threshold (float): See StallDetector.
+        flush_every (int): Samples buffered before the file is flushed.
+    """
+
+    def __init__(self, out_path, stall_threshold=1.0, flush_every=16):
+        self.out_path = out_path
+        self.detector = StallDetector(stall_threshold)
+        self.flush_every = flush_every
+        self.samples = 0
+
+    def run(self, ffmpeg_command):
+        """
+        Running ffmpeg until it exits. '-progress pipe:1 -nostats' is added in front of
+        the command's options.
+
+        Returns:
+            int: ffmpeg's exit code.
+        """
+        command = [ffmpeg_command[0], '-progress', 'pipe:1', '-nostats'] + \
+            [arg for arg in ffmpeg_command[1:] if arg != '-stats']
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, universal_newlines=True, bufsize=1)
+        pack = RECORD.pack
+        with open(self.out_path, 'wb') as out:
+            out.write(MAGIC)
+            block = {}
+            for line in proc.stdout:
+                key, sep, value = line.partition('=')
+                if not sep:
+                    continue
+                key = key.strip()
+                if key != 'progress':
+                    block[key] = value.strip()
+                    continue
+                if not block:
+                    continue
+                wall = time.time()
+                frame = int(_number(block.get('frame', '0')))
+                speed = _number(block.get('speed', '0'), 'x')
+                stalled = self.detector.update(wall, frame, speed)
+                media_time = _number(block.get('out_time_us') or block.get('out_time_ms') or '0') / 1e6
+                out.write(pack(wall, media_time,
+                               frame, _number(block.get('fps', '0')), _number(block.get('bitrate', '0'), 'kbits/s'),
+                               speed, int(_number(block.get('total_size', '0'))),
+                               int(_number(block.get('drop_frames', '0'))), int(_number(block.get('dup_frames', '0'))),
+                               stalled))
+                self.samples += 1
+                if self.samples % self.flush_every == 0:
+                    out.flush()
+                block = {}
+        code = proc.wait()
+        stalls = self.detector.stalls
+        if stalls and stalls[-1][1] is None:
+            stalls[-1][1] = time.time()
+        print(f"QoE: {self.samples} samples, {len(stalls)} stalls, "
+              f"{sum(end - start for start, end in stalls):.1f} s stalled -> {self.out_path}")
+        return code
+
+
+class FrameRecorder:
+    """
+    Pulling a stream with ffprobe and logging one record per video packet, without
+    writing the media anywhere.
+
+    Args:
+        out_path (str): Binary frame log. Its header holds the time the stream was requested.
+        flush_every (int): Records buffered before the file is flushed.
+    """
+
+    def __init__(self, out_path, flush_every=256):
+        self.out_path = out_path
+        self.flush_every = flush_every
+        self.frames = 0
+
+    @staticmethod
+    def command(url, duration):
+        command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,size,flags',
+                   '-of', 'csv=p=0', '-read_intervals', f'%+{duration}', url]
+        # ffprobe's stdout is block-buffered on a pipe, which would delay the arrival times
+        if shutil.which('stdbuf'):
+            command = ['stdbuf', '-oL'] + command
+        return command
+
+    def run(self, url, duration):
+        """
+        Pulling url for duration seconds (or until the stream ends).
+
+        Returns:
+            int: ffprobe's exit code.
+        """
+        pack = FRAME_RECORD.pack
+        requested = time.time()
+        proc = subprocess.Popen(self.command(url, duration), stdout=subprocess.PIPE, universal_newlines=True,
+                                bufsize=1)
+        with open(self.out_path, 'wb') as out:
+            out.write(FRAME_MAGIC + struct.pack('<d', requested))
+            for line in proc.stdout:
+                wall = time.time()
+                parts = line.strip().split(',')
+                if len(parts) < 3:
+                    continue
+                pts_time, size, flags = parts[:3]
+                try:
+                    out.write(pack(wall, float(pts_time), int(size), 'K' in flags))
+                except ValueError:
+                    # pts is N/A for some packets
+                    continue
+                self.frames += 1
+                if self.frames % self.flush_every == 0:
+                    out.flush()
+        code = proc.wait()
+        stats = frame_stats(*read_frames(self.out_path))
+        print(f"Frames: {self.frames} packets, startup {stats['startup_delay']:.2f} s, "
+              f"{stats['rebuffer_events']} rebuffers ({stats['rebuffer_time']:.1f} s), "
+              f"max gap {stats['max_gap'] * 1e3:.0f} ms -> {self.out_path}")
+        return code
+
+
+def read_frames(path):
+    """
+    Reading a frame log.
+
+    Returns:
+        tuple: (time the stream was requested, list of one dict per packet).
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(FRAME_MAGIC)) != FRAME_MAGIC:
+            raise ValueError(f'{path}: not a frame log')
+        requested, = struct.unpack('<d', f.read(8))
+        data = f.read()
+    usable = len(data) - len(data) % FRAME_RECORD.size
+    return requested, [dict(zip(FRAME_FIELDS, values)) for values in FRAME_RECORD.iter_unpack(data[:usable])]
+
+
+def frame_stats(requested, frames, prebuffer=2.0, gap_threshold=0.5):
+    """
+    Computing startup delay, rebuffering and frame-gap statistics from a frame log.
+
+    Playback is replayed through a playout buffer: it starts once prebuffer seconds of
+    media (from the first keyframe) have arrived, then consumes media in real time. When
+    a packet arrives after its playout deadline the player rebuffers until prebuffer
+    seconds are buffered again.
+
+    Args:
+        requested (float): Wall time the stream was requested.
+        frames (list): Packets as returned by read_frames.
+        prebuffer (float): Seconds of media buffered before playback (re)starts.
+        gap_threshold (float): Inter-arrival gaps above this count as frame gaps.
+    Returns:
+        dict: Statistics (times in seconds).
+    """
+    stats = {'frames': len(frames), 'bytes': sum(f['size'] for f in frames), 'startup_delay': 0.0,
+             'first_keyframe': None, 'rebuffer_events': 0, 'rebuffer_time': 0.0, 'gaps': 0, 'max_gap': 0.0,
+             'p99_gap': 0.0}
+    start = next((i for i, f in enumerate(frames) if f['key']), None)
+    if start is None:
+        return stats
+    frames = frames[start:]
+    stats['first_keyframe'] = frames[0]['wall'] - requested
+
+    gaps = sorted(b['wall'] - a['wall'] for a, b in zip(frames, frames[1:]))
+    if gaps:
+        stats['max_gap'] = gaps[-1]
+        stats['p99_gap'] = gaps[min(len(gaps) - 1, int(0.99 * len(gaps)))]
+        stats['gaps'] = sum(1 for gap in gaps if gap > gap_threshold)
+
+    # Playout: 'origin' maps media time to wall time while playing
+    base_pts = frames[0]['pts']
+    origin = None
+    buffering_since = requested
+    playing = False
+    for i, frame in enumerate(frames):
+        media = frame['pts'] - base_pts
+        if origin is not None and frame['wall'] > origin + media:
+            # The packet missed its deadline: the player ran dry when it was due
+            stats['rebuffer_events'] += 1
+            buffering_since = origin + media
+            origin = None
+        if origin is None:
+            # Buffering until prebuffer seconds ahead of this packet have arrived
+            if i + 1 < len(frames) and frames[-1]['pts'] - base_pts - media >= prebuffer:
+                j = i
+                while frames[j]['pts'] - frame['pts'] < prebuffer:
+                    j += 1
+                resume = max(frames[j]['wall'], frame['wall'])
+            else:
+                resume = frame['wall']
+            if playing:
+                stats['rebuffer_time'] += resume - buffering_since
+            else:
+                stats['startup_delay'] = resume - requested
+                playing = True
+            origin = resume - media
+    return stats
+
+
+def read_samples(path):
+    """
+    Reading a QoE time-series file.
+
+    Returns:
+        list: One dict per sample.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path}: not a QoE telemetry file')
+        data = f.read()
+    usable = len(data) - len(data) % RECORD.size
+    return [dict(zip(FIELDS, values)) for values in RECORD.iter_unpack(data[:usable])]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarizing a QoE telemetry file.')
+    parser.add_argument('path', help='e.g. pcap/qoe_client.bin')
+    args = parser.parse_args()
+
+    with open(args.path, 'rb') as f:
+        magic = f.read(len(FRAME_MAGIC))
+    if magic == FRAME_MAGIC:
+        for key, value in frame_stats(*read_frames(args.path)).items():
+            print(f'{key}: {value:.3f}' if isinstance(value, float) else f'{key}: {value}')
+        raise SystemExit
+    samples = read_samples(args.path)
+    if samples:
+        stalled = sum(1 for s in samples if s['stalled'])
+        print(f"{len(samples)} samples over {samples[-1]['wall'] - samples[0]['wall']:.1f} s, "
+              f"{samples[-1]['frame']} frames, {stalled} stalled samples, "
+              f"{samples[-1]['drop_frames']} dropped, {samples[-1]['dup_frames']} duplicated")
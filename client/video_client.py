@@ -1,39 +1,47 @@
 #!/bin/env python3
 # -*- coding: utf-8 -*-
 
-import subprocess
-import os
-import signal
+import argparse
 import time
 
-def start_capture(output_file):
+from capture import CaptureManager
+
+def start_capture(interface, prefix, profile="full", sample=1):
     """
-    Start capturing network traffic using tcpdump on the specified interface.
+    Start capturing network traffic using tcpdump on the specified interface, into
+    rotated pcap/<prefix>_*.pcap segments as kept by the capture profile. Returns once
+    tcpdump is listening.
     """
-    proc = subprocess.Popen(["tcpdump", "-U", "-s0", "-i", "eth0", "-w", output_file])
-    return proc.pid
+    return CaptureManager(interface, "pcap", prefix, rotate_seconds=60, profile=profile, sample=sample).start()
 
-def stop_capture(pid):
+def stop_capture(capture):
     """
     Stop the tcpdump process gracefully by sending a SIGINT signal.
     """
-    try:
-        os.kill(pid, signal.SIGINT)
-        print("Capture stopped successfully.")
-    except OSError as e:
-        print(f"Error stopping capture: {e}")
+    capture.stop()
+    print("Capture stopped successfully.")
 
 def main():
     """
     Main function to handle traffic capture during the PCAP replay.
+    Must be started before video_server.py starts replaying.
     """
-    capture_traffic = True
-    output_pcap_file = "pcap/client_new_capture.pcap"
+    parser = argparse.ArgumentParser(description="Capture the replayed traffic on the client.")
+    parser.add_argument("--interface", default="eth0", help="Interface to capture from")
+    parser.add_argument("--output", default="client_new_capture", help="Prefix of the capture segments in pcap/")
+    parser.add_argument("--duration", type=float, default=120, help="Seconds to capture for (default: 120)")
+    parser.add_argument("--capture-profile", choices=["full", "headers", "sampled", "summary"], default="full",
+                        help="What the capture keeps of each packet (default: full)")
+    parser.add_argument("--sample", type=int, default=1, help="Keep one packet in N with --capture-profile sampled")
+    args = parser.parse_args()
 
-    if capture_traffic:
-        pid = start_capture(output_pcap_file)  # Start capturing traffic
-        time.sleep(120)  # Wait for 2 minutes to capture traffic during replay
-        stop_capture(pid)  # Stop capturing traffic
+    capture = start_capture(args.interface, args.output, args.capture_profile, args.sample)  # Start capturing traffic
+    print("Capture listening, waiting for the replay")
+    try:
+        time.sleep(args.duration)  # Capture traffic during the replay
+    except KeyboardInterrupt:
+        pass
+    stop_capture(capture)  # Stop capturing traffic
 
 if __name__ == "__main__":
     main()
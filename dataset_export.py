@@ -0,0 +1,250 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Exporting captures as a labelled, columnar training dataset.
+
+The pcap segments are streamed in bounded-size chunks (PcapReader.chunks), every packet
+or fixed time bin is joined with the middle-link state that was active at that moment
+(bw, delay, jitter, loss from link_changes.jsonl) and the number of iperf flows running
+(iperf_flows.csv), and the rows are written as compressed shards: Parquet when pyarrow
+is installed, .npz otherwise. Memory use depends on the chunk and shard sizes only,
+not on the size of the capture.
+"""
+
+import argparse
+import csv
+import json
+import os
+
+import numpy as np
+
+from pcap_analysis import IPPROTO_TCP, IPPROTO_UDP, PcapReader
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+LINK_COLUMNS = ('bw', 'delay', 'jitter', 'loss')
+PACKET_COLUMNS = ('ts', 'length', 'src', 'dst', 'sport', 'dport', 'proto', 'tcp_flags')
+
+
+class LinkLabels:
+    """
+    Looking up the link state and the number of active iperf flows at given timestamps.
+
+    Args:
+        link_log (str): JSONL written by LinkScheduler (one record per applied change).
+        flows (str): CSV results table written by TrafficEngine.
+        link (str): Name of the link whose state is used.
+    """
+
+    def __init__(self, link_log=None, flows=None, link='middle'):
+        changes = []
+        if link_log and os.path.exists(link_log):
+            with open(link_log) as f:
+                for line in f:
+                    record = json.loads(line)
+                    # Failed changes left the link as it was
+                    if record.get('link') == link and 'error' not in record:
+                        changes.append(record)
+        changes.sort(key=lambda r: r['wall'])
+        self.change_times = np.array([r['wall'] for r in changes], dtype=np.float64)
+        # Row 0 is the state before the first logged change (unknown)
+        self.states = {col: np.array([np.nan] + [float(r.get(col, 0) or 0) for r in changes]) for col in LINK_COLUMNS}
+
+        starts, ends = [], []
+        if flows and os.path.exists(flows):
+            with open(flows) as f:
+                for row in csv.DictReader(f):
+                    if row.get('role') == 'client' and row.get('started'):
+                        starts.append(float(row['started']))
+                        ends.append(float(row['ended']) if row.get('ended') else np.inf)
+        self.flow_starts = np.sort(np.array(starts, dtype=np.float64))
+        self.flow_ends = np.sort(np.array(ends, dtype=np.float64))
+
+    def label(self, ts):
+        """Returning a dict of label columns for an array of timestamps."""
+        index = np.searchsorted(self.change_times, ts, side='right')
+        labels = {col: self.states[col][index] for col in LINK_COLUMNS}
+        labels['active_flows'] = (np.searchsorted(self.flow_starts, ts, side='right')
+                                  - np.searchsorted(self.flow_ends, ts, side='right')).astype(np.int32)
+        return labels
+
+
+class ShardWriter:
+    """
+    Buffering columns and writing them as numbered shards of at most shard_rows rows.
+
+    Args:
+        out_dir (str): Output directory.
+        shard_rows (int): Rows per shard.
+        fmt (str): 'parquet' or 'npz' (default: parquet when pyarrow is available).
+    """
+
+    def __init__(self, out_dir, shard_rows=1_000_000, fmt=None):
+        self.out_dir = out_dir
+        self.shard_rows = shard_rows
+        self.fmt = fmt or ('parquet' if pyarrow is not None else 'npz')
+        if self.fmt == 'parquet' and pyarrow is None:
+            raise ImportError('pyarrow is required for Parquet output')
+        self.shards = []
+        self.rows = 0
+        self._buffer = []
+        self._buffered = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+    def append(self, columns):
+        n = len(next(iter(columns.values())))
+        if n == 0:
+            return
+        self._buffer.append(columns)
+        self._buffered += n
+        while self._buffered >= self.shard_rows:
+            self._flush(self.shard_rows)
+
+    def _flush(self, limit):
+        merged = {key: np.concatenate([part[key] for part in self._buffer]) for key in self._buffer[0]}
+        head = {key: value[:limit] for key, value in merged.items()}
+        rest = {key: value[limit:] for key, value in merged.items()}
+        self._buffered = len(next(iter(rest.values())))
+        self._buffer = [rest] if self._buffered else []
+        self._write(head)
+
+    def _write(self, columns):
+        name = f'shard-{len(self.shards):05d}.{self.fmt}'
+        path = os.path.join(self.out_dir, name)
+        if self.fmt == 'parquet':
+            table = pyarrow.table({key: pyarrow.array(value) for key, value in columns.items()})
+            pyarrow.parquet.write_table(table, path, compression='zstd')
+        else:
+            np.savez_compressed(path, **columns)
+        n = len(next(iter(columns.values())))
+        self.shards.append({'file': name, 'rows': n})
+        self.rows += n
+
+    def close(self, metadata=None):
+        """Writing the last partial shard and the manifest."""
+        if self._buffered:
+            self._flush(self._buffered)
+        manifest = dict(metadata or {}, format=self.fmt, rows=self.rows, shards=self.shards)
+        with open(os.path.join(self.out_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1)
+        return manifest
+
+
+class BinAccumulator:
+    """
+    Aggregating packets into fixed time bins across chunks. The last (possibly still
+    filling) bin of a chunk is carried over to the next one.
+    """
+
+    def __init__(self, bin_size):
+        self.bin_size = bin_size
+        self.origin = None
+        self._carry = None
+
+    def add(self, packets, final=False):
+        """Returning the columns of the bins completed by this chunk."""
+        if self.origin is None and len(packets):
+            self.origin = np.floor(packets['ts'][0] / self.bin_size) * self.bin_size
+        if len(packets):
+            index = ((packets['ts'] - self.origin) / self.bin_size).astype(np.int64)
+            first = index.min()
+            local = index - first
+            size = local.max() + 1
+            length = packets['length'].astype(np.float64)
+            sums = {
+                'packets': np.bincount(local, minlength=size).astype(np.int64),
+                'bytes': np.bincount(local, weights=length, minlength=size).astype(np.int64),
+                'tcp_bytes': np.bincount(local, weights=length * (packets['proto'] == IPPROTO_TCP),
+                                         minlength=size).astype(np.int64),
+                'udp_bytes': np.bincount(local, weights=length * (packets['proto'] == IPPROTO_UDP),
+                                         minlength=size).astype(np.int64),
+            }
+            bins = first + np.arange(size)
+            if self._carry is not None:
+                carry_bin, carry_sums = self._carry
+                if carry_bin >= first:
+                    for key in sums:
+                        sums[key][carry_bin - first] += carry_sums[key]
+                else:
+                    bins = np.concatenate([[carry_bin], bins])
+                    sums = {key: np.concatenate([[carry_sums[key]], value]) for key, value in sums.items()}
+        elif self._carry is not None:
+            carry_bin, carry_sums = self._carry
+            bins = np.array([carry_bin])
+            sums = {key: np.array([value]) for key, value in carry_sums.items()}
+        else:
+            return None
+
+        keep = len(bins) if final else len(bins) - 1
+        self._carry = None if final else (bins[-1], {key: value[-1] for key, value in sums.items()})
+        # Bins without packets are left out; gaps show up in the ts column
+        nonempty = sums['packets'][:keep] > 0
+        columns = {key: value[:keep][nonempty] for key, value in sums.items()}
+        columns['ts'] = self.origin + bins[:keep][nonempty] * self.bin_size
+        return columns
+
+
+def export(pcaps, out_dir, link_log=None, flows=None, link='middle', mode='packets', bin_size=1.0,
+           chunk_bytes=64 * 1024 * 1024, shard_rows=1_000_000, fmt=None):
+    """
+    Exporting captures as labelled shards.
+
+    Args:
+        pcaps (list): Capture files, in time order (e.g. the segments of one run).
+        out_dir (str): Output directory.
+        link_log (str): LinkScheduler JSONL log.
+        flows (str): TrafficEngine CSV results table.
+        link (str): Link whose state labels the rows.
+        mode (str): 'packets' (one row per packet) or 'bins' (one row per time bin).
+        bin_size (float): Bin width in seconds for mode 'bins'.
+        chunk_bytes (int): Bytes of capture decoded at a time.
+        shard_rows (int): Rows per output shard.
+        fmt (str): 'parquet' or 'npz'.
+    Returns:
+        dict: The manifest.
+    """
+    labels = LinkLabels(link_log, flows, link)
+    writer = ShardWriter(out_dir, shard_rows, fmt)
+    bins = BinAccumulator(bin_size) if mode == 'bins' else None
+
+    def emit(columns):
+        if columns is not None and len(columns['ts']):
+            columns.update(labels.label(columns['ts']))
+            writer.append(columns)
+
+    for path in pcaps:
+        with PcapReader(path) as reader:
+            for packets in reader.chunks(chunk_bytes):
+                if bins is None:
+                    emit({col: packets[col].copy() for col in PACKET_COLUMNS})
+                else:
+                    emit(bins.add(packets))
+    if bins is not None:
+        emit(bins.add(np.zeros(0, dtype=[('ts', 'f8')]), final=True))
+
+    return writer.close({'mode': mode, 'bin_size': bin_size if bins else None, 'link': link,
+                         'sources': [os.path.basename(p) for p in pcaps]})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export captures as a labelled columnar dataset.')
+    parser.add_argument('pcap', nargs='+', help='Capture files, e.g. pcap/middle_link_capture_*.pcap')
+    parser.add_argument('--out', required=True, help='Output directory')
+    parser.add_argument('--link-log', default='pcap/link_changes.jsonl', help='Link change log (JSONL)')
+    parser.add_argument('--flows', default='pcap/iperf_flows.csv', help='iperf flow results (CSV)')
+    parser.add_argument('--link', default='middle', help='Link whose state labels the rows (default: middle)')
+    parser.add_argument('--mode', choices=('packets', 'bins'), default='packets')
+    parser.add_argument('--bin', dest='bin_size', type=float, default=1.0, help='Bin width in seconds')
+    parser.add_argument('--chunk-mb', type=int, default=64, help='Capture megabytes decoded at a time')
+    parser.add_argument('--shard-rows', type=int, default=1_000_000, help='Rows per output shard')
+    parser.add_argument('--format', choices=('parquet', 'npz'), default=None)
+    args = parser.parse_args()
+
+    manifest = export(sorted(args.pcap), args.out, args.link_log, args.flows, args.link, args.mode, args.bin_size,
+                      args.chunk_mb * 1024 * 1024, args.shard_rows, args.format)
+    print(f"{manifest['rows']} rows in {len(manifest['shards'])} {manifest['format']} shards -> {args.out}")
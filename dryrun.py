@@ -0,0 +1,1112 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Dry runs of the topology scripts on a virtual clock, without root, Mininet or Docker.
+
+The script is executed unchanged against stand-ins for the parts of Mininet,
+Containernet and comnetsemu it uses (addHost, addDockerHost, addSwitch, addLink,
+intf.config, host.cmd/popen, VNFManager.addContainer, ...) and for the processes it
+starts (subprocess.Popen and asyncio.create_subprocess_exec). Nothing is created: every
+call is recorded on a timeline instead, against a virtual clock.
+
+time.time/monotonic/perf_counter/sleep, timed threading.Event waits and the timers of
+asyncio loops all run on that clock. Whenever every thread of the script is blocked,
+the clock jumps to the earliest pending deadline, so a 600 s schedule of link changes,
+iperf flows and captures plays out in well under a second. Started processes end on
+their own after the duration their command line asks for (iperf -t, ping -c,
+--duration of the streaming and web scripts) or when they are signalled; tcpdump
+writes a one-packet segment so that the capture index and time-to-first-packet work.
+Every wake-up costs about half a millisecond, so the link telemetry sampler, which would
+wake every 50 ms, wakes once per virtual second instead and adds the samples of that
+second at once, stamped with their own deadlines.
+
+The run is validated along the way; issues are listed in the summary and make the
+exit status non-zero:
+    - exceptions raised by the script or its threads
+    - shaping parameters out of range (intf.config() or tc commands)
+    - traffic to addresses no host has (iperf -c, ping, URLs)
+    - 'docker exec' into containers that were never added
+    - commands sent to nodes before net.start()
+    - processes still running when the script ends
+    - the script blocking with no deadline left to advance to
+
+    python3 dryrun.py Topology.py -- --duration 600 --seed 1
+    python3 dryrun.py --show --timeline /tmp/timeline.json Topology1.py -- --autotest
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import heapq
+import io
+import itertools
+import json
+import os
+import re
+import runpy
+import shlex
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import types
+
+import numpy as np
+
+# Above Linux's largest possible pid, so fake pids never name a real process
+FAKE_PID_BASE = 1 << 22
+# Rate assumed for iperf transfers of a given size (-n) without a target rate (-b)
+DEFAULT_RATE = 10e6
+# Virtual seconds between the wake-ups of a dry-run telemetry sampler
+TELEMETRY_BATCH = 1.0
+# Real seconds the script may stay blocked with no pending deadline before the run is aborted
+STALL_TIMEOUT = 5.0
+# Real seconds a thread woken by the clock counts as busy, unless it is seen waiting in one
+# of these modules (threads blocked in file I/O look just like blocked ones otherwise)
+WAKE_GRACE = 0.02
+WAITING_MODULES = ('threading.py', 'selectors.py', 'queue.py')
+
+_real = {
+    'time': time.time, 'monotonic': time.monotonic, 'perf_counter': time.perf_counter,
+    'sleep': time.sleep, 'clock_gettime': time.clock_gettime, 'event_wait': threading.Event.wait,
+    'event_set': threading.Event.set, 'notify': threading.Condition.notify, 'popen': subprocess.Popen, 'kill': os.kill, 'open': os.open,
+    'new_event_loop': asyncio.new_event_loop, 'create_subprocess_exec': asyncio.create_subprocess_exec,
+}
+
+
+class VirtualClock:
+    """
+    A clock that only moves when every thread is waiting.
+
+    Args:
+        quantum (float): Real seconds between checks whether the script's threads are blocked.
+    """
+
+    def __init__(self, quantum=0.0001):
+        self.quantum = quantum
+        self.now = 0.0
+        self.wall0 = _real['time']()
+        self.mono0 = _real['monotonic']()
+        self.cond = threading.Condition(threading.RLock())
+        self.activity = 0
+        self.steps = 0
+        self.stalled = False
+        self.stall_stack = []
+        self.loops = []
+        self._deadlines = {}
+        self._woken = {}
+        self._timers = []
+        self._tokens = itertools.count()
+        self._thread = None
+        self._stopping = False
+
+    def wall(self):
+        return self.wall0 + self.now
+
+    def mono(self):
+        return self.mono0 + self.now
+
+    def touch(self):
+        self.activity += 1
+
+    def call_at(self, when, fn):
+        """Calling fn from the clock's thread once the virtual time reaches when."""
+        with self.cond:
+            heapq.heappush(self._timers, (when, next(self._tokens), fn))
+            self.activity += 1
+
+    def sleep(self, seconds):
+        with self.cond:
+            self.activity += 1
+            if seconds <= 0:
+                return
+            token, deadline = next(self._tokens), self.now + seconds
+            self._deadlines[token] = deadline
+            self._woken.pop(threading.get_ident(), None)
+            while self.now < deadline:
+                self.cond.wait()
+            del self._deadlines[token]
+            self._woken[threading.get_ident()] = _real['monotonic']()
+            self.activity += 1
+
+    def wait_event(self, event, timeout):
+        """threading.Event.wait() with the timeout counted on the virtual clock."""
+        if timeout is None:
+            return _real['event_wait'](event)
+        with self.cond:
+            self.activity += 1
+            token, deadline = next(self._tokens), self.now + max(0.0, timeout)
+            self._deadlines[token] = deadline
+            self._woken.pop(threading.get_ident(), None)
+            try:
+                # Event.set() notifies the condition too (see install()), so this wakes on both
+                while not event.is_set() and self.now < deadline:
+                    self.cond.wait()
+                return event.is_set()
+            finally:
+                del self._deadlines[token]
+                self._woken[threading.get_ident()] = _real['monotonic']()
+                self.activity += 1
+
+    def _next_deadline(self):
+        """Returning the earliest pending deadline in virtual seconds, or None."""
+        deadlines = list(self._deadlines.values())
+        if self._timers:
+            deadlines.append(self._timers[0][0])
+        for loop in list(self.loops):
+            if loop.is_closed():
+                self.loops.remove(loop)
+                continue
+            if loop._ready:
+                # Callbacks are waiting to run: the loop is not idle
+                return self.now
+            handles = [h for h in list(loop._scheduled) if not h.cancelled()]
+            if handles:
+                deadlines.append(min(h.when() for h in handles) - self.mono0)
+        return min(deadlines) if deadlines else None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='virtual-clock', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join()
+
+    def _snapshot(self):
+        """
+        Returning where every other thread is. A thread that is still at the same
+        instruction of the same frame a quantum later is blocked (or about to be).
+        """
+        me = threading.get_ident()
+        return self.activity, {ident: (id(frame), frame.f_lasti)
+                               for ident, frame in sys._current_frames().items() if ident != me}
+
+    def _settled(self):
+        """Whether every thread the clock woke up has had the time to act on it."""
+        frames = sys._current_frames()
+        now = _real['monotonic']()
+        for ident, woken in list(self._woken.items()):
+            frame = frames.get(ident)
+            if frame is None:
+                del self._woken[ident]
+            elif now - woken < WAKE_GRACE and os.path.basename(frame.f_code.co_filename) not in WAITING_MODULES:
+                return False
+        return True
+
+    def _run(self):
+        last, blocked_since = None, None
+        while not self._stopping:
+            _real['sleep'](self.quantum)
+            due = []
+            with self.cond:
+                snapshot = self._snapshot()
+                if snapshot != last:
+                    last, blocked_since = snapshot, None
+                    continue
+                if not self._settled():
+                    continue
+                deadline = self._next_deadline()
+                if deadline is None:
+                    blocked_since = blocked_since or _real['monotonic']()
+                    if _real['monotonic']() - blocked_since > STALL_TIMEOUT and not self.stalled:
+                        self.stalled = True
+                        main = sys._current_frames().get(threading.main_thread().ident)
+                        self.stall_stack = traceback.extract_stack(main) if main is not None else []
+                        signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+                    continue
+                if deadline <= self.now:
+                    # Someone is due and has not picked it up yet
+                    continue
+                self.now = deadline
+                self.steps += 1
+                self.activity += 1
+                while self._timers and self._timers[0][0] <= self.now:
+                    due.append(heapq.heappop(self._timers)[2])
+                self.cond.notify_all()
+            for fn in due:
+                fn()
+            for loop in list(self.loops):
+                try:
+                    loop.call_soon_threadsafe(lambda: None)
+                except RuntimeError:
+                    pass
+
+
+def _parse_size(value, scale=1024):
+    """Parsing an iperf size or rate ('50M', '5m', '100K', '1000')."""
+    match = re.match(r'^([\d.]+)([kKmMgG]?)$', str(value))
+    if not match:
+        return None
+    power = {'': 0, 'k': 1, 'm': 2, 'g': 3}[match.group(2).lower()]
+    return float(match.group(1)) * scale ** power
+
+
+def _option(argv, *names, default=None):
+    for i, arg in enumerate(argv[:-1]):
+        if arg in names:
+            return argv[i + 1]
+    return default
+
+
+def unwrap(argv):
+    """
+    Removing sudo, mnexec and 'docker exec ... bash -c' wrappers from a command line.
+
+    Returns:
+        tuple: (pid of the Mininet node for mnexec or None, container for docker exec or
+        None, the wrapped command as a list).
+    """
+    argv, pid, container = [str(arg) for arg in argv], None, None
+    while argv:
+        if argv[0] == 'sudo':
+            argv = argv[1:]
+        elif argv[0] == 'mnexec':
+            i = 1
+            while i < len(argv) and argv[i].startswith('-'):
+                i += 1
+                if 'a' in argv[i - 1]:
+                    pid, i = int(argv[i]), i + 1
+            argv = argv[i:]
+        elif argv[:2] == ['docker', 'exec']:
+            i = 2
+            while i < len(argv) and argv[i].startswith('-'):
+                i += 2 if argv[i] in ('-e', '-u', '-w', '--env', '--user', '--workdir') else 1
+            container, argv = argv[i], argv[i + 1:]
+        elif argv[0] in ('bash', 'sh') and argv[1:2] == ['-c'] and len(argv) > 2:
+            # Only the last command of 'cd /home && python3 ...' matters
+            argv = shlex.split(argv[2].split('&&')[-1])
+        else:
+            return pid, container, argv
+    return pid, container, argv
+
+
+def run_time(argv):
+    """
+    Inferring how long a command runs on its own, in seconds (None: until signalled).
+    """
+    name = os.path.basename(argv[0]) if argv else ''
+    if name in ('iperf', 'iperf3'):
+        if '-s' in argv:
+            return None
+        size = _option(argv, '-n', '--num')
+        if size is not None:
+            rate = _parse_size(_option(argv, '-b', '--bandwidth', default=DEFAULT_RATE), 1000)
+            return _parse_size(size) * 8 / rate
+        return float(_option(argv, '-t', '--time', default=10))
+    if name == 'ping':
+        if _option(argv, '-w') is not None:
+            return float(_option(argv, '-w'))
+        count = _option(argv, '-c')
+        return None if count is None else max(0, int(count) - 1) * float(_option(argv, '-i', default=1)) + 0.02
+    if name == 'tcpdump':
+        return None
+    if name == 'sleep':
+        return float(argv[1])
+    if name.startswith('python'):
+        script = os.path.basename(next((arg for arg in argv[1:] if arg.endswith('.py')), ''))
+        duration = _option(argv, '--duration')
+        if duration is not None:
+            return float(duration)
+        if script in ('video_streaming2.py', 'get_video_streamed2.py'):
+            return 600.0
+        if script == 'Web_Server.py' or (script == 'Web_Client.py' and '--load' in argv):
+            return None
+    return 0.0
+
+
+def _pcap(wall):
+    """A pcap file holding one 60-byte Ethernet frame stamped with wall."""
+    header = struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 262144, 1)
+    record = struct.pack('<IIII', int(wall), int(wall % 1 * 1e6), 60, 60)
+    return header + record + bytes(60)
+
+
+class FakeProcess:
+    """
+    The part of a Popen both the fake subprocess and asyncio processes share: a fake
+    pid, a recorded start and an end after the command's run time or on a signal.
+    """
+
+    def __init__(self, dry, argv, host=None):
+        self.dry = dry
+        self.args = list(argv)
+        self.host = host
+        self.returncode = None
+        self.stdout_data, self.stderr_data = b'', b''
+        self.pid = dry.new_pid(self)
+        pid, container, command = unwrap(argv)
+        if pid is not None:
+            self.host = dry.nodes_by_pid.get(pid, self.host)
+        self.container = container
+        self.command = command
+        self.duration = run_time(command)
+        # Periodic read-only queries (e.g. the telemetry's 'tc -s qdisc show') are only counted
+        self.quiet = bool(command) and os.path.basename(command[0]) in ('tc', 'ip') and 'show' in command
+        dry.check_command(self)
+        self.started = dry.clock.now
+        if self.quiet:
+            dry.queries += 1
+        else:
+            dry.record(self.actor, 'start', pid=self.pid, argv=' '.join(map(str, argv)), runs=self.duration)
+        self._prepare()
+
+    @property
+    def actor(self):
+        if self.container:
+            return self.container
+        return self.host.name if self.host is not None else 'root'
+
+    def _prepare(self):
+        """Producing the command's output and side effects."""
+        name = os.path.basename(self.command[0]) if self.command else ''
+        if name == 'tcpdump':
+            self.stderr_data = f"tcpdump: listening on {_option(self.command, '-i')}, link-type EN10MB\n".encode()
+            target = _option(self.command, '-w')
+            data = _pcap(self.dry.clock.wall())
+            if target == '-':
+                self.stdout_data = data
+            elif target:
+                if '-G' in self.command:
+                    target = time.strftime(target, time.localtime(self.dry.clock.wall()))
+                with open(target, 'wb') as f:
+                    f.write(data)
+        elif name == 'tc' and '-j' in self.command:
+            self.stdout_data = b'[]'
+        elif name == 'ping':
+            target, count = self.command[-1], int(_option(self.command, '-c', default=1))
+            self.stdout_data = (f'PING {target} 56(84) bytes of data.\n\n--- {target} ping statistics ---\n'
+                                f'{count} packets transmitted, {count} received, 0% packet loss\n'
+                                f'rtt min/avg/max/mdev = 0.050/0.050/0.050/0.000 ms\n').encode()
+
+    def _output_at_end(self, elapsed):
+        name = os.path.basename(self.command[0]) if self.command else ''
+        if name in ('iperf', 'iperf3') and '-c' in self.command and self.returncode == 0 and elapsed > 0:
+            rate = _parse_size(_option(self.command, '-b', default=DEFAULT_RATE), 1000)
+            stamp = time.strftime('%Y%m%d%H%M%S', time.localtime(self.dry.clock.wall()))
+            src = self.host.IP() if self.host is not None else '0.0.0.0'
+            line = f"{stamp},{src},40000,{_option(self.command, '-c')},{_option(self.command, '-p', default=5001)}," \
+                   f"3,0.0-{elapsed:.1f},{int(rate * elapsed / 8)},{int(rate)}\n"
+            return line.encode()
+        return b''
+
+    def finish(self, returncode):
+        """Ending the process; returns False if it had already ended."""
+        if self.returncode is not None:
+            return False
+        self.returncode = returncode
+        elapsed = self.dry.clock.now - self.started
+        self.stdout_data += self._output_at_end(elapsed)
+        if not self.quiet:
+            self.dry.record(self.actor, 'exit', pid=self.pid, returncode=returncode, ran=round(elapsed, 6))
+        return True
+
+    def send_signal(self, sig):
+        if self.returncode is not None:
+            return
+        self.dry.record(self.actor, 'signal', pid=self.pid, signal=signal.Signals(sig).name)
+        # iperf, tcpdump and the scripts exit cleanly on SIGINT/SIGTERM
+        self._end(0 if sig in (signal.SIGINT, signal.SIGTERM) else -sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class FakePopen(FakeProcess):
+    """subprocess.Popen (and Mininet's node.popen) without a process."""
+
+    def __init__(self, args, stdin=None, stdout=None, stderr=None, universal_newlines=None, text=None,
+                 host=None, **kwargs):
+        self.text = bool(universal_newlines or text)
+        self._pipes = (stdout == subprocess.PIPE, stderr == subprocess.PIPE)
+        self._done = threading.Event()
+        self.stdout = self.stderr = self.stdin = None
+        super().__init__(DRY, [args] if isinstance(args, str) else args, host)
+        if self._pipes[0]:
+            self.stdout = self._stream(self.stdout_data)
+        if self._pipes[1]:
+            self.stderr = self._stream(self.stderr_data)
+        if self.duration == 0:
+            self._end(0)
+        elif self.duration is not None:
+            self.dry.clock.call_at(self.dry.clock.now + self.duration, lambda: self._end(0))
+
+    def _stream(self, data):
+        return io.StringIO(data.decode()) if self.text else io.BytesIO(data)
+
+    def _end(self, returncode):
+        if self.finish(returncode):
+            self._done.set()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        return self.returncode
+
+    def communicate(self, input=None, timeout=None):
+        if input:
+            self.dry.check_input(self, input if isinstance(input, str) else input.decode())
+        self.wait(timeout)
+        out, err = (self.stdout_data.decode(), self.stderr_data.decode()) if self.text else \
+            (self.stdout_data, self.stderr_data)
+        return out if self._pipes[0] else None, err if self._pipes[1] else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeAsyncProcess(FakeProcess):
+    """asyncio.subprocess.Process without a process, ending through the loop's timers."""
+
+    def __init__(self, argv, stdout=None, stderr=None):
+        self.loop = asyncio.get_running_loop()
+        self._done = self.loop.create_future()
+        self._timer = None
+        self._pipes = (stdout == asyncio.subprocess.PIPE, stderr == asyncio.subprocess.PIPE)
+        super().__init__(DRY, argv)
+        self.stdout = asyncio.StreamReader() if self._pipes[0] else None
+        self.stderr = None
+        if self.duration is not None:
+            self._timer = self.loop.call_later(self.duration, self._end, 0)
+
+    def _end(self, returncode):
+        if not self.finish(returncode):
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        if self.stdout is not None:
+            self.stdout.feed_data(self.stdout_data)
+            self.stdout.feed_eof()
+        self._done.set_result(returncode)
+
+    def send_signal(self, sig):
+        if self.loop.is_closed():
+            return
+        # os.kill() may deliver the signal from another thread
+        self.loop.call_soon_threadsafe(FakeProcess.send_signal, self, sig)
+
+    async def wait(self):
+        return await asyncio.shield(self._done)
+
+    async def communicate(self, input=None):
+        if input:
+            self.dry.check_input(self, input.decode())
+        await self.wait()
+        return (self.stdout_data if self._pipes[0] else None, self.stderr_data if self._pipes[1] else None)
+
+
+class FakeIntf:
+    def __init__(self, node, name, link=None, params=None):
+        self.node = node
+        self.name = name
+        self.link = link
+        self.params = dict(params or {})
+
+    def config(self, **params):
+        DRY.record(self.node.name, 'intf.config', intf=self.name, **params)
+        DRY.check_shaping(self.name, params)
+        self.params.update(params)
+        return {}
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.name}>'
+
+
+class FakeNode:
+    """A Mininet node: a name, a fake shell pid and interfaces."""
+
+    portBase = 0
+
+    def __init__(self, name, inNamespace=True, **params):
+        self.name = name
+        self.params = params
+        self.inNamespace = inNamespace
+        self.intfs = {}
+        self.pid = DRY.new_pid(self)
+        DRY.nodes_by_pid[self.pid] = self
+
+    def IP(self, intf=None):
+        return self.params.get('ip', '').split('/')[0] or None
+
+    def MAC(self, intf=None):
+        return '00:00:00:00:00:%02x' % (len(DRY.nodes_by_pid) % 256)
+
+    def newPort(self):
+        return len(self.intfs) + self.portBase
+
+    def intfList(self):
+        return [self.intfs[port] for port in sorted(self.intfs)]
+
+    def defaultIntf(self):
+        return self.intfList()[0] if self.intfs else None
+
+    def cmd(self, *args, **kwargs):
+        command = ' '.join(str(arg) for arg in args)
+        DRY.record(self.name, 'cmd', command=command)
+        DRY.check_started(self.name, command)
+        return ''
+
+    def popen(self, *args, **kwargs):
+        argv = list(args[0]) if len(args) == 1 and isinstance(args[0], (list, tuple)) else list(args)
+        DRY.check_started(self.name, ' '.join(map(str, argv)))
+        return FakePopen(['mnexec', '-da', str(self.pid)] + argv, host=self, **kwargs)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.name}>'
+
+
+class FakeDockerHost(FakeNode):
+    def __init__(self, name, dimage=None, **params):
+        super().__init__(name, **params)
+        self.dimage = dimage
+        self.dcinfo = {'Id': f'dryrun-{name}', 'Name': f'/mn.{name}'}
+
+
+class FakeSwitch(FakeNode):
+    # Like Mininet, switch ports are numbered from 1
+    portBase = 1
+
+    def __init__(self, name, **params):
+        super().__init__(name, inNamespace=False, **params)
+
+
+class FakeController(FakeNode):
+    def __init__(self, name, **params):
+        super().__init__(name, inNamespace=False, **params)
+
+
+class FakeLink:
+    """mininet.link.Link: a veth pair between two nodes."""
+
+    shaped = False
+
+    def __init__(self, node1, node2, **params):
+        for n, node in ((1, node1), (2, node2)):
+            port = node.newPort()
+            intf = FakeIntf(node, f'{node.name}-eth{port}', self, params)
+            node.intfs[port] = intf
+            setattr(self, f'intf{n}', intf)
+        if self.shaped:
+            DRY.check_shaping(self.intf1.name, params)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.intf1}<->{self.intf2}>'
+
+
+class FakeTCLink(FakeLink):
+    shaped = True
+
+
+class FakeContainernet:
+    """comnetsemu.net.Containernet: records the topology instead of building it."""
+
+    def __init__(self, controller=None, link=FakeTCLink, ipBase='10.0.0.0/8', **kwargs):
+        self.controller = controller
+        self.link = link
+        self.hosts, self.switches, self.controllers, self.links = [], [], [], []
+        self.nameToNode = {}
+        self._next_ip = 1
+
+    def _add(self, node, kind, **details):
+        self.nameToNode[node.name] = node
+        DRY.record('net', kind, node=node.name, **details)
+        return node
+
+    def addController(self, name='c0', controller=None, **params):
+        self.controllers.append(self._add(FakeController(name, **params), 'addController'))
+        return self.controllers[-1]
+
+    def _address(self, params):
+        if 'ip' not in params:
+            params['ip'] = f'10.0.0.{self._next_ip}/8'
+        self._next_ip += 1
+        return params
+
+    def addHost(self, name, cls=None, **params):
+        self.hosts.append(self._add(FakeNode(name, **self._address(params)), 'addHost', ip=params['ip']))
+        return self.hosts[-1]
+
+    def addDockerHost(self, name, **params):
+        self.hosts.append(self._add(FakeDockerHost(name, **self._address(params)), 'addDockerHost',
+                                    ip=params['ip'], dimage=params.get('dimage')))
+        return self.hosts[-1]
+
+    def addSwitch(self, name, cls=None, **params):
+        self.switches.append(self._add(FakeSwitch(name, **params), 'addSwitch'))
+        return self.switches[-1]
+
+    def addLink(self, node1, node2, port1=None, port2=None, cls=None, **params):
+        node1 = self.nameToNode[node1] if isinstance(node1, str) else node1
+        node2 = self.nameToNode[node2] if isinstance(node2, str) else node2
+        link = (cls or self.link)(node1, node2, **params)
+        self.links.append(link)
+        DRY.record('net', 'addLink', nodes=[node1.name, node2.name], intfs=[link.intf1.name, link.intf2.name],
+                   cls=type(link).__name__.replace('Fake', ''), **params)
+        return link
+
+    def get(self, *names):
+        nodes = [self.nameToNode[name] for name in names]
+        return nodes[0] if len(nodes) == 1 else nodes
+
+    def __getitem__(self, name):
+        return self.nameToNode[name]
+
+    def start(self):
+        DRY.record('net', 'start', hosts=len(self.hosts), switches=len(self.switches), links=len(self.links))
+        DRY.started = True
+
+    def stop(self):
+        DRY.record('net', 'stop')
+        DRY.started = False
+
+    def ping(self, hosts=None, timeout=None):
+        DRY.record('net', 'ping')
+        return 0.0
+
+    pingAll = ping
+
+
+class FakeVNFManager:
+    """comnetsemu.net.VNFManager: containers exist by name only."""
+
+    def __init__(self, net):
+        self.net = net
+        self.containers = {}
+
+    def addContainer(self, name, dhost, dimage, dcmd, docker_args=None, **kwargs):
+        host = self.net.nameToNode.get(dhost)
+        if host is None or not hasattr(host, 'dcinfo'):
+            DRY.issue(f'addContainer({name}): {dhost} is not a Docker host')
+        DRY.record(dhost, 'addContainer', container=name, image=dimage, dcmd=dcmd)
+        container = types.SimpleNamespace(name=name, dhost=dhost, dimage=dimage, dcmd=dcmd, docker_args=docker_args)
+        self.containers[name] = container
+        DRY.containers.add(name)
+        return container
+
+    def removeContainer(self, name, **kwargs):
+        DRY.record('mgr', 'removeContainer', container=name)
+        self.containers.pop(name, None)
+
+    def stop(self):
+        DRY.record('mgr', 'stop')
+
+
+class FakeCLI:
+    """The interactive CLI returns at once; commands typed there are not simulated."""
+
+    def __init__(self, mininet, **kwargs):
+        DRY.record('cli', 'cli', note='interactive CLI skipped')
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    return module
+
+
+def fake_modules():
+    """Building the stand-in mininet/comnetsemu modules."""
+    def info(*messages):
+        DRY.log.write(''.join(str(m) for m in messages))
+
+    log = _module('mininet.log', info=info, output=info, warn=info, error=info, debug=lambda *m: None,
+                  setLogLevel=lambda level: None, lg=types.SimpleNamespace(info=info))
+    modules = {
+        'mininet': _module('mininet'),
+        'mininet.log': log,
+        'mininet.link': _module('mininet.link', Link=FakeLink, TCLink=FakeTCLink, Intf=FakeIntf, TCIntf=FakeIntf),
+        'mininet.node': _module('mininet.node', Node=FakeNode, Host=FakeNode, Controller=FakeController,
+                                OVSSwitch=FakeSwitch),
+        'mininet.net': _module('mininet.net', Mininet=FakeContainernet),
+        'comnetsemu': _module('comnetsemu'),
+        'comnetsemu.net': _module('comnetsemu.net', Containernet=FakeContainernet, VNFManager=FakeVNFManager),
+        'comnetsemu.cli': _module('comnetsemu.cli', CLI=FakeCLI,
+                                  spawnXtermDocker=lambda name: DRY.record(name, 'xterm')),
+    }
+    # The Docker SDK (ContainerPool.warm_images): every image is available
+    images = types.SimpleNamespace(get=lambda name: DRY.record('docker', 'image', image=name),
+                                   pull=lambda name: DRY.record('docker', 'pull', image=name))
+    modules['docker'] = _module('docker', from_env=lambda: types.SimpleNamespace(images=images),
+                                errors=types.SimpleNamespace(ImageNotFound=LookupError))
+    for name, module in modules.items():
+        if '.' in name:
+            parent, _, child = name.rpartition('.')
+            setattr(modules[parent], child, module)
+    return modules
+
+
+class DryRun:
+    """
+    Running a topology script on the virtual clock and collecting its timeline.
+
+    Args:
+        script (str): Path of the script.
+        argv (list): Its command-line arguments.
+        quantum (float): Real seconds between checks whether the script's threads are blocked.
+    """
+
+    def __init__(self, script, argv=(), quantum=0.0001):
+        self.script = os.path.abspath(script)
+        self.argv = list(argv)
+        self.clock = VirtualClock(quantum)
+        self.events = []
+        self.issues = []
+        self.processes = {}
+        self.nodes_by_pid = {}
+        self.containers = set()
+        self.queries = 0
+        self.started = False
+        self.log = io.StringIO()
+        self.exception = None
+        self.summary_data = None
+        self._pids = itertools.count(FAKE_PID_BASE)
+        self._lock = threading.Lock()
+        self._saved = {}
+
+    # Recording and validation
+
+    def record(self, actor, action, **details):
+        self.clock.touch()
+        with self._lock:
+            self.events.append(dict(details, t=round(self.clock.now, 6), actor=actor, action=action))
+
+    def issue(self, message):
+        self.record('dryrun', 'issue', message=message)
+        with self._lock:
+            self.issues.append({'t': round(self.clock.now, 6), 'message': message})
+
+    def new_pid(self, owner):
+        pid = next(self._pids)
+        if isinstance(owner, FakeProcess):
+            self.processes[pid] = owner
+        return pid
+
+    def addresses(self):
+        return {node.IP() for node in self.nodes_by_pid.values() if node.IP()}
+
+    def check_started(self, node, command):
+        if not self.started:
+            self.issue(f'{node}: "{command}" sent before net.start()')
+
+    def check_command(self, proc):
+        if proc.container and proc.container not in self.containers and \
+                not proc.container.startswith('mn.'):
+            self.issue(f'docker exec into {proc.container}, which was never added')
+        if proc.host is not None:
+            self.check_started(proc.host.name, ' '.join(proc.command))
+        command = proc.command
+        name = os.path.basename(command[0]) if command else ''
+        targets = []
+        if name in ('iperf', 'iperf3') and '-c' in command:
+            targets.append(_option(command, '-c'))
+        elif name == 'ping' and len(command) > 1:
+            targets.append(command[-1])
+        targets += re.findall(r'https?://([\d.]+)', ' '.join(command))
+        for target in targets:
+            if re.match(r'^\d+\.\d+\.\d+\.\d+$', target) and target not in self.addresses():
+                self.issue(f'{proc.actor}: {name} to {target}, which no host has')
+        if name == 'tc':
+            self.check_input(proc, ' '.join(command[1:]))
+
+    def check_input(self, proc, text):
+        """Checking the shaping values of tc commands (also fed through 'tc -batch -')."""
+        for line in text.splitlines():
+            params = {}
+            for key, pattern in (('bw', r'rate ([\d.]+)Mbit'), ('delay', r'delay ([\d.-]+)ms'),
+                                 ('jitter', r'delay [\d.-]+ms ([\d.-]+)ms'), ('loss', r'loss ([\d.-]+)%')):
+                match = re.search(pattern, line)
+                if match:
+                    params[key] = float(match.group(1))
+            if params:
+                self.record(proc.actor, 'tc', command=line.strip())
+                self.check_shaping(_option(line.split(), 'dev', default='?'), params)
+
+    def check_shaping(self, intf, params):
+        def number(value):
+            if isinstance(value, str):
+                value = re.sub(r'(ms|us|s)$', '', value.strip())
+            return float(value)
+
+        bw, loss = params.get('bw'), params.get('loss')
+        if bw is not None and not 0 < number(bw) <= 1000:
+            self.issue(f'{intf}: bandwidth {bw} Mbit/s out of range (0, 1000]')
+        if loss is not None and not 0 <= number(loss) <= 100:
+            self.issue(f'{intf}: loss {loss}% out of range [0, 100]')
+        for key in ('delay', 'jitter'):
+            if params.get(key) is not None and number(params[key]) < 0:
+                self.issue(f'{intf}: negative {key} {params[key]}')
+
+    # Patching
+
+    def install(self, registry_dir):
+        clock = self.clock
+
+        def clock_gettime(clk):
+            clock.touch()
+            if clk == time.CLOCK_REALTIME:
+                return clock.wall()
+            if clk == time.CLOCK_MONOTONIC:
+                return clock.mono()
+            return _real['clock_gettime'](clk)
+
+        def now():
+            clock.touch()
+            return clock.wall()
+
+        def mono():
+            clock.touch()
+            return clock.mono()
+
+        def event_wait(event, timeout=None):
+            return clock.wait_event(event, timeout)
+
+        def event_set(event):
+            _real['event_set'](event)
+            with clock.cond:
+                clock.activity += 1
+                clock.cond.notify_all()
+
+        def notify(condition, n=1):
+            # Waking a thread (e.g. with a future's result) counts as activity
+            clock.touch()
+            _real['notify'](condition, n)
+
+        def excepthook(hook_args):
+            self.issue(f'{hook_args.thread.name if hook_args.thread else "thread"}: '
+                       f'{hook_args.exc_type.__name__}: {hook_args.exc_value}')
+            self._saved[(threading, 'excepthook')](hook_args)
+
+        def new_event_loop():
+            loop = _real['new_event_loop']()
+            clock.loops.append(loop)
+            return loop
+
+        async def create_subprocess_exec(*argv, stdin=None, stdout=None, stderr=None, **kwargs):
+            return FakeAsyncProcess(argv, stdout, stderr)
+
+        def kill(pid, sig):
+            if pid < FAKE_PID_BASE:
+                return _real['kill'](pid, sig)
+            proc = self.processes.get(pid)
+            if pid in self.nodes_by_pid:
+                self.record(self.nodes_by_pid[pid].name, 'signal', pid=pid, signal=signal.Signals(sig).name)
+            if proc is None or proc.returncode is not None:
+                raise ProcessLookupError(pid, 'No such process')
+            if sig:
+                proc.send_signal(sig)
+
+        def os_open(path, flags, mode=0o777, **kwargs):
+            # Interface counters of the fake links read as zero
+            match = re.match(r'/sys/class/net/([^/]+)/statistics/', str(path))
+            if match and re.match(r'.+-eth\d+$', match.group(1)):
+                return _real['open'](self._zero, os.O_RDONLY)
+            return _real['open'](path, flags, mode, **kwargs)
+
+        self._zero = os.path.join(registry_dir, 'zero')
+        with open(self._zero, 'w') as f:
+            f.write('0\n')
+        patches = [
+            (time, 'time', now), (time, 'monotonic', mono), (time, 'perf_counter', mono),
+            (time, 'sleep', clock.sleep), (time, 'clock_gettime', clock_gettime),
+            (threading.Event, 'wait', event_wait), (threading.Event, 'set', event_set),
+            (threading.Condition, 'notify', notify), (threading, 'excepthook', excepthook),
+            (subprocess, 'Popen', FakePopen), (os, 'kill', kill), (os, 'open', os_open),
+            (asyncio, 'new_event_loop', new_event_loop),
+            (asyncio, 'create_subprocess_exec', create_subprocess_exec),
+        ]
+        for owner, name, value in patches:
+            self._saved[(owner, name)] = getattr(owner, name)
+            setattr(owner, name, value)
+        self._saved_modules = {name: sys.modules.get(name) for name in fake_modules()}
+        sys.modules.update(fake_modules())
+
+        # Registries of dry runs must not mix with those of real runs
+        sys.path.insert(0, os.path.dirname(self.script))
+        import run_registry
+        self._registry_defaults = run_registry.RunRegistry.__init__.__defaults__
+        run_registry.RunRegistry.__init__.__defaults__ = (None, registry_dir)
+        try:
+            import link_telemetry
+        except ImportError:
+            link_telemetry = None
+        if link_telemetry is not None:
+            self._saved[(link_telemetry.TelemetrySampler, '_run')] = link_telemetry.TelemetrySampler._run
+            link_telemetry.TelemetrySampler._run = lambda sampler: self._telemetry(sampler, link_telemetry.DTYPE)
+
+    def _telemetry(self, sampler, dtype):
+        """
+        Standing in for TelemetrySampler._run: one wake-up per TELEMETRY_BATCH virtual
+        seconds, adding the (all-zero) samples that fell due since the last one to the
+        ring buffer and the log. Every sample is counted as one 'tc -s qdisc' query.
+        """
+        log = open(sampler.path + '.bin', 'ab') if sampler.path else None
+        start, wall = time.monotonic(), time.time()
+        taken = 0
+        interfaces = len(sampler.interfaces)
+        stopping = False
+        while not stopping:
+            stopping = sampler._stop.wait(TELEMETRY_BATCH)
+            due = int((time.monotonic() - start) / sampler.interval) + 1
+            if due > taken:
+                offsets = np.repeat(np.arange(taken, due) * sampler.interval, interfaces)
+                rows = np.zeros(len(offsets), dtype=dtype)
+                rows['mono'], rows['wall'] = start + offsets, wall + offsets
+                rows['iface'] = np.tile(np.arange(interfaces), due - taken)
+                with sampler._lock:
+                    sampler.ring[(sampler.count + np.arange(len(rows))) % sampler.capacity] = rows
+                    sampler.count += len(rows)
+                with self._lock:
+                    self.queries += due - taken if sampler.qdisc else 0
+                taken = due
+            if log is not None:
+                sampler._flush(log)
+        if log is not None:
+            log.close()
+        self.record('telemetry', 'samples', samples=taken, interfaces=sampler.interfaces)
+
+    def uninstall(self):
+        for (owner, name), value in self._saved.items():
+            setattr(owner, name, value)
+        for name, module in self._saved_modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        import run_registry
+        run_registry.RunRegistry.__init__.__defaults__ = self._registry_defaults
+        sys.path.remove(os.path.dirname(self.script))
+
+    # Running
+
+    def run(self):
+        """Running the script to completion. Returns the summary."""
+        global DRY
+        DRY = self
+        started = _real['perf_counter']()
+        with tempfile.TemporaryDirectory(prefix='dryrun-') as tmp:
+            argv = list(self.argv)
+            if '--shared-dir' not in argv:
+                argv += ['--shared-dir', os.path.join(tmp, 'shared')]
+            registry_dir = os.path.join(tmp, 'runs')
+            os.makedirs(registry_dir)
+            self.install(registry_dir)
+            self.clock.start()
+            saved_argv = sys.argv
+            sys.argv = [self.script] + argv
+            modules = set(sys.modules)
+            self.record('dryrun', 'script_start', script=os.path.basename(self.script), argv=argv)
+            try:
+                # The script's own output goes to the log, with the Mininet log messages
+                with contextlib.redirect_stdout(self.log):
+                    runpy.run_path(self.script, run_name='__main__')
+            except KeyboardInterrupt:
+                if not self.clock.stalled:
+                    raise
+                where = [f'{os.path.basename(frame.filename)}:{frame.lineno}' for frame in self.clock.stall_stack
+                         if os.path.dirname(os.path.abspath(frame.filename)) == os.path.dirname(self.script)
+                         and not frame.filename.startswith('<')
+                         and os.path.abspath(frame.filename) != os.path.abspath(__file__)]
+                self.issue(f'the script blocked with no pending deadline at {" > ".join(where) or "?"}')
+            except SystemExit as e:
+                if e.code not in (None, 0):
+                    self.issue(f'the script exited with {e.code}')
+            except Exception as e:
+                self.exception = traceback.format_exc()
+                self.issue(f'{type(e).__name__}: {e}')
+            finally:
+                sys.argv = saved_argv
+                self.record('dryrun', 'script_end')
+                for proc in self.processes.values():
+                    if proc.returncode is None:
+                        self.issue(f'{proc.actor}: "{" ".join(proc.command)}" (pid {proc.pid}) was left running')
+                self.clock.stop()
+                self.uninstall()
+            # The repo modules captured the fake clock and modules; a later run imports them afresh
+            for name in set(sys.modules) - modules:
+                if os.path.dirname(getattr(sys.modules[name], '__file__', None) or '') == os.path.dirname(self.script):
+                    del sys.modules[name]
+        self.summary_data = self.summary(_real['perf_counter']() - started)
+        return self.summary_data
+
+    def summary(self, real_seconds):
+        actions = collections.Counter(event['action'] for event in self.events)
+        return {
+            'script': self.script,
+            'argv': self.argv,
+            'virtual_seconds': round(self.clock.now, 6),
+            'real_seconds': round(real_seconds, 3),
+            'clock_steps': self.clock.steps,
+            'processes': len(self.processes),
+            'queries': self.queries,
+            'actions': dict(sorted(actions.items())),
+            'issues': self.issues,
+            'exception': self.exception,
+        }
+
+    def export(self, path):
+        """Writing the summary and the timeline as JSON."""
+        with open(path, 'w') as f:
+            json.dump({'summary': self.summary_data, 'timeline': self.events}, f, indent=1, default=str)
+
+
+DRY = None
+
+
+def format_timeline(events, actions=None):
+    lines = []
+    for event in events:
+        if actions and event['action'] not in actions:
+            continue
+        details = {k: v for k, v in event.items() if k not in ('t', 'actor', 'action')}
+        lines.append(f"{event['t']:10.3f}  {event['actor']:<18} {event['action']:<14} {json.dumps(details, default=str)}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Dry-run a topology script on a virtual clock.',
+                                     usage='%(prog)s [options] script [-- script arguments]')
+    parser.add_argument('script', help='e.g. Topology.py')
+    parser.add_argument('script_args', nargs=argparse.REMAINDER, help='Arguments of the script, after --')
+    parser.add_argument('--timeline', default=None, help='Write the summary and timeline to this JSON file')
+    parser.add_argument('--show', action='store_true', help='Print the timeline')
+    parser.add_argument('--actions', default=None, help='Only these comma-separated actions in --show')
+    parser.add_argument('--log', action='store_true', help="Print the script's Mininet log")
+    args = parser.parse_args()
+
+    script_args = args.script_args[1:] if args.script_args[:1] == ['--'] else args.script_args
+    dry = DryRun(args.script, script_args)
+    summary = dry.run()
+    if args.log:
+        print(dry.log.getvalue(), end='')
+    if args.show:
+        print(format_timeline(dry.events, set(args.actions.split(',')) if args.actions else None))
+    if args.timeline:
+        dry.export(args.timeline)
+    print(f"{os.path.basename(summary['script'])}: {summary['virtual_seconds']:.1f} virtual s in "
+          f"{summary['real_seconds']:.3f} s, {len(dry.events)} events, {summary['processes']} processes, "
+          f"{summary['clock_steps']} clock steps")
+    if summary['exception']:
+        print(summary['exception'], end='')
+    for item in summary['issues']:
+        print(f"issue at {item['t']:.3f} s: {item['message']}")
+    sys.exit(1 if summary['issues'] else 0)
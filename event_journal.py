@@ -0,0 +1,133 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Structured event journal of a run, on the same clock as the packet captures.
+
+Every event is one JSON line with its type, fields and two timestamps taken when it
+was recorded:
+
+    wall    CLOCK_REALTIME in seconds, the clock tcpdump stamps packets with, so events
+            can be placed directly on the pcap timeline
+    mono    CLOCK_MONOTONIC in seconds, for intervals that are immune to clock steps
+            (the same clock as LinkScheduler's offsets)
+
+record() only puts the event on a queue and never waits for the disk: a background
+thread writes the queued events in batches to the append-only file and flushes it
+periodically, so logging does not block the traffic or scheduler threads.
+
+    python3 event_journal.py pcap/events.jsonl --kind link_change
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+
+
+class EventJournal:
+    """
+    Appending typed events to a JSONL file from a background writer.
+
+    Args:
+        path (str): Journal file (None: events are dropped until open() is called).
+        flush_interval (float): Seconds between flushes of the file.
+        batch (int): Events written per write call at most.
+    """
+
+    def __init__(self, path=None, flush_interval=0.5, batch=512):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch = batch
+        self.count = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def open(self, path=None):
+        """Starting the writer thread; the first event records both clocks of the start."""
+        self.path = path or self.path
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.record('journal_start', path=self.path)
+        return self
+
+    def record(self, kind, **fields):
+        """Recording an event without blocking. Does nothing while the journal is not open."""
+        if self._thread is None:
+            return
+        self._queue.put((time.clock_gettime(time.CLOCK_REALTIME), time.monotonic(), kind, fields))
+
+    def close(self):
+        """Writing the remaining events and stopping the writer."""
+        if self._thread is None:
+            return
+        self.record('journal_stop')
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        with open(self.path, 'a') as out:
+            next_flush = time.monotonic() + self.flush_interval
+            stopping = False
+            while not stopping:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = ()
+                lines = []
+                # Draining what is queued, up to one batch, into a single write
+                while item is not None:
+                    if item:
+                        wall, mono, kind, fields = item
+                        lines.append(json.dumps(dict(fields, event=kind, wall=round(wall, 6), mono=round(mono, 6)),
+                                                default=str))
+                    if len(lines) >= self.batch:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                stopping = item is None
+                if lines:
+                    out.write('\n'.join(lines) + '\n')
+                    self.count += len(lines)
+                if stopping or time.monotonic() >= next_flush:
+                    out.flush()
+                    next_flush = time.monotonic() + self.flush_interval
+
+
+def read_events(path, kinds=None):
+    """
+    Reading a journal.
+
+    Args:
+        path (str): Journal file.
+        kinds (iterable): Only events of these types (default: all).
+    Returns:
+        list: One dict per event, in recording order.
+    """
+    kinds = set(kinds) if kinds else None
+    events = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if kinds is None or event['event'] in kinds:
+                events.append(event)
+    return events
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print the events of a run journal.')
+    parser.add_argument('path', help='e.g. pcap/events.jsonl')
+    parser.add_argument('--kind', action='append', help='Only events of this type (repeatable)')
+    args = parser.parse_args()
+
+    events = read_events(args.path, args.kind)
+    start = events[0]['wall'] if events else 0
+    for event in events:
+        fields = {k: v for k, v in event.items() if k not in ('event', 'wall', 'mono')}
+        print(f"{event['wall'] - start:10.3f}  {event['event']:<16} {json.dumps(fields)}")
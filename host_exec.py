@@ -0,0 +1,209 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Non-blocking command execution in Mininet hosts.
+
+host.cmd() talks to the one shell every Mininet host keeps open and blocks until its
+prompt returns, so commands sent to the same host from several threads queue up behind
+each other or interleave their output, and every background task needs a thread that
+mostly sleeps. HostExecutor instead starts each command as its own process in the host's
+namespaces (through mnexec) and supervises all of them, with their timeouts and timers,
+from one asyncio loop running in a background thread. Any number of commands can run on
+the same host at once; each one is a Command whose output, exit code and timing become
+available when it finishes.
+"""
+
+import asyncio
+import concurrent.futures
+import itertools
+import signal
+import subprocess
+import threading
+import time
+
+from mininet.log import info
+
+
+def namespace_argv(host, argv):
+    """Prefixing a command so that it runs in all namespaces of a Mininet host."""
+    return ['mnexec', '-da', str(host.pid)] + list(argv)
+
+
+class Command:
+    """
+    One command started by a HostExecutor.
+
+    Attributes:
+        stdout (str): Captured standard output (None when not captured).
+        stderr (str): Captured standard error (None when not captured).
+        returncode (int): Exit code, None while running.
+        timed_out (bool): Whether the command was killed because of its timeout.
+        future (concurrent.futures.Future): Resolved with the command when it finishes.
+    """
+
+    def __init__(self, command_id, host, argv, label=None):
+        self.id = command_id
+        self.host = host
+        self.argv = argv
+        self.label = label or (argv[0] if argv else str(command_id))
+        self.process = None
+        self.stdout = None
+        self.stderr = None
+        self.returncode = None
+        self.timed_out = False
+        self.started = None
+        self.ended = None
+        self.future = concurrent.futures.Future()
+        self._executor = None
+
+    def done(self):
+        return self.future.done()
+
+    def wait(self, timeout=None):
+        """Waiting until the command finishes and returning it (raises TimeoutError after timeout)."""
+        return self.future.result(timeout)
+
+    def stop(self, sig=signal.SIGTERM, timeout=5.0):
+        """Sending a signal to the command, killing it if it is still running after timeout."""
+        return self._executor._call(self._executor._stop(self, sig, timeout))
+
+    def __repr__(self):
+        where = self.host.name if self.host is not None else 'root'
+        return f'<Command {self.id} {self.label} on {where} returncode={self.returncode}>'
+
+
+class HostExecutor:
+    """
+    Running commands in Mininet hosts as independent processes from one asyncio loop.
+
+    The public methods are thread-safe. Commands run with host None run in the root
+    namespace (e.g. 'docker exec').
+    """
+
+    def __init__(self):
+        self.commands = {}
+        self.loop = None
+        self._ids = itertools.count(1)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self.loop is not None
+
+    def start(self):
+        """Starting the event loop thread."""
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(ready.set)
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def run(self, host, argv, timeout=None, capture=True, input=None, label=None):
+        """
+        Starting a command and returning as soon as its process exists.
+
+        Args:
+            host: Mininet host whose namespaces the command runs in (None: root namespace).
+            argv (list): Command and arguments.
+            timeout (float): Seconds after which the command is killed.
+            capture (bool): Capturing stdout/stderr (otherwise they are inherited).
+            input (str): Data written to the command's standard input.
+            label (str): Name used in logs.
+        Returns:
+            Command: The running command.
+        """
+        command = Command(next(self._ids), host, list(argv), label)
+        command._executor = self
+        self.commands[command.id] = command
+        self._call(self._spawn(command, timeout, capture, input))
+        return command
+
+    def check_output(self, host, argv, timeout=None):
+        """Running a command to completion and returning its standard output."""
+        return self.run(host, argv, timeout).wait().stdout
+
+    async def _spawn(self, command, timeout, capture, input):
+        argv = namespace_argv(command.host, command.argv) if command.host is not None else command.argv
+        pipe = asyncio.subprocess.PIPE if capture else None
+        command.process = await asyncio.create_subprocess_exec(
+            *argv, stdin=asyncio.subprocess.PIPE if input is not None else subprocess.DEVNULL,
+            stdout=pipe, stderr=pipe)
+        command.started = time.time()
+        self.loop.create_task(self._supervise(command, timeout, input))
+
+    async def _supervise(self, command, timeout, input):
+        data = input.encode() if input is not None else None
+        communicate = self.loop.create_task(command.process.communicate(data))
+        try:
+            out, err = await asyncio.wait_for(asyncio.shield(communicate), timeout)
+        except asyncio.TimeoutError:
+            command.timed_out = True
+            info(f'*** {command!r} timed out after {timeout} s, killing it\n')
+            try:
+                command.process.kill()
+            except ProcessLookupError:
+                pass
+            out, err = await communicate
+        command.returncode = command.process.returncode
+        command.ended = time.time()
+        command.stdout = out.decode(errors='replace') if out is not None else None
+        command.stderr = err.decode(errors='replace') if err is not None else None
+        command.future.set_result(command)
+
+    async def _stop(self, command, sig, timeout):
+        if command.process.returncode is None:
+            try:
+                command.process.send_signal(sig)
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(command.future)), timeout)
+            except ProcessLookupError:
+                pass
+            except asyncio.TimeoutError:
+                command.process.kill()
+        return await asyncio.wrap_future(command.future)
+
+    def after(self, delay, fn, *args):
+        """
+        Calling fn(*args) in a worker thread after delay seconds, without holding a
+        thread while waiting.
+
+        Returns:
+            concurrent.futures.Future: Resolved with fn's return value.
+        """
+        async def later():
+            await asyncio.sleep(delay)
+            return await self.loop.run_in_executor(None, fn, *args)
+
+        return asyncio.run_coroutine_threadsafe(later(), self.loop)
+
+    def running_commands(self):
+        """Returning the commands that have not finished yet."""
+        return [c for c in self.commands.values() if not c.done()]
+
+    def stop(self, timeout=5.0):
+        """Stopping every running command, the timers and the event loop."""
+        async def stop_all():
+            await asyncio.gather(*(self._stop(c, signal.SIGTERM, timeout) for c in self.running_commands()))
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if self.loop is None:
+            return
+        self._call(stop_all())
+        info(f'*** Host executor stopped, {len(self.commands)} commands run\n')
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+        self.loop = None
@@ -0,0 +1,190 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Drift-free link impairment scheduler.
+
+Link changes come from timestamped trace files or from a seeded stochastic model and
+are applied from a single timer thread on the monotonic clock. Every change has an
+absolute deadline (start + offset), so the time spent in tc does not push the rest of
+the schedule back. Each applied change is logged with its scheduled and actual time; a
+change that fails is logged with its error and the schedule continues.
+
+Trace files are CSV with a header row. 'time' is the offset in seconds from the start
+of the schedule, 'bw' is in Mbit/s, 'delay' and 'jitter' in ms and 'loss' in percent;
+'time', 'bw' and 'delay' are required, 'jitter', 'loss' and 'link' (the link name the
+row applies to) are optional:
+
+    time,bw,delay,jitter,loss
+    0.0,30,60,0,0
+    0.5,12.4,60,5,0.1
+"""
+
+import csv
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+
+from mininet.log import info
+
+PARAMS = ('bw', 'delay', 'jitter', 'loss')
+
+
+def trace_schedule(path, links, repeat=False):
+    """
+    Reading a trace file into a schedule.
+
+    Args:
+        path (str): CSV trace file.
+        links (list): Names of the links the rows apply to when a row has no 'link' column.
+        repeat (bool): Replaying the trace again from the start when it ends.
+    Yields:
+        tuple: (offset in seconds, link name, dict of link parameters)
+    """
+    rows = []
+    with open(path) as f:
+        for row in csv.DictReader(f):
+            params = {key: float(row[key]) for key in PARAMS if row.get(key) not in (None, '')}
+            targets = [row['link']] if row.get('link') else links
+            rows.append((float(row['time']), targets, params))
+    if not rows:
+        return
+    rows.sort(key=lambda r: r[0])
+    # One trace period lasts until the last row plus the mean step
+    period = rows[-1][0] + (rows[-1][0] - rows[0][0]) / max(1, len(rows) - 1)
+    for cycle in itertools.count():
+        for offset, targets, params in rows:
+            for link in targets:
+                yield offset + cycle * period, link, params
+        if not repeat or period <= 0:
+            return
+
+
+def random_schedule(links, bw_delay_pairs, jitter_values=(0,), loss_values=(0,), interval=120.0, seed=None):
+    """
+    Generating an endless stochastic schedule: every interval seconds each link gets a
+    random (bw, delay) pair, jitter and loss, drawn from a seeded generator so that the
+    same seed always gives the same schedule.
+
+    Yields:
+        tuple: (offset in seconds, link name, dict of link parameters)
+    """
+    rng = random.Random(seed)
+    for step in itertools.count():
+        for link in links:
+            bw, delay = rng.choice(bw_delay_pairs)
+            params = {'bw': bw, 'delay': delay, 'jitter': rng.choice(jitter_values), 'loss': rng.choice(loss_values)}
+            yield step * interval, link, params
+
+
+class LinkScheduler:
+    """
+    Applying link changes from any number of schedules on absolute monotonic deadlines.
+
+    Args:
+        links (dict): Link name -> link object passed to apply.
+        apply (callable): apply(link, **params) performing the change.
+        log_path (str): Optional JSONL file receiving one record per applied change
+            (truncated by start()).
+        clock (callable): Monotonic clock, in seconds.
+    """
+
+    def __init__(self, links, apply, log_path=None, clock=time.monotonic):
+        self.links = links
+        self.apply = apply
+        self.log_path = log_path
+        self.clock = clock
+        self.start_time = None
+        self.history = []
+        self._sources = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_schedule(self, schedule):
+        """Adding a schedule (an iterable of (offset, link name, params) in offset order)."""
+        self._sources.append(iter(schedule))
+        return self
+
+    def start(self):
+        """Starting the timer thread. Offsets are counted from this call."""
+        if self.log_path:
+            # Truncating a log of an earlier run in the same directory
+            open(self.log_path, 'w').close()
+        self.start_time = self.clock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def join(self, timeout=None):
+        """Waiting until every finite schedule has been applied."""
+        self._thread.join(timeout)
+
+    def _run(self):
+        # Heap of (offset, source number, sequence, link name, params); the source number
+        # tells which source to pull from next and the sequence keeps simultaneous changes
+        # in schedule order
+        heap = []
+        self._seq = itertools.count()
+        for n, source in enumerate(self._sources):
+            self._push(heap, n, source)
+        log = open(self.log_path, 'a') if self.log_path else None
+        try:
+            while heap and not self._stop.is_set():
+                offset, n, _, link, params = heap[0]
+                deadline = self.start_time + offset
+                remaining = deadline - self.clock()
+                if remaining > 0:
+                    if self._stop.wait(remaining):
+                        break
+                    continue
+                heapq.heappop(heap)
+                self._push(heap, n, self._sources[n])
+                self._apply(offset, link, params, log)
+        finally:
+            if log is not None:
+                log.close()
+
+    def _push(self, heap, n, source):
+        item = next(source, None)
+        if item is not None:
+            offset, link, params = item
+            heapq.heappush(heap, (offset, n, next(self._seq), link, params))
+
+    def _apply(self, offset, link, params, log):
+        wall = time.time()
+        started = self.clock()
+        error = None
+        try:
+            self.apply(self.links[link], **params)
+        except Exception as exc:
+            # e.g. a failed tc call; the link keeps its previous parameters
+            error = f'{type(exc).__name__}: {exc}'
+        finished = self.clock()
+        record = {
+            'link': link,
+            'scheduled': offset,
+            'actual': started - self.start_time,
+            'lateness_ms': (started - self.start_time - offset) * 1e3,
+            'apply_ms': (finished - started) * 1e3,
+            'wall': wall,
+        }
+        record.update(params)
+        if error is not None:
+            record['error'] = error
+        self.history.append(record)
+        if log is not None:
+            log.write(json.dumps(record) + '\n')
+            log.flush()
+        if error is not None:
+            info(f"*** {link}: change scheduled at {offset:.3f} s failed ({error})\n")
+            return
+        info(f"*** {link}: change scheduled at {offset:.3f} s applied at {record['actual']:.3f} s "
+             f"(+{record['lateness_ms']:.1f} ms, took {record['apply_ms']:.1f} ms)\n")
@@ -0,0 +1,174 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Incremental shaping of TCLinks.
+
+TCIntf.config() deletes and rebuilds the whole qdisc tree on every call, which flushes
+the queues and takes tens of milliseconds per interface. LinkShaper remembers the
+parameters each interface was configured with and only issues 'tc class change' (rate)
+and 'tc qdisc change' (netem) for what actually changed, with the commands of both link
+ends sent through one 'tc -batch' per network namespace.
+
+The handles are the ones Mininet's TCIntf creates: an HTB root 5:0 with class 5:1
+carrying the rate, and netem 10: below it (or at the root when the link has no rate).
+"""
+
+import re
+import subprocess
+import time
+
+from mininet.log import info
+
+NETEM_PARAMS = ('delay', 'jitter', 'loss')
+
+
+def _ms(value):
+    """Converting a Mininet delay/jitter value ('10ms', '1.5s', 10) to milliseconds."""
+    if value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.match(r'^\s*([\d.]+)\s*(us|ms|s)?\s*$', value)
+    if not match:
+        raise ValueError(f'Unsupported time value: {value}')
+    scale = {'us': 1e-3, 'ms': 1.0, 's': 1e3, None: 1.0}[match.group(2)]
+    return float(match.group(1)) * scale
+
+
+class IntfState:
+    """The shaping parameters and qdisc layout currently installed on one interface."""
+
+    def __init__(self, bw=None, delay=None, jitter=None, loss=None):
+        self.bw = bw
+        self.delay = _ms(delay)
+        self.jitter = _ms(jitter)
+        self.loss = float(loss or 0)
+        # Mirroring TCIntf.config(): HTB only with a rate, netem only with delay/jitter/loss
+        self.htb = bool(bw)
+        self.netem = bool(delay or jitter or self.loss > 0)
+
+    def netem_args(self):
+        args = f'delay {self.delay:g}ms'
+        if self.jitter:
+            args += f' {self.jitter:g}ms'
+        return args + f' loss {self.loss:g}%'
+
+
+class LinkShaper:
+    """
+    Changing link parameters with the smallest possible tc update.
+
+    Args:
+        batch (bool): Sending the commands of one namespace through a single 'tc -batch'.
+    Attributes:
+        timings (list): One record per change: link, mode ('incremental' or 'full') and
+            elapsed milliseconds.
+    """
+
+    def __init__(self, batch=True):
+        self.batch = batch
+        self.timings = []
+        self._state = {}
+
+    def state(self, intf):
+        """Returning the known state of an interface, seeded from the parameters it was created with."""
+        if intf.name not in self._state:
+            params = getattr(intf, 'params', None) or {}
+            self._state[intf.name] = IntfState(params.get('bw'), params.get('delay'),
+                                               params.get('jitter'), params.get('loss'))
+        return self._state[intf.name]
+
+    def change(self, link, bw=None, delay=None, jitter=None, loss=None, full=False):
+        """
+        Changing the parameters of both ends of a link. Parameters left as None keep
+        their current value.
+
+        Args:
+            full (bool): Rebuilding the qdisc trees (TCIntf.config()) even when an
+                incremental change would do, e.g. to compare the two.
+        Returns:
+            float: Elapsed time in milliseconds.
+        """
+        started = time.perf_counter()
+        groups = {}
+        rebuild = []
+        for intf in (link.intf1, link.intf2):
+            current = self.state(intf)
+            target = IntfState(current.bw if bw is None else bw,
+                               current.delay if delay is None else delay,
+                               current.jitter if jitter is None else jitter,
+                               current.loss if loss is None else loss)
+            cmds = None if full else self._commands(intf, current, target)
+            if cmds is None:
+                rebuild.append((intf, target))
+            elif cmds:
+                # The qdisc layout stays the same, only the parameters change
+                target.htb, target.netem = current.htb, current.netem
+                groups.setdefault(self._namespace(intf.node), []).append((intf, target, cmds))
+
+        for node, entries in groups.items():
+            if self._run(node, [cmd for _, _, cmds in entries for cmd in cmds]):
+                for intf, target, _ in entries:
+                    self._state[intf.name] = target
+            else:
+                # The installed tree did not look like we expected; rebuilding it
+                rebuild += [(intf, target) for intf, target, _ in entries]
+        for intf, target in rebuild:
+            self._configure(intf, target)
+
+        elapsed = (time.perf_counter() - started) * 1e3
+        self.timings.append({'link': link.intf1.name, 'mode': 'full' if rebuild else 'incremental', 'ms': elapsed})
+        return elapsed
+
+    def _commands(self, intf, current, target):
+        """
+        Building the change commands for one interface, or None when the qdisc tree
+        has to be rebuilt (a needed HTB class or netem qdisc does not exist yet).
+        """
+        cmds = []
+        if target.bw != current.bw:
+            if not current.htb or not target.bw:
+                return None
+            cmds.append(f'class change dev {intf.name} parent 5:0 classid 5:1 htb rate {float(target.bw):g}Mbit burst 15k')
+        if any(getattr(target, p) != getattr(current, p) for p in NETEM_PARAMS):
+            if not current.netem:
+                return None
+            parent = 'parent 5:1' if current.htb else 'root'
+            cmds.append(f'qdisc change dev {intf.name} {parent} handle 10: netem {target.netem_args()}')
+        return cmds
+
+    @staticmethod
+    def _namespace(node):
+        """Interfaces of nodes outside a network namespace (e.g. OVS switches) share the root namespace."""
+        return node if getattr(node, 'inNamespace', False) else None
+
+    def _run(self, node, cmds):
+        """Running tc commands in a node's namespace (root namespace for node None)."""
+        if self.batch:
+            batches = [['tc', '-batch', '-']]
+            inputs = ['\n'.join(cmds) + '\n']
+        else:
+            batches = [['tc'] + cmd.split() for cmd in cmds]
+            inputs = [None] * len(cmds)
+        ok = True
+        for args, data in zip(batches, inputs):
+            if node is None:
+                proc = subprocess.run(args, input=data, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                      universal_newlines=True)
+                output, code = proc.stdout, proc.returncode
+            else:
+                # Node.popen() pipes stdout and stderr only; the batch goes through stdin
+                proc = node.popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                  universal_newlines=True)
+                output, _ = proc.communicate(data)
+                code = proc.returncode
+            if code != 0:
+                info(f'*** tc failed ({output.strip()}), rebuilding the qdiscs\n')
+                ok = False
+        return ok
+
+    def _configure(self, intf, target):
+        """Rebuilding the qdisc tree of an interface with TCIntf.config()."""
+        intf.config(bw=target.bw, delay=f'{target.delay:g}ms', jitter=f'{target.jitter:g}ms', loss=target.loss)
+        self._state[intf.name] = IntfState(target.bw, target.delay, target.jitter, target.loss)
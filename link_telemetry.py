@@ -0,0 +1,268 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+High-frequency interface and qdisc telemetry of the emulated links.
+
+A TelemetrySampler reads the counters of chosen interfaces every 10 to 100 ms from one
+thread, on absolute monotonic deadlines:
+
+    /sys/class/net/<iface>/statistics   bytes, packets and drops in both directions
+    tc -s -j qdisc show                 backlog (bytes and packets), drops, overlimits
+                                        and requeues of the qdiscs of the interface
+
+Only interfaces of the root namespace are visible there, which covers the switch ends
+of every link (e.g. both ends of the middle link, s1-eth3 and s2-eth3). The sysfs files
+are kept open and re-read in place, and one tc call covers all interfaces, so a sample
+costs one process start. Rows go into a preallocated NumPy ring buffer (the last few
+minutes stay queryable, e.g. from the CLI with 'telemetry') and are appended to
+<path>.bin in the background once per second; <path>.json describes the layout:
+
+    python3 link_telemetry.py pcap/link_telemetry      # summary per interface
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+from mininet.log import info
+
+STATISTICS = ('rx_bytes', 'tx_bytes', 'rx_packets', 'tx_packets', 'rx_dropped', 'tx_dropped')
+QDISC = ('backlog', 'qlen', 'drops', 'overlimits', 'requeues')
+DTYPE = np.dtype([('wall', '<f8'), ('mono', '<f8'), ('iface', '<u2')] +
+                 [(name, '<u8') for name in STATISTICS] + [(name, '<u8') for name in QDISC])
+
+
+def qdisc_stats(output):
+    """
+    Aggregating the output of 'tc -s -j qdisc show' per interface.
+
+    The backlog of the root qdisc includes that of its children (htb, tbf), so the
+    largest backlog on an interface is its queue occupancy; drops, overlimits and
+    requeues are counted by the qdisc where they happen and are summed.
+
+    Returns:
+        dict: Interface name -> dict of QDISC counters.
+    """
+    stats = {}
+    for qdisc in json.loads(output or '[]'):
+        dev = stats.setdefault(qdisc.get('dev'), dict.fromkeys(QDISC, 0))
+        dev['backlog'] = max(dev['backlog'], qdisc.get('backlog', 0))
+        dev['qlen'] = max(dev['qlen'], qdisc.get('qlen', 0))
+        for name in ('drops', 'overlimits', 'requeues'):
+            dev[name] += qdisc.get(name, 0)
+    return stats
+
+
+class TelemetrySampler:
+    """
+    Sampling interface and qdisc counters into a ring buffer and a binary log.
+
+    Args:
+        interfaces (list): Interface names (or Mininet Intf objects) in the root namespace.
+        interval (float): Seconds between samples (0.01 to 0.1 is typical).
+        path (str): Log prefix; writes <path>.bin and <path>.json (None: memory only).
+        seconds (float): Seconds of history kept in the ring buffer.
+        qdisc (bool): Also sampling 'tc -s qdisc'.
+    """
+
+    def __init__(self, interfaces, interval=0.05, path=None, seconds=300, qdisc=True):
+        self.interfaces = [getattr(intf, 'name', intf) for intf in interfaces]
+        self.interval = interval
+        self.path = path
+        self.qdisc = qdisc
+        self.capacity = max(1, int(seconds / interval)) * len(self.interfaces)
+        self.ring = np.zeros(self.capacity, dtype=DTYPE)
+        self.count = 0
+        self.late = 0
+        self._written = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._files = {}
+        self._thread = None
+
+    def start(self):
+        """Opening the counters and starting the sampling thread."""
+        for name in self.interfaces:
+            base = f'/sys/class/net/{name}/statistics'
+            self._files[name] = [os.open(os.path.join(base, stat), os.O_RDONLY) for stat in STATISTICS]
+        if self.path:
+            with open(self.path + '.json', 'w') as f:
+                json.dump({'interfaces': self.interfaces, 'interval': self.interval,
+                           'dtype': [list(field) for field in DTYPE.descr]}, f, indent=1)
+            # Truncating a log of an earlier run
+            open(self.path + '.bin', 'wb').close()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for fds in self._files.values():
+            for fd in fds:
+                os.close(fd)
+        self._files = {}
+        info(f'*** Telemetry: {self.count // max(1, len(self.interfaces))} samples, {self.late} late\n')
+
+    def _sample(self):
+        wall, mono = time.time(), time.monotonic()
+        qdiscs = {}
+        if self.qdisc:
+            result = subprocess.run(['tc', '-s', '-j', 'qdisc', 'show'], stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, universal_newlines=True)
+            qdiscs = qdisc_stats(result.stdout)
+        rows = []
+        for index, name in enumerate(self.interfaces):
+            counters = [int(os.pread(fd, 32, 0)) for fd in self._files[name]]
+            queue = qdiscs.get(name, {})
+            rows.append((wall, mono, index, *counters, *(queue.get(field, 0) for field in QDISC)))
+        with self._lock:
+            for row in rows:
+                self.ring[self.count % self.capacity] = row
+                self.count += 1
+
+    def _flush(self, log):
+        with self._lock:
+            pending = self.count - self._written
+            if pending > self.capacity:
+                # The writer fell a whole buffer behind; the oldest rows are lost
+                self._written = self.count - self.capacity
+                pending = self.capacity
+            start = self._written % self.capacity
+            end = start + pending
+            chunk = self.ring[start:min(end, self.capacity)].copy()
+            if end > self.capacity:
+                chunk = np.concatenate([chunk, self.ring[:end - self.capacity]])
+            self._written = self.count
+        log.write(chunk.tobytes())
+        log.flush()
+
+    def _run(self):
+        log = open(self.path + '.bin', 'ab') if self.path else None
+        deadline = time.monotonic()
+        next_flush = deadline + 1.0
+        try:
+            while not self._stop.is_set():
+                self._sample()
+                if log is not None and time.monotonic() >= next_flush:
+                    self._flush(log)
+                    next_flush += 1.0
+                deadline += self.interval
+                remaining = deadline - time.monotonic()
+                if remaining < 0:
+                    # Skipping the samples that could not be taken in time
+                    self.late += 1
+                    deadline += -(remaining // self.interval) * self.interval
+                    remaining = deadline - time.monotonic()
+                self._stop.wait(max(0.0, remaining))
+        finally:
+            if log is not None:
+                self._flush(log)
+                log.close()
+
+    def window(self, seconds=None, iface=None):
+        """
+        Returning the buffered rows of the last seconds (all buffered rows by default),
+        optionally of one interface, oldest first.
+        """
+        with self._lock:
+            n = min(self.count, self.capacity)
+            start = (self.count - n) % self.capacity
+            rows = np.concatenate([self.ring[start:start + n], self.ring[:max(0, start + n - self.capacity)]])
+        if iface is not None:
+            rows = rows[rows['iface'] == self.interfaces.index(getattr(iface, 'name', iface))]
+        if seconds is not None and len(rows):
+            rows = rows[rows['mono'] >= rows['mono'][-1] - seconds]
+        return rows
+
+    def summary(self, seconds=10):
+        """Returning rates and queue statistics of the last seconds, one dict per interface."""
+        return [summarize(self.window(seconds, name), name) for name in self.interfaces]
+
+
+def summarize(rows, name=''):
+    """Turning the rows of one interface into rates and queue statistics."""
+    result = {'iface': name, 'samples': len(rows)}
+    if len(rows) < 2:
+        return result
+    elapsed = rows['mono'][-1] - rows['mono'][0]
+    delta = {field: int(rows[field][-1]) - int(rows[field][0])
+             for field in STATISTICS + ('drops', 'overlimits', 'requeues')}
+    result.update(seconds=elapsed,
+                  rx_mbps=delta['rx_bytes'] * 8 / elapsed / 1e6, tx_mbps=delta['tx_bytes'] * 8 / elapsed / 1e6,
+                  rx_pps=delta['rx_packets'] / elapsed, tx_pps=delta['tx_packets'] / elapsed,
+                  backlog_mean=float(rows['backlog'].mean()), backlog_max=int(rows['backlog'].max()),
+                  qlen_max=int(rows['qlen'].max()), drops=delta['drops'] + delta['tx_dropped'],
+                  overlimits=delta['overlimits'])
+    return result
+
+
+def format_summary(result):
+    if result['samples'] < 2:
+        return f"{result['iface']}: no samples yet"
+    return (f"{result['iface']}: rx {result['rx_mbps']:.2f} Mbit/s, tx {result['tx_mbps']:.2f} Mbit/s, "
+            f"backlog mean {result['backlog_mean'] / 1e3:.1f} kB max {result['backlog_max'] / 1e3:.1f} kB "
+            f"({result['qlen_max']} pkts), {result['drops']} drops, {result['overlimits']} overlimits "
+            f"over {result['seconds']:.1f} s")
+
+
+def load(path):
+    """
+    Reading a telemetry log.
+
+    Returns:
+        tuple: (list of interface names, structured array of rows).
+    """
+    with open(path + '.json') as f:
+        meta = json.load(f)
+    dtype = np.dtype([tuple(field) for field in meta['dtype']])
+    return meta['interfaces'], np.fromfile(path + '.bin', dtype=dtype)
+
+
+def telemetry_cli(base):
+    """
+    Returning a subclass of a Mininet CLI class with a 'telemetry' command:
+
+        mininet> telemetry                 summary of the last 10 s of every interface
+        mininet> telemetry s1-eth3 30      one interface, last 30 s
+    """
+    class TelemetryCLI(base):
+        def __init__(self, mininet, sampler=None, **kwargs):
+            # Mininet's CLI runs its command loop from __init__
+            self.sampler = sampler
+            super().__init__(mininet, **kwargs)
+
+        def do_telemetry(self, line):
+            """Show link telemetry: telemetry [iface] [seconds]"""
+            if self.sampler is None:
+                print('No telemetry sampler is running')
+                return
+            args = line.split()
+            seconds = float(args[-1]) if args and args[-1].replace('.', '', 1).isdigit() else 10
+            names = [arg for arg in args if arg in self.sampler.interfaces] or self.sampler.interfaces
+            for name in names:
+                print(format_summary(summarize(self.sampler.window(seconds, name), name)))
+
+    return TelemetryCLI
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarizing a link telemetry log.')
+    parser.add_argument('path', help='Log prefix, e.g. pcap/link_telemetry')
+    parser.add_argument('--seconds', type=float, default=None, help='Only the last seconds of the log')
+    args = parser.parse_args()
+
+    interfaces, rows = load(args.path)
+    for index, name in enumerate(interfaces):
+        own = rows[rows['iface'] == index]
+        if args.seconds is not None and len(own):
+            own = own[own['mono'] >= own['mono'][-1] - args.seconds]
+        print(format_summary(summarize(own, name)))
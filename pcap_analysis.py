@@ -0,0 +1,374 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Vectorized analysis of the pcap files written by the topology scripts
+(pcap/middle_link_capture.pcap, pcap/file_traffic.pcap, pcap/web_traffic.pcap, ...).
+
+The capture is memory-mapped and the record headers, IPv4 headers and TCP/UDP ports
+are decoded straight into NumPy arrays, so no Python object is built per packet.
+"""
+
+import argparse
+import mmap
+import os
+import socket
+import struct
+from array import array
+
+import numpy as np
+
+# Magic number (as stored on disk) -> (byte order, timestamp fraction divisor)
+PCAP_MAGICS = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1e6),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e9),
+    b'\xa1\xb2\xc3\xd4': ('>', 1e6),
+    b'\xa1\xb2\x3c\x4d': ('>', 1e9),
+}
+GLOBAL_HEADER_LEN = 24
+RECORD_HEADER_LEN = 16
+
+# Link-layer types we know how to strip, mapped to the offset of the L3 header
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = 0x8100
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+
+# One row per packet. Non-IPv4 packets keep proto == 0 and zeroed addresses/ports.
+PACKET_DTYPE = np.dtype([
+    ('ts', 'f8'),          # capture timestamp, seconds since the epoch
+    ('offset', 'i8'),      # byte offset of the record header in the file
+    ('caplen', 'u4'),      # bytes stored in the capture
+    ('length', 'u4'),      # bytes on the wire
+    ('src', 'u4'),
+    ('dst', 'u4'),
+    ('sport', 'u2'),
+    ('dport', 'u2'),
+    ('proto', 'u1'),
+    ('tcp_flags', 'u1'),
+])
+
+FLOW_FIELDS = ['src', 'dst', 'sport', 'dport', 'proto']
+
+
+class PcapReader:
+    """
+    Memory-mapped reader for classic (libpcap) capture files.
+
+    Args:
+        path (str): Path to the pcap file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        if self.size < GLOBAL_HEADER_LEN:
+            self._file.close()
+            raise ValueError(f'{path}: file too short to be a pcap')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._bytes = np.frombuffer(self._map, dtype=np.uint8)
+
+        magic = bytes(self._map[:4])
+        if magic not in PCAP_MAGICS:
+            self.close()
+            raise ValueError(f'{path}: unsupported capture format (magic {magic.hex()})')
+        self.endian, self._ts_divisor = PCAP_MAGICS[magic]
+        _, _, _, _, self.snaplen, self.linktype = struct.unpack_from(self.endian + 'HHiIII', self._map, 4)
+        self.linktype &= 0x0fffffff
+        self._caplen_field = struct.Struct(self.endian + 'I')
+
+    def close(self):
+        """Releasing the memory map and the file handle."""
+        self._bytes = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record_offsets(self, start=GLOBAL_HEADER_LEN, end=None, max_bytes=None):
+        """
+        Walking the record headers between two byte offsets.
+
+        Only the caplen field of each header is read; the offsets are collected into a
+        flat int64 buffer. A truncated trailing record (e.g. a capture still being
+        written) is left out.
+
+        Returns:
+            tuple: (np.ndarray of record offsets, offset where the walk stopped)
+        """
+        end = self.size if end is None else min(end, self.size)
+        if max_bytes is not None:
+            stop = min(end, start + max_bytes)
+        else:
+            stop = end
+        unpack = self._caplen_field.unpack_from
+        buf = self._map
+        offsets = array('q')
+        pos = start
+        while pos < stop and pos + RECORD_HEADER_LEN <= end:
+            nxt = pos + RECORD_HEADER_LEN + unpack(buf, pos + 8)[0]
+            if nxt > end:
+                break
+            offsets.append(pos)
+            pos = nxt
+        return np.frombuffer(offsets, dtype=np.int64), pos
+
+    def decode(self, offsets):
+        """
+        Decoding the records at the given offsets into a PACKET_DTYPE array.
+
+        Args:
+            offsets (np.ndarray): Record header offsets, as returned by record_offsets().
+        Returns:
+            np.ndarray: One PACKET_DTYPE row per record.
+        """
+        u8 = self._bytes
+        big = self.endian == '>'
+        out = np.zeros(len(offsets), dtype=PACKET_DTYPE)
+        if len(offsets) == 0:
+            return out
+
+        sec = _gather_uint(u8, offsets, 4, big)
+        frac = _gather_uint(u8, offsets + 4, 4, big)
+        caplen = _gather_uint(u8, offsets + 8, 4, big).astype(np.int64)
+        out['ts'] = sec + frac / self._ts_divisor
+        out['offset'] = offsets
+        out['caplen'] = caplen
+        out['length'] = _gather_uint(u8, offsets + 12, 4, big)
+
+        data = offsets + RECORD_HEADER_LEN
+        end = data + caplen
+        l3, ethertype = self._link_layer(u8, data, end)
+
+        # IPv4 header: at least 20 bytes captured and version nibble == 4
+        ip = (ethertype == ETHERTYPE_IPV4) & (l3 + 20 <= end)
+        ver_ihl = _gather_uint(u8, l3, 1, True, ip)
+        ip &= (ver_ihl >> 4) == 4
+        ihl = (ver_ihl & 0x0f).astype(np.int64) * 4
+        proto = _gather_uint(u8, l3 + 9, 1, True, ip)
+        frag = _gather_uint(u8, l3 + 6, 2, True, ip) & 0x1fff
+        out['proto'] = np.where(ip, proto, 0)
+        out['src'] = _gather_uint(u8, l3 + 12, 4, True, ip)
+        out['dst'] = _gather_uint(u8, l3 + 16, 4, True, ip)
+
+        # Ports are only present in the first fragment of a TCP/UDP datagram
+        l4 = l3 + ihl
+        ports = ip & (frag == 0) & ((proto == IPPROTO_TCP) | (proto == IPPROTO_UDP)) & (l4 + 4 <= end)
+        out['sport'] = _gather_uint(u8, l4, 2, True, ports)
+        out['dport'] = _gather_uint(u8, l4 + 2, 2, True, ports)
+        tcp = ports & (proto == IPPROTO_TCP) & (l4 + 14 <= end)
+        out['tcp_flags'] = _gather_uint(u8, l4 + 13, 1, True, tcp)
+        return out
+
+    def _link_layer(self, u8, data, end):
+        """Returning the L3 offsets and ethertypes for the capture's link type."""
+        n = len(data)
+        if self.linktype == LINKTYPE_ETHERNET:
+            ethertype = _gather_uint(u8, data + 12, 2, True, data + 14 <= end)
+            vlan = (ethertype == ETHERTYPE_VLAN) & (data + 18 <= end)
+            inner = _gather_uint(u8, data + 16, 2, True, vlan)
+            ethertype = np.where(vlan, inner, ethertype)
+            l3 = data + np.where(vlan, 18, 14)
+        elif self.linktype == LINKTYPE_LINUX_SLL:
+            ethertype = _gather_uint(u8, data + 14, 2, True, data + 16 <= end)
+            l3 = data + 16
+        elif self.linktype == LINKTYPE_LINUX_SLL2:
+            ethertype = _gather_uint(u8, data, 2, True, data + 20 <= end)
+            l3 = data + 20
+        elif self.linktype in (LINKTYPE_RAW, LINKTYPE_IPV4):
+            ethertype = np.full(n, ETHERTYPE_IPV4, dtype=np.uint64)
+            l3 = data
+        else:
+            ethertype = np.zeros(n, dtype=np.uint64)
+            l3 = data
+        return l3, ethertype
+
+    def packets(self, start=GLOBAL_HEADER_LEN, end=None):
+        """Decoding every complete record between two byte offsets."""
+        offsets, _ = self.record_offsets(start, end)
+        return self.decode(offsets)
+
+    def chunks(self, chunk_bytes=64 * 1024 * 1024, start=GLOBAL_HEADER_LEN):
+        """
+        Yielding PACKET_DTYPE arrays covering roughly chunk_bytes of the file each,
+        so arbitrarily large captures can be processed with flat memory use.
+        """
+        pos = start
+        while pos < self.size:
+            offsets, nxt = self.record_offsets(pos, max_bytes=chunk_bytes)
+            if nxt == pos:
+                break
+            yield self.decode(offsets)
+            pos = nxt
+
+
+def _gather_uint(u8, idx, width, big, valid=None):
+    """
+    Reading unsigned integers of the given byte width at every index of idx.
+    Entries where valid is False (or that fall outside the buffer) come back as 0.
+    """
+    limit = len(u8) - width
+    ok = idx <= limit
+    if valid is not None:
+        ok &= valid
+    idx = np.where(ok, idx, 0)
+    value = np.zeros(len(idx), dtype=np.uint64)
+    for i in range(width):
+        shift = 8 * (width - 1 - i) if big else 8 * i
+        value |= u8[idx + i].astype(np.uint64) << np.uint64(shift)
+    value[~ok] = 0
+    return value
+
+
+def read_pcap(path):
+    """
+    Reading a whole capture into a PACKET_DTYPE array.
+
+    Args:
+        path (str): Path to the pcap file.
+    Returns:
+        np.ndarray: One row per packet.
+    """
+    with PcapReader(path) as reader:
+        return reader.packets()
+
+
+def flow_index(packets, bidirectional=False):
+    """
+    Assigning every packet to its IPv4 5-tuple flow.
+
+    Args:
+        packets (np.ndarray): PACKET_DTYPE rows.
+        bidirectional (bool): Merging both directions of a conversation into one flow.
+    Returns:
+        tuple: (flows, inverse) where flows is a structured array of unique 5-tuples and
+        inverse maps each packet to its row in flows.
+    """
+    keys = np.empty(len(packets), dtype=[(name, PACKET_DTYPE[name]) for name in FLOW_FIELDS])
+    for name in FLOW_FIELDS:
+        keys[name] = packets[name]
+    if bidirectional:
+        # Ordering the endpoints so that A->B and B->A share a key
+        swap = (keys['src'] > keys['dst']) | ((keys['src'] == keys['dst']) & (keys['sport'] > keys['dport']))
+        keys['src'], keys['dst'] = np.where(swap, keys['dst'], keys['src']), np.where(swap, keys['src'], keys['dst'])
+        keys['sport'], keys['dport'] = (np.where(swap, keys['dport'], keys['sport']),
+                                        np.where(swap, keys['sport'], keys['dport']))
+    flows, inverse = np.unique(keys, return_inverse=True)
+    return flows, inverse.reshape(-1)
+
+
+def flow_series(packets, bin_size=1.0, start=None, end=None, bidirectional=False):
+    """
+    Computing per-flow time series in fixed time bins.
+
+    Args:
+        packets (np.ndarray): PACKET_DTYPE rows.
+        bin_size (float): Bin width in seconds.
+        start (float): Timestamp of the first bin edge (defaults to the first packet).
+        end (float): Timestamp after the last bin (defaults to the last packet).
+        bidirectional (bool): Merging both directions of a conversation into one flow.
+    Returns:
+        dict: 'edges' (nbins + 1), 'flows' (nflows), and nflows x nbins arrays
+        'packets', 'bytes', 'throughput' (bit/s), 'mean_size' and 'mean_iat' (seconds,
+        NaN where a bin holds fewer than two packets of the flow).
+    """
+    ts = packets['ts']
+    if start is None:
+        start = float(ts.min()) if len(ts) else 0.0
+    if end is None:
+        end = float(ts.max()) if len(ts) else start
+    nbins = max(1, int(np.floor((end - start) / bin_size)) + 1)
+    edges = start + bin_size * np.arange(nbins + 1)
+
+    keep = (ts >= start) & (ts < edges[-1])
+    packets = packets[keep]
+    ts = packets['ts']
+    flows, inverse = flow_index(packets, bidirectional)
+    nflows = len(flows)
+    bins = ((ts - start) / bin_size).astype(np.int64)
+    cell = inverse * nbins + bins
+    size = nflows * nbins
+
+    count = np.bincount(cell, minlength=size).reshape(nflows, nbins)
+    volume = np.bincount(cell, weights=packets['length'], minlength=size).reshape(nflows, nbins)
+
+    # Inter-arrival times within each flow, credited to the bin of the later packet
+    order = np.lexsort((ts, inverse))
+    same_flow = inverse[order][1:] == inverse[order][:-1]
+    gaps = np.diff(ts[order])[same_flow]
+    gap_cell = cell[order][1:][same_flow]
+    gap_sum = np.bincount(gap_cell, weights=gaps, minlength=size).reshape(nflows, nbins)
+    gap_count = np.bincount(gap_cell, minlength=size).reshape(nflows, nbins)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_size = np.where(count > 0, volume / count, np.nan)
+        mean_iat = np.where(gap_count > 0, gap_sum / gap_count, np.nan)
+    return {
+        'edges': edges,
+        'flows': flows,
+        'packets': count,
+        'bytes': volume,
+        'throughput': volume * 8 / bin_size,
+        'mean_size': mean_size,
+        'mean_iat': mean_iat,
+    }
+
+
+def format_flow(flow):
+    """Rendering a flow row as 'proto src:sport -> dst:dport'."""
+    names = {IPPROTO_TCP: 'tcp', IPPROTO_UDP: 'udp'}
+    proto = names.get(int(flow['proto']), str(int(flow['proto'])))
+    src = socket.inet_ntoa(struct.pack('>I', int(flow['src'])))
+    dst = socket.inet_ntoa(struct.pack('>I', int(flow['dst'])))
+    return f"{proto} {src}:{int(flow['sport'])} -> {dst}:{int(flow['dport'])}"
+
+
+def write_series_csv(series, path):
+    """Writing a flow_series() result as a long-format CSV (one row per flow and bin)."""
+    with open(path, 'w') as out:
+        out.write('bin_start,flow,packets,bytes,throughput_bps,mean_size,mean_iat\n')
+        for f, flow in enumerate(series['flows']):
+            label = format_flow(flow)
+            for b in np.nonzero(series['packets'][f])[0]:
+                out.write(f"{series['edges'][b]:.6f},{label},{series['packets'][f, b]},"
+                          f"{int(series['bytes'][f, b])},{series['throughput'][f, b]:.1f},"
+                          f"{series['mean_size'][f, b]:.1f},{series['mean_iat'][f, b]:.6f}\n")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-flow throughput, packet-size and inter-arrival series from a pcap.')
+    parser.add_argument('pcap', nargs='+',
+                        help='Capture file(s), e.g. the pcap/middle_link_capture_*.pcap segments of one run')
+    parser.add_argument('--bin', dest='bin_size', type=float, default=1.0, help='Bin width in seconds (default: 1.0)')
+    parser.add_argument('--top', type=int, default=10, help='Number of largest flows to print (default: 10)')
+    parser.add_argument('--bidirectional', action='store_true', help='Merge both directions of each conversation')
+    parser.add_argument('--csv', help='Write the full per-flow, per-bin series to this CSV file')
+    args = parser.parse_args()
+
+    packets = np.concatenate([read_pcap(path) for path in args.pcap])
+    print(f"{', '.join(args.pcap)}: {len(packets)} packets")
+    if len(packets):
+        series = flow_series(packets, args.bin_size, bidirectional=args.bidirectional)
+        duration = series['edges'][-1] - series['edges'][0]
+        totals = series['bytes'].sum(axis=1)
+        for f in np.argsort(totals)[::-1][:args.top]:
+            print(f"{format_flow(series['flows'][f]):<48} {int(series['packets'][f].sum()):>9} pkts "
+                  f"{totals[f] * 8 / duration / 1e6:>9.3f} Mbit/s avg "
+                  f"{np.nanmax(series['throughput'][f]) / 1e6:>9.3f} Mbit/s peak")
+        if args.csv:
+            write_series_csv(series, args.csv)
+            print(f'Series written to {args.csv}')
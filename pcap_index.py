@@ -0,0 +1,373 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Persistent time index of pcap files, for reading a time range without a full scan.
+
+One pass over a capture writes a sidecar <pcap>.tidx next to it (NumPy .npz format)
+with one row per non-empty time bucket (1 s by default):
+
+    start      bucket start time (capture clock, seconds since the epoch)
+    offset     byte offset of the bucket's first record
+    packet     number of the bucket's first packet in the file (from 0)
+    packets    packets in the bucket
+    bytes      bytes on the wire
+    flows      distinct IPv4 5-tuple flows
+
+A time range is then read by seeking straight to the offset of its first bucket and
+decoding only up to the bucket after its end. The sidecar remembers the size, mtime
+and global header of the capture it describes: a capture that has grown (e.g. the
+newest segment while tcpdump is still writing it) is indexed incrementally from its
+last bucket on; one that was truncated, rewritten or replaced is indexed again.
+
+Example: the packets of the 5 s after every change of the middle link to 30 Mbit/s
+and 60 ms:
+    python3 pcap_index.py pcap/middle_link_capture_*.pcap --link-log pcap/link_changes.jsonl \\
+        --match bw=30,delay=60 --seconds 5
+"""
+
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+
+from capture import TIME_INDEX_SUFFIX
+from pcap_analysis import GLOBAL_HEADER_LEN, PACKET_DTYPE, RECORD_HEADER_LEN, PcapReader, flow_index, format_flow
+
+INDEX_VERSION = 1
+BUCKET_DTYPE = np.dtype([
+    ('start', 'f8'),
+    ('offset', 'i8'),
+    ('packet', 'i8'),
+    ('packets', 'u4'),
+    ('bytes', 'u8'),
+    ('flows', 'u4'),
+])
+
+
+class PcapIndex:
+    """
+    The time-bucket index of one capture file, kept in a sidecar file.
+
+    Args:
+        path (str): Capture file.
+        bucket (float): Bucket width in seconds.
+    Attributes:
+        buckets (np.ndarray): BUCKET_DTYPE rows in file order.
+        scanned (int): Byte offset where the indexed records end.
+        packets (int): Packets indexed.
+    """
+
+    def __init__(self, path, bucket=1.0):
+        self.path = path
+        self.bucket = float(bucket)
+        self.sidecar = path + TIME_INDEX_SUFFIX
+        self._reset()
+
+    def _reset(self):
+        self.buckets = np.zeros(0, dtype=BUCKET_DTYPE)
+        self.origin = None
+        self.scanned = GLOBAL_HEADER_LEN
+        self.packets = 0
+        self.size = 0
+        self.mtime_ns = 0
+        self.header = ''
+
+    @classmethod
+    def open(cls, path, bucket=1.0, chunk_bytes=64 * 1024 * 1024):
+        """Loading the sidecar of a capture and bringing it up to date with the file."""
+        index = cls(path, bucket)
+        index.load()
+        index.update(chunk_bytes)
+        return index
+
+    def load(self):
+        """Reading the sidecar. Returns False (and leaves the index empty) if there is no usable one."""
+        try:
+            with np.load(self.sidecar) as data:
+                meta = json.loads(str(data['meta']))
+                buckets = data['buckets']
+        except (OSError, KeyError, ValueError):
+            return False
+        if meta.get('version') != INDEX_VERSION or meta.get('bucket') != self.bucket:
+            return False
+        self.buckets = buckets.astype(BUCKET_DTYPE)
+        self.origin = meta['origin']
+        self.scanned = meta['scanned']
+        self.packets = meta['packets']
+        self.size = meta['size']
+        self.mtime_ns = meta['mtime_ns']
+        self.header = meta['header']
+        return True
+
+    def save(self):
+        meta = {'version': INDEX_VERSION, 'bucket': self.bucket, 'origin': self.origin, 'scanned': self.scanned,
+                'packets': self.packets, 'size': self.size, 'mtime_ns': self.mtime_ns, 'header': self.header}
+        tmp = self.sidecar + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, buckets=self.buckets, meta=np.array(json.dumps(meta)))
+        os.replace(tmp, self.sidecar)
+
+    def status(self):
+        """
+        Comparing the index with the capture on disk.
+
+        Returns:
+            str: 'fresh' (nothing to do), 'grown' (new records were appended), 'new' (no
+            index yet), 'stale' (the file was replaced or truncated; the index is
+            rebuilt) or 'empty' (not even the global header has been written yet).
+        """
+        stat = os.stat(self.path)
+        if stat.st_size < GLOBAL_HEADER_LEN:
+            return 'empty'
+        with open(self.path, 'rb') as f:
+            header = f.read(GLOBAL_HEADER_LEN).hex()
+        if not self.header:
+            return 'new'
+        if header != self.header or stat.st_size < self.size:
+            return 'stale'
+        if stat.st_size == self.size:
+            return 'fresh' if stat.st_mtime_ns == self.mtime_ns else 'stale'
+        return 'grown'
+
+    def update(self, chunk_bytes=64 * 1024 * 1024):
+        """
+        Indexing what was appended to the capture since the last update, or the whole
+        file when the index is missing or stale.
+
+        Returns:
+            str: The status the capture had (see status()).
+        """
+        state = self.status()
+        if state in ('fresh', 'empty'):
+            return state
+        stat = os.stat(self.path)
+        with PcapReader(self.path) as reader:
+            if state == 'grown' and not self._resumable(reader):
+                state = 'stale'
+            if state in ('new', 'stale'):
+                self._reset()
+                start, packet = GLOBAL_HEADER_LEN, 0
+            elif len(self.buckets):
+                # The last bucket may have been cut off by the end of the file: it is indexed again
+                last = self.buckets[-1]
+                start, packet = int(last['offset']), int(last['packet'])
+                self.buckets = self.buckets[:-1]
+            else:
+                start, packet = self.scanned, self.packets
+            self._scan(reader, start, packet, chunk_bytes)
+            self.header = bytes(reader._map[:GLOBAL_HEADER_LEN]).hex()
+        self.size, self.mtime_ns = stat.st_size, stat.st_mtime_ns
+        self.save()
+        return state
+
+    def _resumable(self, reader):
+        """Whether the record at the start of the last bucket is still where the index has it."""
+        if not len(self.buckets):
+            return True
+        last = self.buckets[-1]
+        if last['offset'] + RECORD_HEADER_LEN > reader.size:
+            return False
+        packets = reader.decode(np.array([last['offset']], dtype=np.int64))
+        # Packets stamped slightly out of order can sit in the bucket after their own
+        return bool(len(packets)) and abs(packets['ts'][0] - last['start']) <= 2 * self.bucket
+
+    def _bucket_ids(self, ts, floor):
+        ids = np.floor((ts - self.origin) / self.bucket).astype(np.int64)
+        # Packets stamped slightly earlier than their predecessor stay in the current bucket,
+        # so the buckets follow the file order
+        return np.maximum.accumulate(np.maximum(ids, floor))
+
+    def _scan(self, reader, pos, packet, chunk_bytes):
+        rows = [self.buckets]
+        pending = None
+        floor = 0
+        if len(self.buckets):
+            floor = int(round((self.buckets['start'][-1] - self.origin) / self.bucket))
+        while True:
+            offsets, nxt = reader.record_offsets(pos, max_bytes=chunk_bytes)
+            if nxt == pos:
+                break
+            pos = nxt
+            packets = reader.decode(offsets)
+            if pending is not None:
+                packets = np.concatenate([pending, packets])
+            if self.origin is None:
+                self.origin = float(np.floor(packets['ts'][0] / self.bucket) * self.bucket)
+            ids = self._bucket_ids(packets['ts'], floor)
+            # The last bucket of the chunk may continue in the next one
+            done = ids < ids[-1]
+            rows.append(self._summarize(packets[done], ids[done], packet))
+            packet += int(done.sum())
+            pending = packets[~done]
+            floor = int(ids[-1])
+        if pending is not None and len(pending):
+            ids = self._bucket_ids(pending['ts'], floor)
+            rows.append(self._summarize(pending, ids, packet))
+            packet += len(pending)
+        self.buckets = np.concatenate(rows)
+        self.scanned = pos
+        self.packets = packet
+
+    def _summarize(self, packets, ids, packet):
+        """Turning packets and their (non-decreasing) bucket ids into bucket rows."""
+        if not len(packets):
+            return np.zeros(0, dtype=BUCKET_DTYPE)
+        unique, first = np.unique(ids, return_index=True)
+        rows = np.zeros(len(unique), dtype=BUCKET_DTYPE)
+        rows['start'] = self.origin + unique * self.bucket
+        rows['offset'] = packets['offset'][first]
+        rows['packet'] = packet + first
+        rows['packets'] = np.diff(np.append(first, len(packets)))
+        rows['bytes'] = np.add.reduceat(packets['length'].astype(np.uint64), first)
+        # Distinct (bucket, flow) pairs, counted per bucket
+        flows, inverse = flow_index(packets)
+        pairs = np.unique(np.searchsorted(unique, ids) * len(flows) + inverse)
+        rows['flows'] = np.bincount(pairs // len(flows), minlength=len(unique))
+        return rows
+
+    def span(self):
+        """Returning (first bucket start, last bucket end), or None for an empty capture."""
+        if not len(self.buckets):
+            return None
+        return float(self.buckets['start'][0]), float(self.buckets['start'][-1] + self.bucket)
+
+    def byte_range(self, start, end):
+        """
+        Returning the (first, last) byte offsets of the records that can have a
+        timestamp in [start, end). One extra bucket is included at the end for packets
+        stamped out of order.
+        """
+        starts = self.buckets['start']
+        first = np.searchsorted(starts, start - self.bucket, side='right')
+        last = np.searchsorted(starts, end, side='left') + 1
+        offset = lambda i: int(self.buckets['offset'][i]) if i < len(starts) else self.scanned
+        return offset(first), offset(last)
+
+    def window(self, start, end):
+        """Returning the bucket rows that overlap [start, end)."""
+        starts = self.buckets['start']
+        return self.buckets[(starts + self.bucket > start) & (starts < end)]
+
+    def read(self, start, end):
+        """
+        Decoding the packets with a timestamp in [start, end).
+
+        Returns:
+            np.ndarray: PACKET_DTYPE rows (pcap_analysis), in file order.
+        """
+        first, last = self.byte_range(start, end)
+        if first >= last:
+            return np.zeros(0, dtype=PACKET_DTYPE)
+        with PcapReader(self.path) as reader:
+            packets = reader.packets(first, last)
+        return packets[(packets['ts'] >= start) & (packets['ts'] < end)]
+
+    def write(self, start, end, out):
+        """Copying the records with a timestamp in [start, end) into a new pcap file."""
+        packets = self.read(start, end)
+        with PcapReader(self.path) as reader, open(out, 'wb') as f:
+            f.write(reader._map[:GLOBAL_HEADER_LEN])
+            for offset, caplen in zip(packets['offset'], packets['caplen']):
+                f.write(reader._map[offset:offset + RECORD_HEADER_LEN + caplen])
+        return len(packets)
+
+
+def read_range(paths, start, end, bucket=1.0):
+    """
+    Reading the packets with a timestamp in [start, end) from several captures (e.g.
+    the rotated segments of one run), indexing each of them first if needed. Captures
+    whose span does not overlap the range are not opened.
+
+    Returns:
+        np.ndarray: PACKET_DTYPE rows, ordered by timestamp.
+    """
+    parts = [np.zeros(0, dtype=PACKET_DTYPE)]
+    for path in paths:
+        index = PcapIndex.open(path, bucket)
+        span = index.span()
+        if span is not None and span[0] < end and span[1] > start:
+            parts.append(index.read(start, end))
+    packets = np.concatenate(parts)
+    return packets[np.argsort(packets['ts'], kind='stable')]
+
+
+def link_changes(path, link='middle', match=None):
+    """
+    Returning the wall-clock times of a link's logged changes (LinkScheduler JSONL),
+    optionally only those whose parameters equal every key of match.
+    """
+    times = []
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get('link') != link or 'error' in record:
+                continue
+            if match and any(float(record.get(key, 0) or 0) != value for key, value in match.items()):
+                continue
+            times.append(record['wall'])
+    return times
+
+
+def describe(packets, top=5):
+    """Summarizing packets as lines: totals, then the largest flows."""
+    if not len(packets):
+        return ['  no packets']
+    lines = [f"  {len(packets)} packets, {int(packets['length'].sum())} bytes, "
+             f"{packets['ts'][0]:.6f} - {packets['ts'][-1]:.6f}"]
+    flows, inverse = flow_index(packets)
+    volume = np.bincount(inverse, weights=packets['length'], minlength=len(flows))
+    for f in np.argsort(volume)[::-1][:top]:
+        lines.append(f'  {format_flow(flows[f]):<48} {int(np.sum(inverse == f)):>8} pkts {int(volume[f]):>12} bytes')
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Index captures by time and read time ranges from them.')
+    parser.add_argument('pcap', nargs='+', help='Capture files, e.g. pcap/middle_link_capture_*.pcap')
+    parser.add_argument('--bucket', type=float, default=1.0, help='Bucket width in seconds (default: 1.0)')
+    parser.add_argument('--from', dest='start', type=float, default=None,
+                        help='Range start: epoch seconds, or seconds from the start with --relative')
+    parser.add_argument('--to', dest='end', type=float, default=None, help='Range end (default: --from + --seconds)')
+    parser.add_argument('--seconds', type=float, default=5.0, help='Range length (default: 5)')
+    parser.add_argument('--relative', action='store_true', help='--from/--to count from the start of the first capture')
+    parser.add_argument('--link-log', default=None, help='Read the ranges after the changes in this LinkScheduler log')
+    parser.add_argument('--link', default='middle', help='Link of the --link-log changes (default: middle)')
+    parser.add_argument('--match', default=None, help="Only changes with these parameters, e.g. 'bw=30,delay=60'")
+    parser.add_argument('--write', default=None, help='Write the packets of the (first) range to this pcap')
+    args = parser.parse_args()
+
+    paths = sorted(args.pcap)
+    indexes = []
+    for path in paths:
+        index = PcapIndex(path, args.bucket)
+        index.load()
+        state = index.update()
+        indexes.append(index)
+        span = index.span()
+        print(f"{path}: {state}, {index.packets} packets in {len(index.buckets)} buckets"
+              + (f", {span[0]:.3f} - {span[1]:.3f}" if span else ''))
+
+    ranges = []
+    if args.link_log:
+        match = {key: float(value) for key, value in (item.split('=') for item in args.match.split(','))} \
+            if args.match else None
+        ranges = [(t, t + args.seconds) for t in link_changes(args.link_log, args.link, match)]
+    elif args.start is not None:
+        spans = [index.span() for index in indexes if index.span()]
+        base = min(span[0] for span in spans) if args.relative and spans else 0.0
+        start = base + args.start
+        ranges = [(start, base + args.end if args.end is not None else start + args.seconds)]
+
+    for start, end in ranges:
+        print(f'[{start:.6f}, {end:.6f}):')
+        print('\n'.join(describe(read_range(paths, start, end, args.bucket))))
+    if args.write and ranges:
+        start, end = ranges[0]
+        # Copying from the first capture that holds packets of the range
+        for index in indexes:
+            if len(index.read(start, end)):
+                print(f'{index.write(start, end, args.write)} packets written to {args.write}')
+                break
@@ -0,0 +1,256 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Replaying recorded pcaps at scale with tcpreplay.
+
+A ReplayJob is one tcpreplay of one pcap: at its recorded pace, scaled by a speed
+multiplier, at a fixed packet or bit rate, or as fast as possible (topspeed), looped any
+number of times. Its addresses can be rewritten first (tcprewrite --pnat, checksums
+fixed), so that one recorded streaming session can be replayed as many synthetic clients
+each carrying the address of an emulated host. A ReplayEngine prepares the rewritten
+copies in parallel, makes sure the capture is listening before anything is sent, and
+then starts all replays together.
+
+This module only uses the standard library, so it can be copied into the Docker images
+next to capture.py.
+"""
+
+import hashlib
+import ipaddress
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PCAP_HEADER_LEN = 24
+
+# Summary lines printed by tcpreplay when it finishes
+_ACTUAL = re.compile(r'Actual:\s+(\d+) packets \((\d+) bytes\) sent in ([\d.]+) seconds')
+_RATED = re.compile(r'Rated:\s+([\d.]+) Bps,\s+([\d.]+) Mbps,\s+([\d.]+) pps')
+_FAILED = re.compile(r'Failed packets:\s+(\d+)')
+
+
+def clone_maps(address, first, count):
+    """
+    Building the address maps that turn one recorded client into count synthetic clients.
+
+    Args:
+        address (str): Client address in the recording, e.g. '10.0.0.2'.
+        first (str): Address of the first synthetic client, e.g. '10.0.0.20'.
+        count (int): Number of clients.
+    Returns:
+        list: One {recorded: synthetic} dict per client.
+    """
+    start = ipaddress.ip_address(first)
+    return [{address: str(start + i)} for i in range(count)]
+
+
+def rewrite(pcap, ip_map, cache_dir):
+    """
+    Rewriting the addresses of a pcap with tcprewrite, reusing an earlier result for the
+    same input file (path, size, mtime) and map.
+
+    Args:
+        pcap (str): Recorded pcap.
+        ip_map (dict): {old address: new address}, applied to sources and destinations.
+        cache_dir (str): Directory for the rewritten copies.
+    Returns:
+        str: Path of the rewritten pcap.
+    """
+    stat = os.stat(pcap)
+    key = json.dumps([os.path.abspath(pcap), stat.st_size, stat.st_mtime, sorted(ip_map.items())])
+    out = os.path.join(cache_dir, f'{os.path.splitext(os.path.basename(pcap))[0]}-'
+                                  f'{hashlib.sha256(key.encode()).hexdigest()[:12]}.pcap')
+    if os.path.exists(out):
+        return out
+    os.makedirs(cache_dir, exist_ok=True)
+    pnat = ','.join(f'{old}/32:{new}/32' for old, new in ip_map.items())
+    tmp = out + '.tmp'
+    subprocess.run(['tcprewrite', f'--pnat={pnat}', '--fixcsum', f'--infile={pcap}', f'--outfile={tmp}'],
+                   check=True)
+    os.replace(tmp, out)
+    return out
+
+
+def join_segments(paths, cache_dir):
+    """
+    Concatenating the segments of one rotated capture into a single pcap, so that the
+    recording is replayed in order as one session, reusing an earlier result for the
+    same segments (paths, sizes, mtimes).
+
+    Args:
+        paths (list): Segment files, oldest first (as capture.segment_files() returns them).
+        cache_dir (str): Directory for the joined copy.
+    Returns:
+        str: Path of the joined pcap.
+    """
+    stats = [(os.path.abspath(path), os.stat(path).st_size, os.stat(path).st_mtime) for path in paths]
+    key = hashlib.sha256(json.dumps(stats).encode()).hexdigest()[:12]
+    out = os.path.join(cache_dir, f'{os.path.splitext(os.path.basename(paths[0]))[0]}-joined-{key}.pcap')
+    if os.path.exists(out):
+        return out
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = out + '.tmp'
+    with open(tmp, 'wb') as joined:
+        for i, path in enumerate(paths):
+            with open(path, 'rb') as segment:
+                # Every segment of one capture has the same global header; only the first is kept
+                if i:
+                    segment.seek(PCAP_HEADER_LEN)
+                shutil.copyfileobj(segment, joined)
+    os.replace(tmp, out)
+    return out
+
+
+def parse_stats(output):
+    """Parsing the summary tcpreplay prints when it finishes."""
+    stats = {}
+    match = _ACTUAL.search(output)
+    if match:
+        stats.update(packets=int(match.group(1)), bytes=int(match.group(2)), seconds=float(match.group(3)))
+    match = _RATED.search(output)
+    if match:
+        stats.update(mbps=float(match.group(2)), pps=float(match.group(3)))
+    match = _FAILED.search(output)
+    if match:
+        stats['failed'] = int(match.group(1))
+    return stats
+
+
+class ReplayJob:
+    """
+    One tcpreplay of one pcap.
+
+    Args:
+        pcap (str): Recorded pcap.
+        interface (str): Interface the packets are sent on.
+        multiplier (float): Speed relative to the recording (2.0 = twice as fast).
+        topspeed (bool): Sending as fast as possible.
+        pps (float): Fixed packets per second.
+        mbps (float): Fixed rate in Mbit/s.
+        loop (int): Number of times the pcap is sent (0 = until stopped).
+        ip_map (dict): {old address: new address} applied before replaying.
+        label (str): Name used in logs and results.
+    """
+
+    def __init__(self, pcap, interface, multiplier=None, topspeed=False, pps=None, mbps=None, loop=1,
+                 ip_map=None, label=None):
+        if sum(bool(mode) for mode in (multiplier, topspeed, pps, mbps)) > 1:
+            raise ValueError('Only one of multiplier, topspeed, pps and mbps can be set')
+        self.pcap = pcap
+        self.interface = interface
+        self.multiplier = multiplier
+        self.topspeed = topspeed
+        self.pps = pps
+        self.mbps = mbps
+        self.loop = loop
+        self.ip_map = ip_map or {}
+        self.label = label or os.path.basename(pcap)
+        self.source = pcap
+        self.process = None
+        self.started = None
+        self.ended = None
+        self.output = ''
+
+    def command(self):
+        cmd = ['tcpreplay', '-i', self.interface]
+        if self.topspeed:
+            cmd.append('--topspeed')
+        elif self.pps:
+            cmd.append(f'--pps={self.pps:g}')
+        elif self.mbps:
+            cmd.append(f'--mbps={self.mbps:g}')
+        elif self.multiplier:
+            cmd.append(f'--multiplier={self.multiplier:g}')
+        if self.loop != 1:
+            # Loops are sent from memory instead of re-reading the file every time
+            cmd += [f'--loop={self.loop}', '--preload-pcap']
+        return cmd + [self.source]
+
+    def result(self):
+        row = {'label': self.label, 'pcap': self.pcap, 'sent_from': self.source, 'ip_map': self.ip_map,
+               'started': self.started, 'ended': self.ended,
+               'returncode': self.process.returncode if self.process else None}
+        row.update(parse_stats(self.output))
+        return row
+
+
+class ReplayEngine:
+    """
+    Preparing and running replay jobs concurrently.
+
+    Args:
+        capture: Optional CaptureManager; it is started (if needed) and must be
+            listening before the first replay begins.
+        cache_dir (str): Directory for rewritten pcaps.
+        workers (int): Rewrites run in parallel.
+    """
+
+    def __init__(self, capture=None, cache_dir='pcap/replay_cache', workers=4):
+        self.capture = capture
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.jobs = []
+        self._readers = []
+
+    def add(self, job):
+        self.jobs.append(job)
+        return job
+
+    def prepare(self):
+        """Rewriting the pcaps of every job that has an address map."""
+        def prepare_job(job):
+            if job.ip_map:
+                job.source = rewrite(job.pcap, job.ip_map, self.cache_dir)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(prepare_job, self.jobs))
+
+    def start(self):
+        """Starting all replays once the capture is listening."""
+        if self.capture is not None:
+            if self.capture.proc is None:
+                self.capture.start()
+            # ready is also set when tcpdump exits, so it has to be running as well
+            if not self.capture.ready.wait(10) or self.capture.proc.poll() is not None:
+                raise RuntimeError('The capture is not listening, not replaying')
+        for job in self.jobs:
+            job.process = subprocess.Popen(job.command(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                           universal_newlines=True)
+            job.started = time.time()
+        # One reader per replay collects its summary and end time as soon as it exits
+        self._readers = [threading.Thread(target=self._finish, args=(job,), daemon=True) for job in self.jobs]
+        for reader in self._readers:
+            reader.start()
+        print(f'Started {len(self.jobs)} replays')
+
+    @staticmethod
+    def _finish(job):
+        job.output, _ = job.process.communicate()
+        job.ended = time.time()
+
+    def wait(self):
+        """Waiting for every replay and returning one result dict per job."""
+        for reader in self._readers:
+            # Joining with a timeout keeps the main thread interruptible
+            while reader.is_alive():
+                reader.join(0.5)
+        return [job.result() for job in self.jobs]
+
+    def stop(self):
+        """Stopping replays that are still running (e.g. infinite loops)."""
+        for job in self.jobs:
+            if job.process is not None and job.process.poll() is None:
+                job.process.terminate()
+        return self.wait()
+
+    def run(self):
+        """Preparing, starting and waiting for all replays."""
+        self.prepare()
+        self.start()
+        return self.wait()
@@ -0,0 +1,290 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Run-scoped registry of everything an experiment creates, with a targeted teardown.
+
+clean.sh wipes the whole machine ('mn -c', stopping every Docker container), which is
+slow and takes down unrelated containers. A RunRegistry instead records the resources
+of one run as they are created, in a JSON file under /tmp/topology_runs/:
+
+    processes    pids of captures and other helpers started in the root namespace
+    namespaces   network namespaces of the Mininet hosts; every process still running
+                 in one of them (iperf, tcpdump, web servers, ...) is killed
+    nodes        shell pids of the Mininet nodes (hosts, switches' shells, controller),
+                 together with everything started from them (same session)
+    containers   Docker containers (Docker hosts and VNF containers)
+    switches     OVS bridges
+    links        root-namespace ends of the veth pairs (qdiscs go away with them)
+
+teardown() removes exactly these, running the independent steps in parallel, and can
+be repeated: what is already gone is skipped. Because the file is written on every
+registration, a run that crashed can still be cleaned up afterwards from another
+process:
+
+    sudo python3 run_registry.py --stale      # every run whose owner process is gone
+    sudo python3 run_registry.py <run id>     # one run
+"""
+
+import argparse
+import glob
+import json
+import os
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REGISTRY_DIR = '/tmp/topology_runs'
+KINDS = ('processes', 'namespaces', 'nodes', 'containers', 'switches', 'links')
+
+
+def _start_time(pid):
+    """Returning a process's start time (clock ticks since boot), or None if it does not exist."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return int(f.read().rsplit(')', 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _running(pid, started):
+    """Whether pid is still the registered process and has not exited (zombies count as exited)."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return False
+    return fields[0] != 'Z' and (started is None or int(fields[19]) == started)
+
+
+def _session(pid):
+    """Returning the session id of a process, or None."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return int(f.read().rsplit(')', 1)[1].split()[3])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _netns(pid):
+    """Returning the inode of a process's network namespace, or None."""
+    try:
+        return os.stat(f'/proc/{pid}/ns/net').st_ino
+    except OSError:
+        return None
+
+
+def _kill(pid, started, timeout=2.0):
+    """Terminating a process (if it is still the one that was registered), killing it after timeout."""
+    if started is not None and _start_time(pid) != started:
+        return False
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return False
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not _running(pid, started):
+            return True
+        time.sleep(0.05)
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    return True
+
+
+def _quiet(cmd):
+    return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+
+
+class RunRegistry:
+    """
+    Recording the resources of one run and removing exactly those.
+
+    Args:
+        run_id (str): Name of the run (default: 'run-<pid>').
+        directory (str): Where the registry files are kept.
+    """
+
+    def __init__(self, run_id=None, directory=REGISTRY_DIR):
+        self.run_id = run_id or f'run-{os.getpid()}'
+        self.path = os.path.join(directory, f'{self.run_id}.json')
+        self.owner = [os.getpid(), _start_time(os.getpid())]
+        self.resources = {kind: {} for kind in KINDS}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def load(cls, path):
+        """Loading a registry written by another (possibly crashed) process."""
+        with open(path) as f:
+            data = json.load(f)
+        registry = cls(data['run_id'], os.path.dirname(path))
+        registry.owner = data['owner']
+        for kind in KINDS:
+            registry.resources[kind].update(data.get(kind, {}))
+        return registry
+
+    def alive(self):
+        """Whether the process that created the run is still running."""
+        pid, started = self.owner
+        return _start_time(pid) == started
+
+    def _save(self):
+        data = dict(self.resources, run_id=self.run_id, owner=self.owner)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def register(self, kind, name, value=None):
+        """Recording one resource; value is kept with it (e.g. a start time)."""
+        with self._lock:
+            self.resources[kind][str(name)] = value
+            self._save()
+
+    def register_process(self, proc):
+        """Recording a subprocess (Popen) or pid started by this run."""
+        pid = getattr(proc, 'pid', proc)
+        self.register('processes', pid, _start_time(pid))
+
+    def register_topology(self, topo):
+        """
+        Recording the nodes, namespaces, Docker containers, switches and veths of a
+        started CompiledTopology. Can be called again after containers are added.
+        """
+        net = topo.net
+        root = _netns(1)
+        with self._lock:
+            for node in list(net.hosts) + list(net.switches) + list(net.controllers):
+                if getattr(node, 'pid', None):
+                    started = _start_time(node.pid)
+                    self.resources['nodes'][str(node.pid)] = started
+                    netns = _netns(node.pid)
+                    if netns is not None and netns != root:
+                        # The node's shell identifies the namespace later on (see _member_pids)
+                        self.resources['namespaces'][str(netns)] = [node.name, node.pid, started]
+                if hasattr(node, 'dcinfo'):
+                    # Containernet names the container of a Docker host mn.<name>
+                    self.resources['containers'][f'mn.{node.name}'] = None
+            for switch in net.switches:
+                self.resources['switches'][switch.name] = None
+            for link in net.links:
+                for intf in (link.intf1, link.intf2):
+                    if not getattr(intf.node, 'inNamespace', True):
+                        self.resources['links'][intf.name] = None
+                        break
+            for name in topo.containers:
+                self.resources['containers'][topo.container_name(name)] = None
+            self._save()
+
+    def _member_pids(self):
+        """
+        Returning (pid, start time) of every process inside one of the run's namespaces
+        or in the session of one of its node shells (Mininet starts them with setsid).
+        """
+        # After a crash the kernel can give a namespace's inode to an unrelated one, so a
+        # namespace only counts while the shell it was recorded with is still in it
+        namespaces = set()
+        for ns, entry in self.resources['namespaces'].items():
+            if isinstance(entry, list):
+                _, pid, started = entry
+                if _start_time(pid) == started and _netns(pid) == int(ns):
+                    namespaces.add(int(ns))
+        sessions = {int(pid) for pid, started in self.resources['nodes'].items()
+                    if _start_time(pid) == started}
+        pids = []
+        for entry in os.listdir('/proc'):
+            if entry.isdigit() and (_netns(entry) in namespaces or _session(entry) in sessions):
+                pids.append((int(entry), _start_time(entry)))
+        return pids
+
+    def _forget(self, kind, names):
+        with self._lock:
+            for name in names:
+                self.resources[kind].pop(str(name), None)
+            self._save()
+
+    def teardown(self, workers=8):
+        """
+        Removing every registered resource. Safe to call repeatedly and after a crash.
+
+        Returns:
+            dict: Seconds spent per step.
+        """
+        timings = {}
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Helpers first, so that captures finish their files
+            processes = [(int(pid), value) for pid, value in self.resources['processes'].items()]
+            list(pool.map(lambda item: _kill(*item), processes))
+            self._forget('processes', [pid for pid, _ in processes])
+            timings['processes'] = time.perf_counter() - started
+
+            def containers():
+                names = list(self.resources['containers'])
+                if names:
+                    _quiet(['docker', 'rm', '-f'] + names)
+                self._forget('containers', names)
+
+            def namespaces():
+                pids = self._member_pids() + [(int(pid), value) for pid, value in self.resources['nodes'].items()]
+                list(pool.map(lambda item: _kill(*item, timeout=1.0), pids))
+                self._forget('nodes', list(self.resources['nodes']))
+                self._forget('namespaces', list(self.resources['namespaces']))
+
+            def switches():
+                names = list(self.resources['switches'])
+                if names:
+                    cmd = ['ovs-vsctl']
+                    for name in names:
+                        cmd += ['--', '--if-exists', 'del-br', name]
+                    _quiet(cmd)
+                self._forget('switches', names)
+
+            def links():
+                names = list(self.resources['links'])
+                list(pool.map(lambda name: _quiet(['ip', 'link', 'delete', name]), names))
+                self._forget('links', names)
+
+            steps = {'containers': containers, 'namespaces': namespaces, 'switches': switches}
+            futures = {name: pool.submit(step) for name, step in steps.items()}
+            for name, future in futures.items():
+                future.result()
+                timings[name] = time.perf_counter() - started
+            # Veths whose other end lived in a removed namespace are already gone
+            links()
+            timings['links'] = time.perf_counter() - started
+
+        if not any(self.resources.values()):
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        return timings
+
+
+def registries(directory=REGISTRY_DIR):
+    """Loading every registry file in a directory."""
+    return [RunRegistry.load(path) for path in sorted(glob.glob(os.path.join(directory, '*.json')))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tear down the resources recorded for experiment runs.')
+    parser.add_argument('run_id', nargs='*', help='Runs to tear down')
+    parser.add_argument('--stale', action='store_true', help='Tear down every run whose process has exited')
+    parser.add_argument('--list', action='store_true', help='Only list the recorded runs')
+    parser.add_argument('--directory', default=REGISTRY_DIR, help=f'Registry directory (default: {REGISTRY_DIR})')
+    args = parser.parse_args()
+
+    for registry in registries(args.directory):
+        counts = ', '.join(f'{len(registry.resources[kind])} {kind}' for kind in KINDS)
+        state = 'running' if registry.alive() else 'stale'
+        if args.list:
+            print(f'{registry.run_id} ({state}): {counts}')
+        elif registry.run_id in args.run_id or (args.stale and state == 'stale'):
+            timings = registry.teardown()
+            print(f'{registry.run_id}: removed {counts} in {max(timings.values(), default=0):.2f} s')
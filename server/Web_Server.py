@@ -2,13 +2,23 @@
 # -*- coding: utf-8 -*-
 
 # Importing necessary libraries
+import argparse
 import http.server
+import random
+import re
+import signal
 import socketserver
+import threading
+import time
 
 # Setting the port number and maximum number of requests to serve
 PORT = 8000
 MAX_REQUESTS = 10
 
+# Default object-size mix of the concurrent mode (size:weight), roughly the HTML, CSS/JS
+# and image objects making up a web page
+WEB_PAGE_MIX = '2k:30,15k:30,60k:25,300k:10,1.5M:5'
+
 """
 The global variable request_count keeps track of the number of requests served by the server.
 It is initialized to 0 and increments each time a request is handled.
@@ -44,16 +54,209 @@ class LimitedRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.wfile.write(b"<body><h1>Hello, this is a simple web server!</h1></body></html>")
         print("Hello, this is a simple web server!")
 
-# Creating the HTTP server and bind it to the specified port
-httpd = LimitedRequestHTTPServer(("", PORT), LimitedRequestHandler)
+def serve_limited(port=PORT):
+    """
+    Serving the sample page one request at a time until MAX_REQUESTS have been handled.
+    Args:
+        port (int): Port to listen on.
+    """
+    # Creating the HTTP server and bind it to the specified port
+    httpd = LimitedRequestHTTPServer(("", port), LimitedRequestHandler)
+
+    # Printing a message indicating that the server is running
+    print(f"Serving HTTP on 0.0.0.0 port {port} ...")
+
+    # Handling requests until the maximum number of requests has been reached
+    while request_count < MAX_REQUESTS:
+        httpd.handle_request()
+
+    # Shutting down the server and printing a message indicating that it has been shut down
+    httpd.server_close()
+    print("Server shut down.")
+
+def parse_size(text):
+    """
+    Parsing an object size such as '512', '15k' or '1.5M' (powers of 1024).
+    Returns:
+        int: Size in bytes.
+    """
+    match = re.match(r'^\s*([\d.]+)\s*([kKmMgG]?)\s*$', text)
+    if not match:
+        raise ValueError(f'Invalid object size: {text}')
+    scale = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}[match.group(2).lower()]
+    return int(float(match.group(1)) * scale)
+
+class SizeDistribution:
+    """
+    Drawing object sizes from a configurable distribution.
+    Args:
+        spec (str): Either a weighted mix 'size:weight,...' (e.g. '2k:30,60k:25,1.5M:5') or
+            'lognormal:<median>,<sigma>,<max>' (e.g. 'lognormal:20k,1.5,4M').
+        seed (int): Seed of the size draws.
+    """
+    def __init__(self, spec, seed=None):
+        self.random = random.Random(seed)
+        if spec.startswith('lognormal:'):
+            median, sigma, maximum = spec[len('lognormal:'):].split(',')
+            self.median = parse_size(median)
+            self.sigma = float(sigma)
+            self.max_size = parse_size(maximum)
+            self.sizes = None
+        else:
+            entries = [entry.split(':') for entry in spec.split(',')]
+            self.sizes = [parse_size(size) for size, _ in entries]
+            self.weights = [float(weight) for _, weight in entries]
+            self.max_size = max(self.sizes)
+
+    def sample(self):
+        """Drawing one object size in bytes."""
+        if self.sizes is not None:
+            return self.random.choices(self.sizes, self.weights)[0]
+        size = int(self.random.lognormvariate(0, self.sigma) * self.median)
+        return max(1, min(size, self.max_size))
+
+class ServerStats:
+    """
+    Counting requests, bytes and open connections, and reporting them once per second.
+    Args:
+        path (str): Optional CSV file receiving one line per second.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes = 0
+        self.connections = 0
+        self.stopped = threading.Event()
+
+    def add(self, size):
+        with self.lock:
+            self.requests += 1
+            self.bytes += size
+
+    def connection(self, delta):
+        with self.lock:
+            self.connections += delta
+
+    def report(self, interval=1.0):
+        """Printing (and logging) the request rate and throughput until stop() is called."""
+        out = open(self.path, 'w') if self.path else None
+        if out:
+            out.write('time,requests_per_s,bytes_per_s,mbit_per_s,connections\n')
+        last_requests, last_bytes = 0, 0
+        last = deadline = time.monotonic()
+        while not self.stopped.is_set():
+            deadline += interval
+            self.stopped.wait(max(0.0, deadline - time.monotonic()))
+            now = time.monotonic()
+            with self.lock:
+                requests, sent, connections = self.requests, self.bytes, self.connections
+            # The last interval is cut short by stop()
+            elapsed = max(now - last, 1e-6)
+            rate = (requests - last_requests) / elapsed
+            throughput = (sent - last_bytes) / elapsed
+            last_requests, last_bytes, last = requests, sent, now
+            print(f"{rate:.0f} req/s, {throughput * 8 / 1e6:.2f} Mbit/s, {connections} connections")
+            if out:
+                out.write(f'{time.time():.3f},{rate:.1f},{throughput:.0f},{throughput * 8 / 1e6:.3f},{connections}\n')
+                out.flush()
+        if out:
+            out.close()
+
+    def stop(self):
+        self.stopped.set()
+
+"""
+ObjectRequestHandler serves synthetic objects over persistent HTTP/1.1 connections.
+GET /obj/<size> returns an object of the given size (e.g. /obj/64k), any other path an
+object whose size is drawn from the server's size distribution. The bodies are slices of
+one preallocated buffer, so serving an object does not allocate or copy.
+"""
+class ObjectRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.stats.connection(1)
+
+    def finish(self):
+        super().finish()
+        self.server.stats.connection(-1)
+
+    def do_GET(self):
+        if self.path.startswith('/obj/'):
+            try:
+                size = min(parse_size(self.path[len('/obj/'):]), len(self.server.payload))
+            except ValueError:
+                self.send_error(400, 'Invalid object size')
+                return
+        else:
+            size = self.server.sizes.sample()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        self.wfile.write(self.server.payload[:size])
+        self.server.stats.add(size)
+
+    def log_message(self, format, *args):
+        # Logging every request would dominate the server's CPU time
+        pass
+
+# Defining a threaded server with a deep accept backlog for many concurrent clients
+class ConcurrentHTTPServer(http.server.ThreadingHTTPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 1024
+
+def serve_concurrent(port=PORT, sizes=WEB_PAGE_MIX, seed=None, stats_path=None, duration=None):
+    """
+    Serving synthetic objects to many concurrent keep-alive connections.
+    Args:
+        port (int): Port to listen on.
+        sizes (str): Object-size distribution (see SizeDistribution).
+        seed (int): Seed of the size draws.
+        stats_path (str): Optional CSV file receiving the per-second statistics.
+        duration (float): Seconds to serve for (default: until interrupted).
+    """
+    httpd = ConcurrentHTTPServer(("", port), ObjectRequestHandler)
+    httpd.sizes = SizeDistribution(sizes, seed)
+    # Allocating the largest object once; every response is a view into it
+    httpd.payload = memoryview(bytes(range(256)) * (httpd.sizes.max_size // 256 + 1))
+    httpd.stats = ServerStats(stats_path)
+    reporter = threading.Thread(target=httpd.stats.report, daemon=True)
+    reporter.start()
+    if duration:
+        threading.Timer(duration, httpd.shutdown).start()
+    # SIGTERM (e.g. from HostExecutor.stop()) shuts down cleanly, so the last statistics are written;
+    # shutdown() waits for serve_forever() to return and has to be called from another thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=httpd.shutdown).start())
 
-# Printing a message indicating that the server is running
-print(f"Serving HTTP on 0.0.0.0 port {PORT} ...")
+    print(f"Serving synthetic objects ({sizes}) on 0.0.0.0 port {port} ...")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        httpd.stats.stop()
+        reporter.join()
+        print(f"Server shut down after {httpd.stats.requests} requests, {httpd.stats.bytes / 1e6:.1f} MB.")
 
-# Handling requests until the maximum number of requests has been reached
-while request_count < MAX_REQUESTS:
-    httpd.handle_request()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sample web server')
+    parser.add_argument('--concurrent', action='store_true',
+                        help='Serve synthetic objects to many keep-alive connections instead of 10 sample pages')
+    parser.add_argument('--port', type=int, default=PORT, help=f'Port to listen on (default: {PORT})')
+    parser.add_argument('--sizes', default=WEB_PAGE_MIX,
+                        help=f"Object sizes: 'size:weight,...' or 'lognormal:median,sigma,max' (default: {WEB_PAGE_MIX})")
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the object-size draws')
+    parser.add_argument('--stats', default=None, help='CSV file receiving per-second request and byte rates')
+    parser.add_argument('--duration', type=float, default=None, help='Seconds to serve for')
+    args = parser.parse_args()
 
-# Shutting down the server and printing a message indicating that it has been shut down
-httpd.server_close()
-print("Server shut down.")
+    if args.concurrent:
+        serve_concurrent(args.port, args.sizes, args.seed, args.stats, args.duration)
+    else:
+        serve_limited(args.port)
@@ -13,9 +13,10 @@ apt-get install -y --no-install-recommends \
 # Install Python packages
 pip install requests
 
-# Installing the packages required for streaming videos and dumping traffic.
+# Installing the packages required for streaming videos, dumping and replaying traffic.
 apt-get install -y \
     ffmpeg \
     tcpdump \
+    tcpreplay \
     nano
 
@@ -1,53 +1,105 @@
 #!/bin/env python3
 # -*- coding: utf-8 -*-
 
-import subprocess
-import os
+import argparse
+import json
+import signal
 import time
-import signal 
 
-def start_capture(output_file):
+from capture import CaptureManager, segment_files
+from pcap_replay import ReplayEngine, ReplayJob, clone_maps, join_segments
+
+def start_capture(interface, prefix, profile="full", sample=1):
     """
     Start packet capturing on the specified interface using tcpdump.
-    Captures all packets and writes them to a PCAP file.
+    Captures packets into rotated pcap/<prefix>_*.pcap segments, as kept by the capture
+    profile. The capture is listening when this returns, so no replayed packet is missed.
     """
-    proc = subprocess.Popen(["tcpdump", "-U", "-s0", "-i", "eth0", "-w", output_file])
-    return proc.pid
+    return CaptureManager(interface, "pcap", prefix, rotate_seconds=60, profile=profile, sample=sample).start()
 
-def stop_capture(pid):
+def stop_capture(capture):
     """
     Stop the tcpdump process that was started by start_capture.
     Sends a SIGINT signal to terminate it.
     """
-    try:
-        os.kill(pid, signal.SIGINT)
-        print("Capture stopped successfully.")
-    except OSError as e:
-        print(f"Error stopping capture: {e}")
+    capture.stop()
+    print("Capture stopped successfully.")
 
-def replay_pcap(pcap_file):
+def build_replays(args):
     """
-    Replay the specified PCAP file on the server's eth0 interface using tcpreplay.
+    Build one replay job per pcap and per synthetic client.
+    With --clients N, every pcap is replayed N times, the recorded client address
+    rewritten to N consecutive addresses starting at --first-ip.
     """
-    tcpreplay_command = ["tcpreplay", "-i", "eth0", pcap_file]
-    subprocess.run(tcpreplay_command)
-    print(f"Replayed PCAP file: {pcap_file}")
+    maps = clone_maps(args.client_ip, args.first_ip, args.clients) if args.clients else [{}]
+    for pair in args.map or []:
+        old, new = pair.split("=")
+        maps = [dict(m, **{old: new}) for m in maps]
+    jobs = []
+    for pcap in args.pcap:
+        for ip_map in maps:
+            label = f"{pcap}->{ip_map[args.client_ip]}" if args.client_ip in ip_map else pcap
+            jobs.append(ReplayJob(pcap, args.interface, multiplier=args.multiplier, topspeed=args.topspeed,
+                                  pps=args.pps, mbps=args.mbps, loop=args.loop, ip_map=ip_map, label=label))
+    return jobs
 
 def main():
     """
     Main function to handle PCAP replay and packet capture.
+    The capture is started first; all replays start together once it is listening, and
+    the capture is stopped after the last replay has finished.
     """
-    replay_pcap_file = "pcap/client.pcap"
-    output_pcap_file = "pcap/new_capture.pcap"
-    capture_traffic = True
+    parser = argparse.ArgumentParser(description="Replay recorded pcaps on the server interface.")
+    parser.add_argument("--pcap", nargs="+", default=None,
+                        help="Recorded pcaps to replay (default: the pcap/client_*.pcap segments, joined)")
+    parser.add_argument("--interface", default="eth0", help="Interface to replay on and capture from")
+    parser.add_argument("--output", default="new_capture", help="Prefix of the capture segments in pcap/")
+    parser.add_argument("--no-capture", action="store_true", help="Replay without capturing")
+    parser.add_argument("--capture-profile", choices=["full", "headers", "sampled", "summary"], default="full",
+                        help="What the capture keeps of each packet (default: full)")
+    parser.add_argument("--sample", type=int, default=1, help="Keep one packet in N with --capture-profile sampled")
+    speed = parser.add_mutually_exclusive_group()
+    speed.add_argument("--multiplier", type=float, default=None, help="Speed relative to the recording")
+    speed.add_argument("--topspeed", action="store_true", help="Replay as fast as possible")
+    speed.add_argument("--pps", type=float, default=None, help="Fixed packets per second")
+    speed.add_argument("--mbps", type=float, default=None, help="Fixed rate in Mbit/s")
+    parser.add_argument("--loop", type=int, default=1, help="Times each pcap is replayed (0: until interrupted)")
+    parser.add_argument("--clients", type=int, default=0, help="Synthetic clients cloned from the recorded client")
+    parser.add_argument("--client-ip", default="10.0.0.2", help="Client address in the recording")
+    parser.add_argument("--first-ip", default="10.0.0.20", help="Address of the first synthetic client")
+    parser.add_argument("--map", action="append", help="Extra address rewrite OLD=NEW (repeatable)")
+    parser.add_argument("--results", default="pcap/replay_results.json", help="Per-replay statistics")
+    args = parser.parse_args()
+    if args.pcap is None:
+        segments = segment_files("pcap", "client")
+        if not segments:
+            parser.error("No pcap/client_*.pcap segments to replay; pass --pcap")
+        args.pcap = [join_segments(segments, "pcap/replay_cache")]
+
+    capture = None if args.no_capture else start_capture(args.interface, args.output, args.capture_profile,
+                                                         args.sample)
+    engine = ReplayEngine(capture)
+    for job in build_replays(args):
+        engine.add(job)
+    engine.prepare()
+    engine.start()
+    # Looping replays run until interrupted (SIGINT or SIGTERM)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        results = engine.wait()
+    except KeyboardInterrupt:
+        results = engine.stop()
 
-    # Replay the PCAP file
-    replay_pcap(replay_pcap_file)
+    for result in results:
+        print(f"Replayed {result['label']}: {result.get('packets', 0)} packets, "
+              f"{result.get('mbps', 0):.2f} Mbit/s, {result.get('failed', 0)} failed")
+    with open(args.results, "w") as f:
+        json.dump(results, f, indent=1)
 
-    if capture_traffic:
-        pid = start_capture(output_pcap_file)  # Start packet capturing
-        time.sleep(120)  # Wait for 2 minutes to capture traffic during replay
-        stop_capture(pid)  # Stop packet capturing
+    if capture is not None:
+        # Letting the last packets reach the capture before stopping it
+        time.sleep(1)
+        stop_capture(capture)
 
 if __name__ == "__main__":
     main()
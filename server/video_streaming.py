@@ -7,36 +7,34 @@ import os
 import time
 import signal 
 
-def start_capture():
+from capture import CaptureManager
+
+def start_capture(profile="full"):
     """
     Starting packet capturing on server-eth0 interface using tcpdump. Captures all packets
-    on source port 1935 and writing them to a pcap file. This is used to
-    capture network traffic associated with the video streaming.
+    on source port 1935 and writing them to rotated pcap segments (pcap/server_*.pcap,
+    indexed in pcap/server.index.json). This is used to capture network traffic
+    associated with the video streaming. The default 'full' profile keeps whole
+    packets; 'headers' keeps every packet but not the video payload.
     """
-    proc = subprocess.Popen(["tcpdump", "-U", "-s0", "-i", "server-eth0", "src", "port", "1935", "-w", "pcap/server.pcap"])
-    #proc = subprocess.Popen(["tcpdump", "-U", "-s0", "-i", "h6-eth0", "src", "port", "1935", "-w", "pcap/server.pcap", "-A"])
-
-    return proc.pid
+    return CaptureManager("server-eth0", "pcap", "server", ["src", "port", "1935"], rotate_seconds=60,
+                          profile=profile).start()
 
-def start_capture_h6():
+def start_capture_h6(profile="full"):
     """
     Start packet capturing on h6-eth0 interface using tcpdump.
-    Appends captured packets to the server.pcap file.
+    Writes the captured packets to rotated pcap/server_h6_*.pcap segments.
     """
-    proc = subprocess.Popen(["tcpdump", "-U", "-s0", "-i", "h6-eth0", "src", "port", "1935", "-w", "pcap/server.pcap", "-A"])
-    return proc.pid
+    return CaptureManager("h6-eth0", "pcap", "server_h6", ["src", "port", "1935"], rotate_seconds=60,
+                          profile=profile).start()
 
-def stop_capture(pid_list):
+def stop_capture(captures):
     """
-    Stoping the tcpdump process that was started by start_capture. Searches through
-    the process list, identifies the tcpdump process, and sends a SIGINT signal to
-    terminate it.
+    Stoping the captures that were started by start_capture. Each tcpdump process
+    receives a SIGINT signal and the segment index is finalized.
     """
-    for pid in pid_list:
-        try:
-            os.kill(pid, signal.SIGINT)
-        except OSError as e:
-            print(f"Error stopping capture: {e}")    
+    for capture in captures:
+        capture.stop()
 
 def main():
     """
@@ -45,14 +43,13 @@ def main():
     input_file = "video/Deadpool.mp4"
     loops_number = -1  # Stream the video once, without looping
     capture_traffic = True
+    capture_profile = "full"  # "headers" keeps every packet but not the video payload
 
-    pids = []
+    captures = []
 
     if capture_traffic:
-        pids.append(start_capture())
-        #pids.append(start_capture_h6())
-        #pid = start_capture()  # Begining packet capturing
-        time.sleep(2)   # Short delay to ensure capturing starts before streaming
+        captures.append(start_capture(capture_profile))  # Returns once tcpdump is listening
+        #captures.append(start_capture_h6(capture_profile))
 
     ffmpeg_command = [
         "ffmpeg", "-loglevel", "info", "-stats", "-re", "-stream_loop", str(loops_number), "-i", input_file,
@@ -62,7 +59,7 @@ def main():
     subprocess.run(ffmpeg_command)  # Running ffmpeg command to stream video
 
     if capture_traffic:
-        stop_capture(pids)  # Stopping packet capturing after streaming is done
+        stop_capture(captures)  # Stopping packet capturing after streaming is done
 
 if __name__ == "__main__":
     main()
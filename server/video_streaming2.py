@@ -1,29 +1,226 @@
 #!/bin/env python3
 # -*- coding: utf-8 -*-
 
+"""
+Publishing the sample video to the local RTMP server as one or many streams.
+
+By default one stream is published to rtmp://localhost:1935/live/video.flv, as before.
+With --streams N the video is published N times as independent streams (video_1.flv ...
+video_N.flv), and with --ladder it is transcoded into an ABR-style rendition ladder
+(e.g. video_720p.flv, video_480p.flv ...). Every stream is one ffmpeg process; the
+processes are supervised as a pool and restarted when one dies before the end.
+
+The nginx configuration is generated to match the number of streams and viewers:
+    python3 video_streaming2.py --write-nginx-conf config/nginx.conf --viewers 512
+"""
+
+import argparse
+import os
+import signal
 import subprocess
+import time
+
+RTMP_URL = "rtmp://localhost:1935/live"
+NGINX_CONF = "/etc/nginx/nginx.conf"
+
+# name:height:video bitrate (kbit/s)
+DEFAULT_LADDER = "720p:720:2500,480p:480:1000,360p:360:600,240p:240:300"
+
+NGINX_TEMPLATE = """worker_processes auto;
+worker_rlimit_nofile {nofile};
+rtmp_auto_push on;
+events {{
+    worker_connections {connections};
+}}
+rtmp {{
+    server {{
+        listen 1935;
+        listen [::]:1935 ipv6only=on;
+        chunk_size 4096;
+        max_streams {max_streams};
+
+        # {streams} published stream(s), up to {viewers} viewers
+        application live {{
+            live on;
+            record off;
+            # Viewers joining a running stream start at a keyframe
+            wait_key on;
+            wait_video on;
+            drop_idle_publisher 10s;
+        }}
+    }}
+}}
+"""
+
+
+def parse_ladder(spec):
+    """
+    Parsing a rendition ladder 'name:height:kbps,...'.
+    Returns:
+        list: (name, height, kbit/s) tuples, highest rendition first.
+    """
+    renditions = []
+    for item in spec.split(","):
+        name, height, kbps = item.strip().split(":")
+        renditions.append((name, int(height), int(kbps)))
+    return sorted(renditions, key=lambda rendition: -rendition[2])
+
+
+def stream_names(streams=1, ladder=None):
+    """Returning the names of the published streams (what the viewers pull)."""
+    if ladder:
+        return [f"video_{name}.flv" for name, _, _ in parse_ladder(ladder)]
+    if streams == 1:
+        return ["video.flv"]
+    return [f"video_{i}.flv" for i in range(1, streams + 1)]
+
+
+def nginx_conf(streams, viewers):
+    """
+    Rendering an nginx.conf sized for a number of streams and concurrent viewers.
+    Args:
+        streams (int): Published streams.
+        viewers (int): Concurrent viewers over all streams.
+    """
+    # One connection per viewer and publisher, plus headroom for reconnects
+    connections = max(1024, 2 * (viewers + streams))
+    return NGINX_TEMPLATE.format(connections=connections, nofile=2 * connections,
+                                 max_streams=max(32, 2 * streams), streams=streams, viewers=viewers)
+
 
-def main():
+def configure_nginx(streams, viewers, path=NGINX_CONF):
+    """Rewriting the running nginx's configuration if it does not match, and reloading it."""
+    conf = nginx_conf(streams, viewers)
+    try:
+        with open(path) as f:
+            if f.read() == conf:
+                return False
+    except OSError:
+        pass
+    with open(path, "w") as f:
+        f.write(conf)
+    subprocess.run(["nginx", "-s", "reload"])
+    # Letting the new workers bind the port before publishing
+    time.sleep(1)
+    return True
+
+
+def ffmpeg_commands(input_file, duration, streams=1, ladder=None, loops_number=-1):
+    """
+    Building one ffmpeg command per stream.
+    Returns:
+        list: (stream name, command) pairs.
+    """
+    base = ["ffmpeg", "-loglevel", "info", "-stats", "-re", "-stream_loop", str(loops_number), "-i", input_file,
+            "-t", str(duration)]
+    audio = ["-c:a", "aac", "-ar", "44100", "-ac", "1"]
+    names = stream_names(streams, ladder)
+    if not ladder:
+        # Copies of the source, without re-encoding
+        return [(name, base + ["-c:v", "copy"] + audio + ["-f", "flv", f"{RTMP_URL}/{name}"]) for name in names]
+    commands = []
+    for name, (_, height, kbps) in zip(names, parse_ladder(ladder)):
+        video = ["-c:v", "libx264", "-preset", "veryfast", "-tune", "zerolatency", "-vf", f"scale=-2:{height}",
+                 "-b:v", f"{kbps}k", "-maxrate", f"{kbps}k", "-bufsize", f"{2 * kbps}k",
+                 # 2 s GOPs, so that viewers can switch renditions on a keyframe
+                 "-g", "50", "-keyint_min", "50", "-sc_threshold", "0"]
+        commands.append((name, base + video + audio + ["-f", "flv", f"{RTMP_URL}/{name}"]))
+    return commands
+
+
+class PublisherPool:
+    """
+    Supervising one ffmpeg publisher per stream until the streaming duration is over.
+    Args:
+        commands (list): (stream name, command) pairs.
+        duration (float): Streaming duration in seconds.
+        max_restarts (int): Restarts allowed per stream when its ffmpeg exits early.
+    """
+    def __init__(self, commands, duration, max_restarts=3):
+        self.commands = dict(commands)
+        self.duration = duration
+        self.max_restarts = max_restarts
+        self.processes = {}
+        self.restarts = {name: 0 for name in self.commands}
+        self.stopped = False
+
+    def _start(self, name):
+        self.processes[name] = subprocess.Popen(self.commands[name], stdin=subprocess.DEVNULL)
+
+    def run(self):
+        """Starting every publisher and restarting the ones that fail, until all have finished."""
+        deadline = time.monotonic() + self.duration
+        for name in self.commands:
+            self._start(name)
+        print(f"Publishing {len(self.commands)} stream(s): {', '.join(self.commands)}")
+        while self.processes and not self.stopped:
+            time.sleep(0.5)
+            for name, proc in list(self.processes.items()):
+                code = proc.poll()
+                if code is None:
+                    continue
+                del self.processes[name]
+                # Exiting with an error well before the end counts as a crash
+                remaining = deadline - time.monotonic()
+                if code != 0 and remaining > 5 and self.restarts[name] < self.max_restarts:
+                    self.restarts[name] += 1
+                    print(f"{name}: ffmpeg exited with {code}, restarting ({self.restarts[name]}/{self.max_restarts})")
+                    self.commands[name] = self._remaining(self.commands[name], remaining)
+                    self._start(name)
+        return self.restarts
+
+    @staticmethod
+    def _remaining(command, remaining):
+        command = list(command)
+        command[command.index("-t") + 1] = str(int(remaining))
+        return command
+
+    def stop(self):
+        self.stopped = True
+        for proc in self.processes.values():
+            proc.send_signal(signal.SIGINT)
+        for proc in self.processes.values():
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def main(duration=600, streams=1, ladder=None, viewers=1):
     """
     Main function to handle video streaming without packet capture.
+    Streams for the given duration in seconds.
     """
     input_file = "video/Deadpool.mp4"
-    loops_number = -1  # Stream the video once without looping
-    # If you wish to loop the video indefinitely, set loops_number to -1
-
-    ffmpeg_command = [
-        "ffmpeg", "-loglevel", "info", "-stats", "-re", "-stream_loop", str(loops_number),
-        "-i", input_file,
-        "-t", "600",              # Set the streaming duration (in seconds)
-        "-c:v", "copy",           # Copy video stream without re-encoding
-        "-c:a", "aac",            # Encode audio using AAC
-        "-ar", "44100",           # Audio sample rate
-        "-ac", "1",               # Number of audio channels
-        "-f", "flv",              # Format set to FLV for RTMP streaming
-        "rtmp://localhost:1935/live/video.flv"
-    ]
-
-    subprocess.run(ffmpeg_command)
+    loops_number = -1  # Looping the video for as long as the duration requires
+
+    commands = ffmpeg_commands(input_file, duration, streams, ladder, loops_number)
+    if os.path.exists(NGINX_CONF):
+        # Inside the streaming server container: sizing nginx for this run
+        configure_nginx(len(commands), viewers)
+
+    pool = PublisherPool(commands, duration)
+    signal.signal(signal.SIGTERM, lambda signum, frame: pool.stop())
+    try:
+        restarts = pool.run()
+    finally:
+        pool.stop()
+    print(f"Streaming finished, {sum(restarts.values())} publisher restart(s)")
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Publish the sample video to the local RTMP server.")
+    parser.add_argument("--duration", type=int, default=600, help="Streaming duration in seconds (default: 600)")
+    parser.add_argument("--streams", type=int, default=1, help="Independent copies of the stream (default: 1)")
+    parser.add_argument("--ladder", nargs="?", const=DEFAULT_LADDER, default=None,
+                        help=f"Publish a rendition ladder 'name:height:kbps,...' (default ladder: {DEFAULT_LADDER})")
+    parser.add_argument("--viewers", type=int, default=1, help="Concurrent viewers nginx is sized for (default: 1)")
+    parser.add_argument("--write-nginx-conf", metavar="PATH",
+                        help="Only write the nginx configuration for --streams/--ladder and --viewers to PATH")
+    args = parser.parse_args()
+
+    if args.write_nginx_conf:
+        with open(args.write_nginx_conf, "w") as f:
+            f.write(nginx_conf(len(stream_names(args.streams, args.ladder)), args.viewers))
+    else:
+        main(args.duration, args.streams, args.ladder, args.viewers)
@@ -0,0 +1,184 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cached, parallel experiment-matrix runner.
+
+A sweep file lists either a parameter grid or explicit scenarios:
+
+    {
+        "script": "Topology.py",
+        "base": {"duration": 120},
+        "grid": {"bw,delay": [[30, 60], [35, 70]], "jitter": [0, 5], "loss": [0, 0.1]}
+    }
+
+A grid key naming several parameters ("bw,delay") takes tuples, so paired values stay
+together. Every scenario is a flat dict of command-line options of the script; its
+results live in results/<hash>/ where <hash> is the SHA-256 of the scenario's canonical
+JSON. A scenario with a done.json is skipped on the next invocation, so an interrupted
+sweep resumes where it stopped and reruns only repeat what failed.
+
+Scenarios run in parallel, each as its own Topology.py process with a distinct name
+prefix and controller port, so that their switches, hosts and containers don't collide.
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from run_registry import REGISTRY_DIR, RunRegistry
+
+BASE_CONTROLLER_PORT = 6700
+
+# The full grid of Topology.py, used when no sweep file is given
+DEFAULT_SWEEP = {
+    'script': 'Topology.py',
+    'base': {'duration': 120},
+    'grid': {
+        'bw,delay': [[30, 60], [35, 70], [40, 80], [45, 90], [50, 100]],
+        'jitter': [0, 5, 10, 20],
+        'loss': [0, 0.1, 0.5, 1],
+    },
+}
+
+
+def expand(sweep):
+    """
+    Expanding a sweep into its list of scenarios.
+
+    Returns:
+        list: One dict of script options per scenario.
+    """
+    base = dict(sweep.get('base') or {})
+    scenarios = [dict(base, **scenario) for scenario in sweep.get('scenarios') or []]
+    grid = sweep.get('grid') or {}
+    if grid:
+        keys = list(grid)
+        for values in itertools.product(*(grid[key] for key in keys)):
+            scenario = dict(base)
+            for key, value in zip(keys, values):
+                names = key.split(',')
+                if len(names) == 1:
+                    scenario[key] = value
+                else:
+                    scenario.update(zip(names, value))
+            scenarios.append(scenario)
+    return scenarios
+
+
+def scenario_hash(scenario, script):
+    """Hashing a scenario's canonical JSON (together with the script it runs)."""
+    canonical = json.dumps({'script': script, 'options': scenario}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def default_jobs():
+    """Running one scenario per four CPUs: each one brings up OVS, containers and ffmpeg."""
+    return max(1, (os.cpu_count() or 1) // 4)
+
+
+class Sweep:
+    """
+    Running the scenarios of a sweep with a bounded number of parallel slots.
+
+    Args:
+        sweep (dict): Sweep description (see the module docstring).
+        results_dir (str): Directory holding one subdirectory per scenario hash.
+        jobs (int): Number of scenarios running at the same time.
+        dry_run (bool): Only printing what would run.
+    """
+
+    def __init__(self, sweep, results_dir, jobs=None, dry_run=False):
+        self.script = sweep.get('script', 'Topology.py')
+        self.scenarios = expand(sweep)
+        self.results_dir = results_dir
+        self.jobs = jobs or default_jobs()
+        self.dry_run = dry_run
+        # Each slot owns a name prefix and a controller port while it runs a scenario
+        self._slots = queue.Queue()
+        for slot in range(self.jobs):
+            self._slots.put(slot)
+
+    def pending(self):
+        """Returning (hash, scenario) for every scenario without a completed result."""
+        todo = []
+        for scenario in self.scenarios:
+            digest = scenario_hash(scenario, self.script)
+            if not os.path.exists(os.path.join(self.results_dir, digest, 'done.json')):
+                todo.append((digest, scenario))
+        return todo
+
+    def command(self, scenario, slot, run_dir):
+        script = os.path.join(os.path.abspath(os.path.dirname(__file__)), self.script)
+        cmd = [sys.executable, script, '--autotest', '--prefix', f'r{slot}', '--run-id', os.path.basename(run_dir),
+               '--controller-port', str(BASE_CONTROLLER_PORT + slot),
+               '--shared-dir', os.path.join(run_dir, 'pcap')]
+        for key, value in sorted(scenario.items()):
+            cmd += [f'--{key.replace("_", "-")}', str(value)]
+        return cmd
+
+    def run_one(self, digest, scenario):
+        """Running one scenario in a free slot and recording its outcome."""
+        run_dir = os.path.join(self.results_dir, digest)
+        slot = self._slots.get()
+        try:
+            # Leftovers of a crashed attempt are discarded
+            shutil.rmtree(run_dir, ignore_errors=True)
+            os.makedirs(os.path.join(run_dir, 'pcap'))
+            with open(os.path.join(run_dir, 'scenario.json'), 'w') as f:
+                json.dump({'script': self.script, 'options': scenario}, f, indent=1, sort_keys=True)
+            cmd = self.command(scenario, slot, run_dir)
+            started = time.time()
+            with open(os.path.join(run_dir, 'run.log'), 'w') as log:
+                code = subprocess.call(cmd, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT)
+            # A run that crashed leaves its registry behind; removing what it created frees the slot
+            leftovers = os.path.join(REGISTRY_DIR, f'{digest}.json')
+            if os.path.exists(leftovers):
+                RunRegistry.load(leftovers).teardown()
+            outcome = {'returncode': code, 'started': started, 'elapsed': time.time() - started, 'slot': slot}
+            name = 'done.json' if code == 0 else 'failed.json'
+            with open(os.path.join(run_dir, name), 'w') as f:
+                json.dump(outcome, f, indent=1)
+            print(f'[{digest}] {"done" if code == 0 else f"failed ({code})"} in {outcome["elapsed"]:.0f} s: {scenario}')
+            return code
+        finally:
+            self._slots.put(slot)
+
+    def run(self):
+        """Running every pending scenario and returning the number of failures."""
+        todo = self.pending()
+        print(f'{len(self.scenarios)} scenarios, {len(self.scenarios) - len(todo)} cached, '
+              f'{len(todo)} to run with {self.jobs} in parallel')
+        if self.dry_run:
+            for digest, scenario in todo:
+                print(f'[{digest}] ' + ' '.join(self.command(scenario, 0, os.path.join(self.results_dir, digest))))
+            return 0
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            codes = list(pool.map(lambda item: self.run_one(*item), todo))
+        return sum(1 for code in codes if code != 0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a bandwidth/delay/jitter/loss sweep with cached results.')
+    parser.add_argument('sweep', nargs='?', help='Sweep JSON file (default: the full Topology.py grid)')
+    parser.add_argument('--results', default='results', help='Results directory (default: results)')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help=f'Scenarios run in parallel (default: CPUs / 4 = {default_jobs()})')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the scenarios that would run')
+    args = parser.parse_args()
+
+    if args.sweep:
+        with open(args.sweep) as f:
+            sweep = json.load(f)
+    else:
+        sweep = DEFAULT_SWEEP
+    failures = Sweep(sweep, args.results, args.jobs, args.dry_run).run()
+    sys.exit(1 if failures else 0)
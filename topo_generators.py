@@ -0,0 +1,224 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Parameterized topology specs: dumbbell, parking lot, leaf-spine and k-ary fat-tree.
+
+Every generator returns a spec in the format of topology_spec.py, so the network is
+built by build_network() with its batched switch start-up and plain Links for the
+unshaped links; only the links a generator marks as bottlenecks get TCLink shaping
+parameters. Bottleneck links are marked with "bottleneck": true, so they end up in
+CompiledTopology.bottlenecks for captures and shaping; the first one is also named
+'middle', like the middle link of the dumbbell scripts.
+
+The specs have no OpenFlow controller: the switches run in OVS standalone mode, where
+each one learns MAC addresses locally instead of sending every new flow to the single
+reference controller. Topologies with redundant paths (leaf-spine, fat-tree) enable
+spanning tree on their switches, so they only forward over a loop-free subset of the
+links and need about 30 s after net.start() before every host is reachable.
+
+With streaming=True the Docker hosts 'server' (10.0.0.1) and 'client' (10.0.0.2) and
+their streaming containers are attached at the two ends of the first bottleneck, so
+Topology.py can run on the generated network. Other hosts are numbered from 10.0.1.1.
+
+    python3 topo_generators.py fat_tree --k 4 --streaming --out specs/fattree4.json
+"""
+
+import argparse
+import ipaddress
+import json
+
+# Hosts other than the streaming pair are numbered from here
+FIRST_HOST = ipaddress.ip_address('10.0.1.1')
+
+
+class SpecBuilder:
+    """
+    Accumulating the nodes and links of a generated spec.
+
+    Args:
+        name (str): Spec name.
+        description (str): Spec description.
+        bw (float): Bandwidth of the bottleneck links in Mbit/s.
+        delay (str): Delay of the bottleneck links, e.g. '10ms'.
+        stp (bool): Enabling spanning tree on the switches (topologies with loops).
+    """
+
+    def __init__(self, name, description, bw=10, delay='10ms', stp=False):
+        self.spec = {'name': name, 'description': description, 'controller': None, 'docker_hosts': [],
+                     'hosts': [], 'switches': [], 'links': [], 'containers': [], 'roles': {}, 'pairs': {}}
+        self.bw = bw
+        self.delay = delay
+        self.stp = stp
+        self._hosts = 0
+        self._bottlenecks = 0
+
+    def switch(self, number):
+        # Mininet derives the datapath id from the number in the name, so it has to be unique
+        name = f's{number}'
+        self.spec['switches'].append({'name': name, 'stp': True} if self.stp else name)
+        return name
+
+    def host(self, switch, prefix='h'):
+        ip = str(FIRST_HOST + self._hosts)
+        self._hosts += 1
+        name = f'{prefix}{self._hosts}'
+        self.spec['hosts'].append({'name': name, 'ip': ip})
+        self.link(switch, name)
+        return name
+
+    def link(self, node1, node2, bottleneck=False, params=None):
+        entry = {'nodes': [node1, node2]}
+        if bottleneck:
+            self._bottlenecks += 1
+            entry['name'] = 'middle' if self._bottlenecks == 1 else f'bottleneck{self._bottlenecks}'
+            entry['params'] = dict(params or {'bw': self.bw, 'delay': self.delay})
+            entry['bottleneck'] = True
+        elif params:
+            entry['params'] = dict(params)
+        self.spec['links'].append(entry)
+        return entry
+
+    def pairs(self, kind, pairs):
+        """Recording traffic pairs and the iperf roles of their endpoints."""
+        self.spec['pairs'][kind] = [list(pair) for pair in pairs]
+        roles = self.spec['roles']
+        roles.setdefault('iperf_client', []).extend(src for src, _ in pairs if src not in roles['iperf_client'])
+        roles.setdefault('iperf_server', []).extend(dst for _, dst in pairs if dst not in roles['iperf_server'])
+
+    def streaming(self, left, right):
+        """Attaching the streaming server and client Docker hosts and their containers."""
+        self.spec['docker_hosts'] += [
+            {'name': 'server', 'ip': '10.0.0.1', 'dimage': 'dev_test', 'docker_args': {'hostname': 'server'}},
+            {'name': 'client', 'ip': '10.0.0.2', 'dimage': 'dev_test', 'docker_args': {'hostname': 'client'}},
+        ]
+        self.link(left, 'server')
+        self.link(right, 'client')
+        self.spec['containers'] += [
+            {'name': 'streaming_server', 'host': 'server', 'image': 'streaming_server_image', 'shared_dir': True},
+            {'name': 'streaming_client', 'host': 'client', 'image': 'streaming_client_image', 'shared_dir': True},
+        ]
+
+    def build(self):
+        return self.spec
+
+
+def dumbbell(pairs=2, bw=10, delay='10ms', streaming=False):
+    """
+    Two switches joined by one bottleneck, with pairs hosts on each side.
+    Pair i runs from the i-th left host to the i-th right host.
+    """
+    spec = SpecBuilder(f'dumbbell{pairs}', f'Dumbbell with {pairs} host pairs across one bottleneck', bw, delay)
+    left, right = spec.switch(1), spec.switch(2)
+    spec.link(left, right, bottleneck=True)
+    hosts = [(spec.host(left), spec.host(right)) for _ in range(pairs)]
+    spec.pairs('iperf', hosts)
+    if streaming:
+        spec.streaming(left, right)
+    return spec.build()
+
+
+def parking_lot(hops=3, hosts_per_hop=1, bw=10, delay='10ms', streaming=False):
+    """
+    A chain of hops + 1 switches where every inter-switch link is a bottleneck. Long
+    flows cross the whole chain; at every hop, cross-traffic flows enter at the hop's
+    first switch and leave at its second, competing with the long flows on that hop only.
+    """
+    spec = SpecBuilder(f'parking_lot{hops}', f'Parking lot with {hops} bottleneck hops', bw, delay)
+    switches = [spec.switch(i + 1) for i in range(hops + 1)]
+    for a, b in zip(switches, switches[1:]):
+        spec.link(a, b, bottleneck=True)
+    long_flows = [(spec.host(switches[0]), spec.host(switches[-1])) for _ in range(hosts_per_hop)]
+    cross = [(spec.host(a), spec.host(b)) for a, b in zip(switches, switches[1:]) for _ in range(hosts_per_hop)]
+    spec.pairs('iperf', long_flows)
+    spec.pairs('cross', cross)
+    if streaming:
+        spec.streaming(switches[0], switches[-1])
+    return spec.build()
+
+
+def leaf_spine(leaves=4, spines=2, hosts_per_leaf=4, bw=10, delay='1ms', streaming=False):
+    """
+    Every leaf switch connects to every spine switch; the leaf uplinks are the
+    bottlenecks (with hosts_per_leaf > spines they are oversubscribed). Host i of every
+    leaf sends to host i of the next leaf.
+    """
+    spec = SpecBuilder(f'leaf_spine{leaves}x{spines}', f'Leaf-spine with {leaves} leaves and {spines} spines',
+                       bw, delay, stp=True)
+    spine_switches = [spec.switch(1000 + i + 1) for i in range(spines)]
+    leaf_switches = [spec.switch(i + 1) for i in range(leaves)]
+    for leaf in leaf_switches:
+        for spine in spine_switches:
+            spec.link(leaf, spine, bottleneck=True)
+    hosts = [[spec.host(leaf) for _ in range(hosts_per_leaf)] for leaf in leaf_switches]
+    spec.pairs('iperf', [(hosts[i][j], hosts[(i + 1) % leaves][j])
+                         for i in range(leaves) for j in range(hosts_per_leaf) if leaves > 1])
+    if streaming:
+        spec.streaming(leaf_switches[0], leaf_switches[-1])
+    return spec.build()
+
+
+def fat_tree(k=4, bw=10, delay='1ms', streaming=False):
+    """
+    A k-ary fat-tree: k pods of k/2 edge and k/2 aggregation switches, (k/2)^2 core
+    switches and k/2 hosts per edge switch (k^3/4 hosts). The aggregation-core links
+    are the bottlenecks. Host i sends to the host with the same position in the next pod.
+    """
+    if k < 2 or k % 2:
+        raise ValueError('k has to be an even number >= 2')
+    half = k // 2
+    spec = SpecBuilder(f'fat_tree{k}', f'{k}-ary fat-tree with {k ** 3 // 4} hosts', bw, delay, stp=True)
+    # Switch numbers: core 10001+, aggregation pod*100+50+, edge pod*100+
+    core = [spec.switch(10000 + i + 1) for i in range(half * half)]
+    pods = []
+    for pod in range(k):
+        aggregation = [spec.switch((pod + 1) * 100 + 50 + i) for i in range(half)]
+        edge = [spec.switch((pod + 1) * 100 + i) for i in range(half)]
+        for a, agg in enumerate(aggregation):
+            # Aggregation switch a of every pod connects to core switches a*k/2 .. a*k/2 + k/2 - 1
+            for c in range(half):
+                spec.link(agg, core[a * half + c], bottleneck=True)
+            for sw in edge:
+                spec.link(sw, agg)
+        pods.append([spec.host(sw) for sw in edge for _ in range(half)])
+    spec.pairs('iperf', [(pods[p][i], pods[(p + 1) % k][i]) for p in range(k) for i in range(half * half)])
+    if streaming:
+        spec.streaming(f's{100}', f's{k * 100}')
+    return spec.build()
+
+
+GENERATORS = {'dumbbell': dumbbell, 'parking_lot': parking_lot, 'leaf_spine': leaf_spine, 'fat_tree': fat_tree}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a generated topology spec.')
+    parser.add_argument('shape', choices=sorted(GENERATORS))
+    parser.add_argument('--pairs', type=int, default=2, help='dumbbell: host pairs')
+    parser.add_argument('--hops', type=int, default=3, help='parking_lot: bottleneck hops')
+    parser.add_argument('--hosts-per-hop', type=int, default=1, help='parking_lot: long and cross flows per hop')
+    parser.add_argument('--leaves', type=int, default=4, help='leaf_spine: leaf switches')
+    parser.add_argument('--spines', type=int, default=2, help='leaf_spine: spine switches')
+    parser.add_argument('--hosts-per-leaf', type=int, default=4, help='leaf_spine: hosts per leaf')
+    parser.add_argument('--k', type=int, default=4, help='fat_tree: switch radix')
+    parser.add_argument('--bw', type=float, default=10, help='Bottleneck bandwidth in Mbit/s')
+    parser.add_argument('--delay', default=None, help='Bottleneck delay (default: 10ms, 1ms in data-center shapes)')
+    parser.add_argument('--streaming', action='store_true', help='Attach the streaming server and client')
+    parser.add_argument('--out', default=None, help='Output spec file (default: stdout)')
+    args = parser.parse_args()
+
+    options = {'bw': args.bw, 'streaming': args.streaming}
+    if args.delay:
+        options['delay'] = args.delay
+    shape_options = {'dumbbell': {'pairs': args.pairs},
+                     'parking_lot': {'hops': args.hops, 'hosts_per_hop': args.hosts_per_hop},
+                     'leaf_spine': {'leaves': args.leaves, 'spines': args.spines, 'hosts_per_leaf': args.hosts_per_leaf},
+                     'fat_tree': {'k': args.k}}
+    spec = GENERATORS[args.shape](**shape_options[args.shape], **options)
+    text = json.dumps(spec, indent=1)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+        print(f"{args.out}: {len(spec['hosts']) + len(spec['docker_hosts'])} hosts, {len(spec['switches'])} switches, "
+              f"{len(spec['links'])} links")
+    else:
+        print(text)
@@ -0,0 +1,260 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Declarative topology specs compiled into a Containernet/VNFManager network.
+
+A spec (JSON, or YAML when PyYAML is installed) lists the hosts, Docker hosts,
+switches, links and VNF containers of a topology together with the traffic roles
+the experiment scripts look up. specs/topology.json and specs/topology1.json describe
+the networks of Topology.py and Topology1.py.
+
+Example:
+    {
+        "controller": "c0",
+        "docker_hosts": [{"name": "server", "ip": "10.0.0.1", "dimage": "dev_test"}],
+        "hosts": [{"name": "h1", "ip": "10.0.0.3"}],
+        "switches": ["s1", "s2"],
+        "links": [
+            {"nodes": ["s1", "server"]},
+            {"name": "middle", "nodes": ["s1", "s2"], "params": {"bw": 10, "delay": "10ms"},
+             "bottleneck": true}
+        ],
+        "containers": [{"name": "streaming_server", "host": "server",
+                        "image": "streaming_server_image", "shared_dir": true}],
+        "roles": {"iperf_server": ["h1"]},
+        "pairs": {"iperf": [["h1", "server"]]}
+    }
+"""
+
+import json
+import os
+import re
+
+from bringup import DEFAULT_WORKERS, parallel_map
+from comnetsemu.net import Containernet, VNFManager
+from mininet.link import Link, TCLink
+from mininet.log import info
+from mininet.node import Controller
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+SECTIONS = ('docker_hosts', 'hosts', 'switches', 'links', 'containers', 'roles', 'pairs')
+
+
+def load_spec(path):
+    """
+    Loading a topology spec from a JSON or YAML file.
+
+    Args:
+        path (str): Path to the spec file.
+    Returns:
+        dict: The validated spec.
+    """
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ImportError(f'PyYAML is required to read {path}')
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    validate_spec(spec)
+    return spec
+
+
+def _entries(spec, section):
+    """Normalizing a section so that bare names become {'name': ...} entries."""
+    return [{'name': e} if isinstance(e, str) else e for e in spec.get(section) or []]
+
+
+def validate_spec(spec):
+    """Checking node names and link endpoints, raising ValueError on the first problem."""
+    unknown = set(spec) - set(SECTIONS) - {'name', 'controller', 'description'}
+    if unknown:
+        raise ValueError(f'Unknown spec sections: {", ".join(sorted(unknown))}')
+    names = set()
+    for section in ('docker_hosts', 'hosts', 'switches'):
+        for entry in _entries(spec, section):
+            if entry['name'] in names:
+                raise ValueError(f'Duplicate node name: {entry["name"]}')
+            names.add(entry['name'])
+    for link in spec.get('links', []):
+        for node in link['nodes']:
+            if node not in names:
+                raise ValueError(f'Link {link.get("name", link["nodes"])} references unknown node {node}')
+    docker_hosts = {e['name'] for e in _entries(spec, 'docker_hosts')}
+    for container in spec.get('containers', []):
+        if container['host'] not in docker_hosts:
+            raise ValueError(f'Container {container["name"]} needs a Docker host, got {container["host"]}')
+    for role, members in (spec.get('roles') or {}).items():
+        for node in members:
+            if node not in names:
+                raise ValueError(f'Role {role} references unknown node {node}')
+    for kind, pairs in (spec.get('pairs') or {}).items():
+        for pair in pairs:
+            for node in pair:
+                if node not in names:
+                    raise ValueError(f'Pair {kind} references unknown node {node}')
+
+
+class CompiledTopology:
+    """
+    A network built from a spec.
+
+    Attributes:
+        net (Containernet): The network.
+        mgr (VNFManager): The VNF manager of the network.
+        nodes (dict): Node name -> host, Docker host or switch.
+        links (dict): Link name -> link, for the links that have a name in the spec.
+        bottlenecks (list): Links marked with "bottleneck": true.
+        roles (dict): Role -> list of nodes.
+        pairs (dict): Traffic kind -> list of (source node, destination node).
+        containers (dict): Container name -> VNF container, filled by add_containers().
+    """
+
+    def __init__(self, spec, net, mgr, shared_dir, prefix=''):
+        self.spec = spec
+        self.net = net
+        self.mgr = mgr
+        self.shared_dir = shared_dir
+        self.prefix = prefix
+        self.nodes = {}
+        self.links = {}
+        self.bottlenecks = []
+        self.containers = {}
+        self.roles = {}
+        self.pairs = {}
+
+    def __getitem__(self, name):
+        return self.nodes[name]
+
+    def ip(self, name):
+        """Returning the IP address of a node."""
+        return self.nodes[name].IP()
+
+    def role(self, role):
+        """Returning the nodes that have the given traffic role (empty list if none)."""
+        return self.roles.get(role, [])
+
+    def container_specs(self):
+        return self.spec.get('containers', [])
+
+    def container_name(self, name):
+        """Returning the Docker name of a spec container (prefixed in isolated runs)."""
+        return self.prefix + name
+
+    def add_container(self, entry):
+        """Adding one VNF container described by a spec entry."""
+        docker_args = dict(entry.get('docker_args') or {})
+        if entry.get('shared_dir'):
+            docker_args.setdefault('volumes', {})[self.shared_dir] = {'bind': '/home/pcap/', 'mode': 'rw'}
+        container = self.mgr.addContainer(self.container_name(entry['name']), self.prefix + entry['host'],
+                                          entry['image'], entry.get('dcmd', ''), docker_args=docker_args)
+        self.containers[entry['name']] = container
+        return container
+
+    def add_containers(self, workers=DEFAULT_WORKERS):
+        """Adding the VNF containers of the spec concurrently, at most workers at a time."""
+        parallel_map(self.add_container, self.container_specs(), workers)
+        return self.containers
+
+    def remove_containers(self):
+        for name in list(self.containers):
+            self.mgr.removeContainer(self.container_name(name))
+            del self.containers[name]
+
+
+def build_network(spec, shared_dir, workers=DEFAULT_WORKERS, prefix='', controller_port=None, **net_args):
+    """
+    Compiling a spec into a (not yet started) Containernet network.
+
+    Nodes are created section by section before any link, Docker hosts are created
+    concurrently (at most workers Docker round-trips at a time), switches are created with
+    batch=True so that net.start() configures all of them with a single ovs-vsctl call,
+    and links without shaping parameters use a plain Link so they don't pay for the
+    TCLink qdisc setup.
+
+    Args:
+        spec (dict): A spec as returned by load_spec().
+        shared_dir (str): Host directory mounted at /home/pcap/ in containers with shared_dir set.
+        workers (int): Maximum number of Docker hosts created at the same time.
+        prefix (str): Prepended to every node and container name, so that several
+            networks can run side by side on one machine (keep it short: interface
+            names are limited to 15 characters). Lookups still use the spec names.
+        controller_port (int): OpenFlow port of the controller (default: Mininet's).
+        net_args: Extra keyword arguments for Containernet.
+    Returns:
+        CompiledTopology: The network and its named nodes, links and roles.
+    """
+    validate_spec(spec)
+    controller = spec.get('controller', 'c0')
+    net_args.setdefault('xterms', False)
+    net = Containernet(controller=Controller if controller else None, link=TCLink, **net_args)
+    mgr = VNFManager(net)
+    topo = CompiledTopology(spec, net, mgr, shared_dir, prefix)
+
+    if controller:
+        info('*** Add controller\n')
+        if controller_port:
+            net.addController(prefix + controller, port=controller_port)
+        else:
+            net.addController(prefix + controller)
+
+    docker_hosts = _entries(spec, 'docker_hosts')
+    hosts = _entries(spec, 'hosts')
+    info(f'*** Creating {len(docker_hosts)} Docker hosts and {len(hosts)} hosts\n')
+
+    def add_docker_host(entry):
+        entry = dict(entry)
+        name = entry.pop('name')
+        return name, net.addDockerHost(prefix + name, **entry)
+
+    topo.nodes.update(parallel_map(add_docker_host, docker_hosts, workers))
+    # Keeping Mininet's host order independent of which container came up first
+    order = {prefix + name: i for i, name in enumerate(topo.nodes)}
+    net.hosts.sort(key=lambda h: order.get(h.name, len(order)))
+    for entry in hosts:
+        entry = dict(entry)
+        name = entry.pop('name')
+        topo.nodes[name] = net.addHost(prefix + name, **entry)
+
+    switches = _entries(spec, 'switches')
+    info(f'*** Adding {len(switches)} switches and {len(spec.get("links", []))} links\n')
+    for entry in switches:
+        entry = dict(entry)
+        name = entry.pop('name')
+        if controller is None:
+            entry.setdefault('failMode', 'standalone')
+        entry.setdefault('batch', True)
+        digits = re.findall(r'\d+', name)
+        if prefix and digits and 'dpid' not in entry:
+            # Mininet derives the datapath id from the first number in the name, which
+            # would be the prefix's; keeping the one of the unprefixed name
+            entry['dpid'] = '%016x' % int(digits[0])
+        topo.nodes[name] = net.addSwitch(prefix + name, **entry)
+
+    for entry in spec.get('links', []):
+        params = dict(entry.get('params') or {})
+        if not params:
+            params['cls'] = Link
+        node1, node2 = (topo.nodes[n] for n in entry['nodes'])
+        link = net.addLink(node1, node2, **params)
+        if 'name' in entry:
+            topo.links[entry['name']] = link
+        if entry.get('bottleneck'):
+            topo.bottlenecks.append(link)
+
+    topo.roles = {role: [topo.nodes[n] for n in members] for role, members in (spec.get('roles') or {}).items()}
+    topo.pairs = {kind: [(topo.nodes[a], topo.nodes[b]) for a, b in pairs]
+                  for kind, pairs in (spec.get('pairs') or {}).items()}
+    return topo
+
+
+def spec_path(name):
+    """Resolving a spec name (e.g. 'topology') to a file in the specs/ directory."""
+    if os.path.exists(name):
+        return name
+    return os.path.join(os.path.abspath(os.path.dirname(__file__)), 'specs', f'{name}.json')
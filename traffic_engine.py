@@ -0,0 +1,277 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Asyncio traffic-generation engine for iperf/iperf3 cross traffic.
+
+Every flow is a tracked subprocess started in its host's namespaces (through mnexec),
+supervised from the asyncio loop of a HostExecutor. Flows can be stopped
+individually, and their CSV (iperf -y C) or JSON (iperf3 -J) reports are parsed into a
+per-flow results table.
+"""
+
+import asyncio
+import csv
+import itertools
+import json
+import signal
+import time
+
+from host_exec import HostExecutor, namespace_argv
+from mininet.log import info
+
+# Columns of iperf2's CSV report (-y C); UDP reports carry the last five as well
+IPERF_CSV_FIELDS = ['timestamp', 'src', 'sport', 'dst', 'dport', 'iperf_id', 'interval', 'bytes',
+                    'bits_per_second', 'jitter_ms', 'lost', 'total', 'loss_pct', 'out_of_order']
+
+RESULT_FIELDS = ['id', 'label', 'host', 'target', 'tool', 'role', 'protocol', 'started', 'ended', 'duration',
+                 'bytes', 'bits_per_second', 'jitter_ms', 'lost', 'total', 'loss_pct', 'reports', 'returncode']
+
+
+def parse_iperf_csv(lines):
+    """
+    Parsing iperf2 CSV report lines.
+
+    Returns:
+        list: One dict per report line, with numeric fields converted.
+    """
+    reports = []
+    for row in csv.reader(lines):
+        if len(row) < 9:
+            continue
+        report = dict(zip(IPERF_CSV_FIELDS, row))
+        for key in ('bytes', 'bits_per_second', 'lost', 'total'):
+            if key in report:
+                report[key] = int(float(report[key]))
+        for key in ('jitter_ms', 'loss_pct'):
+            if key in report:
+                report[key] = float(report[key])
+        reports.append(report)
+    return reports
+
+
+def parse_iperf3_json(text):
+    """Parsing the summary of an iperf3 JSON (-J) report."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return {}
+    end = data.get('end', {})
+    summary = end.get('sum') or end.get('sum_received') or end.get('sum_sent') or {}
+    result = {
+        'bytes': summary.get('bytes'),
+        'bits_per_second': summary.get('bits_per_second'),
+        'jitter_ms': summary.get('jitter_ms'),
+        'lost': summary.get('lost_packets'),
+        'total': summary.get('packets'),
+        'loss_pct': summary.get('lost_percent'),
+    }
+    return {key: value for key, value in result.items() if value is not None}
+
+
+def iperf_client_argv(target, port=5001, udp=False, bandwidth=None, duration=None, size=None, tool='iperf'):
+    """Building the command line of an iperf/iperf3 client (see TrafficEngine.iperf_client())."""
+    argv = [tool, '-c', target, '-p', str(port)]
+    if udp:
+        argv.append('-u')
+    if bandwidth:
+        argv += ['-b', str(bandwidth)]
+    if size:
+        argv += ['-n', str(size)]
+    elif duration:
+        argv += ['-t', str(duration)]
+    argv += ['-J'] if tool == 'iperf3' else ['-y', 'C']
+    return argv
+
+
+class Flow:
+    """One supervised iperf/iperf3 process and its parsed results."""
+
+    def __init__(self, flow_id, host, argv, tool, role, protocol, target=None, label=None):
+        self.id = flow_id
+        self.host = host
+        self.argv = argv
+        self.tool = tool
+        self.role = role
+        self.protocol = protocol
+        self.target = target
+        self.label = label or f'{role}-{flow_id}'
+        self.process = None
+        self.started = None
+        self.ended = None
+        self.returncode = None
+        self.lines = []
+        self.done = None
+
+    def result(self):
+        """Summarizing the flow as one row of the results table."""
+        row = {
+            'id': self.id, 'label': self.label, 'host': self.host.name, 'target': self.target,
+            'tool': self.tool, 'role': self.role, 'protocol': self.protocol, 'started': self.started,
+            'ended': self.ended, 'returncode': self.returncode,
+            'duration': (self.ended - self.started) if self.started and self.ended else None,
+        }
+        if self.tool == 'iperf3':
+            row.update(parse_iperf3_json(''.join(self.lines)))
+            row['reports'] = 1 if 'bytes' in row else 0
+            return row
+        reports = parse_iperf_csv(self.lines)
+        row['reports'] = len(reports)
+        if not reports:
+            return row
+        if self.role == 'server':
+            # A server reports once per client; totals are summed over them
+            row['bytes'] = sum(r['bytes'] for r in reports)
+            row['bits_per_second'] = sum(r['bits_per_second'] for r in reports)
+            return row
+        # The client's own total is the last report whose interval starts at 0; for UDP the
+        # server report (jitter/loss) follows it
+        totals = [r for r in reports if r['interval'].startswith('0.0-')] or reports
+        row.update({key: value for key, value in totals[-1].items() if key in RESULT_FIELDS})
+        return row
+
+
+class TrafficEngine:
+    """
+    Launching and supervising iperf/iperf3 flows from a single asyncio loop.
+
+    The public methods are thread-safe and can be called from the topology scripts'
+    main thread or worker threads; they return flow ids.
+
+    Args:
+        executor (HostExecutor): Executor whose loop supervises the flows; one is created
+            (and stopped with the engine) when not given.
+    """
+
+    def __init__(self, executor=None):
+        self.flows = {}
+        self.executor = executor or HostExecutor()
+        self._owns_executor = executor is None
+        self._ids = itertools.count(1)
+        self._loop = None
+
+    def start(self):
+        """Starting the executor's event loop if it is not running yet."""
+        if not self.executor.running:
+            self.executor.start()
+        self._loop = self.executor.loop
+        return self
+
+    def _call(self, coro):
+        return self.submit(coro).result()
+
+    def submit(self, coro):
+        """
+        Running a coroutine on the engine's loop, e.g. a dispatcher that starts flows with
+        spawn_flow().
+
+        Returns:
+            concurrent.futures.Future: Resolved with the coroutine's result; cancel it to
+            stop the coroutine.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def start_flow(self, host, argv, tool='iperf', role='client', protocol='tcp', target=None, label=None):
+        """
+        Starting an arbitrary command in a host's namespaces as a tracked flow.
+
+        Returns:
+            int: The flow id.
+        """
+        return self._call(self.spawn_flow(host, argv, tool, role, protocol, target, label))
+
+    async def spawn_flow(self, host, argv, tool='iperf', role='client', protocol='tcp', target=None, label=None):
+        """start_flow() for coroutines already running on the engine's loop (e.g. a workload dispatcher)."""
+        flow = Flow(next(self._ids), host, list(argv), tool, role, protocol, target, label)
+        self.flows[flow.id] = flow
+        await self._spawn(flow)
+        return flow.id
+
+    def iperf_server(self, host, port=5001, udp=False, tool='iperf'):
+        """Starting an iperf/iperf3 server on a host."""
+        if tool == 'iperf3':
+            argv = ['iperf3', '-s', '-p', str(port), '-J']
+        else:
+            argv = ['iperf', '-s', '-p', str(port), '-y', 'C'] + (['-u'] if udp else [])
+        return self.start_flow(host, argv, tool, 'server', 'udp' if udp else 'tcp')
+
+    def iperf_client(self, host, target, port=5001, udp=False, bandwidth=None, duration=None, size=None,
+                     tool='iperf', label=None):
+        """
+        Starting an iperf/iperf3 client flow.
+
+        Args:
+            host: Mininet host the client runs on.
+            target (str): Server IP address.
+            port (int): Server port.
+            udp (bool): UDP instead of TCP.
+            bandwidth (str): Target rate, e.g. '5M'.
+            duration (float): Seconds to send for.
+            size (str): Amount of data to send instead of a duration, e.g. '50M'.
+        """
+        argv = iperf_client_argv(target, port, udp, bandwidth, duration, size, tool)
+        return self.start_flow(host, argv, tool, 'client', 'udp' if udp else 'tcp', target, label)
+
+    async def _spawn(self, flow):
+        flow.process = await asyncio.create_subprocess_exec(
+            *namespace_argv(flow.host, flow.argv),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+        flow.started = time.time()
+        flow.done = self._loop.create_task(self._supervise(flow))
+
+    async def _supervise(self, flow):
+        async for line in flow.process.stdout:
+            flow.lines.append(line.decode(errors='replace'))
+        flow.returncode = await flow.process.wait()
+        flow.ended = time.time()
+
+    def stop_flow(self, flow_id, timeout=5.0):
+        """Stopping one flow with SIGINT (so iperf prints its report), killing it after timeout."""
+        return self._call(self._stop(self.flows[flow_id], timeout))
+
+    async def _stop(self, flow, timeout):
+        if flow.process.returncode is None:
+            try:
+                flow.process.send_signal(signal.SIGINT)
+                await asyncio.wait_for(asyncio.shield(flow.done), timeout)
+            except ProcessLookupError:
+                pass
+            except asyncio.TimeoutError:
+                flow.process.kill()
+        await flow.done
+        return flow.result()
+
+    def wait_flow(self, flow_id, timeout=None):
+        """Waiting until a flow ends by itself and returning its results row."""
+        flow = self.flows[flow_id]
+        asyncio.run_coroutine_threadsafe(asyncio.wait_for(asyncio.shield(flow.done), timeout),
+                                         self._loop).result()
+        return flow.result()
+
+    def running(self):
+        """Returning the ids of the flows that are still running."""
+        return [f.id for f in self.flows.values() if f.process is not None and f.process.returncode is None]
+
+    def results(self):
+        """Returning the results table, one row per flow."""
+        return [flow.result() for flow in self.flows.values()]
+
+    def write_results(self, path):
+        """Writing the results table to a CSV file."""
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(self.results())
+
+    def stop(self, timeout=5.0):
+        """Stopping every running flow and the event loop."""
+        async def stop_all():
+            await asyncio.gather(*(self._stop(self.flows[i], timeout) for i in self.running()))
+
+        if self._loop is None:
+            return
+        self._call(stop_all())
+        info(f'*** Traffic engine stopped, {len(self.flows)} flows supervised\n')
+        if self._owns_executor:
+            self.executor.stop(timeout)
+        self._loop = None
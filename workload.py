@@ -0,0 +1,261 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Stochastic cross-traffic workload: flow arrivals drawn from distributions and
+dispatched from one scheduler.
+
+A workload is an endless schedule of flows, each with an arrival time, a host pair and
+a size in bytes:
+
+    arrivals    Poisson process with a mean rate in flows per second (exponential gaps)
+    pairs       traffic matrix, (src, dst, weight) entries; each flow picks a pair with
+                probability proportional to its weight
+    sizes       'pareto' (heavy-tailed, shape alpha), 'lognormal' (sigma of the log) or
+                'fixed', all parameterized by their mean, optionally capped by max
+
+The schedule is drawn from a seeded generator, so the same seed always gives the same
+flows whatever the run's timing. A Workload dispatches them as iperf '-n <bytes>'
+transfers through a TrafficEngine from a single coroutine on the engine's event loop,
+on absolute deadlines: thousands of short flows per minute need no thread per flow or
+pattern. Flows that would exceed max_active running flows are skipped and counted.
+
+Preview of a schedule without a network:
+    python3 workload.py --rate 50 --size pareto,mean=200K,alpha=1.3 --pairs h3:h6,h4:h5:2 --seconds 60
+"""
+
+import argparse
+import asyncio
+import csv
+import itertools
+import math
+import random
+import time
+
+from mininet.log import info
+from traffic_engine import iperf_client_argv
+
+# Suffixes of byte counts, as iperf reads them
+UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+SIZE_DISTRIBUTIONS = ('pareto', 'lognormal', 'fixed')
+ARRIVAL_FIELDS = ['scheduled', 'actual', 'src', 'dst', 'bytes', 'flow']
+
+
+def parse_bytes(text):
+    """Converting a byte count such as '200K' or '50M' to bytes."""
+    text = str(text).strip().upper()
+    unit = text[-1] if text and text[-1] in UNITS else ''
+    return int(float(text[:len(text) - len(unit)]) * UNITS[unit])
+
+
+def parse_size(text):
+    """
+    Parsing a size distribution, e.g. 'pareto,mean=200K,alpha=1.3', 'lognormal,mean=1M,sigma=1.5',
+    'fixed,mean=50M'. Byte values take K/M/G suffixes.
+
+    Returns:
+        dict: The distribution name under 'dist' and its parameters.
+    """
+    name, *params = text.split(',')
+    if name not in SIZE_DISTRIBUTIONS:
+        raise ValueError(f'Unknown size distribution {name!r} (one of {", ".join(SIZE_DISTRIBUTIONS)})')
+    size = {'dist': name}
+    for param in params:
+        key, value = param.split('=')
+        size[key] = parse_bytes(value) if key in ('mean', 'max', 'min') else float(value)
+    if 'mean' not in size:
+        raise ValueError(f'The size distribution {text!r} needs a mean')
+    return size
+
+
+def parse_pairs(text):
+    """Parsing a traffic matrix 'src:dst[:weight],...' into (src, dst, weight) tuples."""
+    pairs = []
+    for entry in text.split(','):
+        src, dst, *weight = entry.split(':')
+        pairs.append((src, dst, float(weight[0]) if weight else 1.0))
+    return pairs
+
+
+def size_sampler(size):
+    """
+    Returning a function drawing one flow size in bytes from a random.Random.
+
+    Pareto sizes have scale mean * (alpha - 1) / alpha, so their mean is the given one
+    (alpha > 1); lognormal sizes have mu = ln(mean) - sigma^2 / 2 for the same reason.
+    """
+    mean = size['mean']
+    low = max(1, int(size.get('min', 1)))
+    high = size.get('max')
+    if size['dist'] == 'pareto':
+        alpha = size.get('alpha', 1.2)
+        if alpha <= 1:
+            raise ValueError('Pareto sizes need alpha > 1 to have a mean')
+        scale = mean * (alpha - 1) / alpha
+        draw = lambda rng: scale * rng.paretovariate(alpha)
+    elif size['dist'] == 'lognormal':
+        sigma = size.get('sigma', 1.0)
+        mu = math.log(mean) - sigma ** 2 / 2
+        draw = lambda rng: rng.lognormvariate(mu, sigma)
+    else:
+        draw = lambda rng: mean
+
+    def sample(rng):
+        value = draw(rng)
+        if high is not None:
+            value = min(value, high)
+        return max(low, int(value))
+
+    return sample
+
+
+def poisson_arrivals(rate, pairs, size, seed=None):
+    """
+    Generating an endless flow schedule: Poisson arrivals at rate flows per second, each
+    with a host pair drawn from the weighted matrix and a size drawn from the size
+    distribution (see parse_size()).
+
+    Yields:
+        tuple: (offset in seconds, src, dst, size in bytes)
+    """
+    if rate <= 0:
+        raise ValueError('The arrival rate has to be positive')
+    rng = random.Random(seed)
+    sample = size_sampler(size)
+    # Cumulative weights, so each pair is drawn with a bisection
+    cumulative = list(itertools.accumulate(weight for _, _, weight in pairs))
+    offset = 0.0
+    while True:
+        offset += rng.expovariate(rate)
+        src, dst, _ = rng.choices(pairs, cum_weights=cumulative)[0]
+        yield offset, src, dst, sample(rng)
+
+
+class Workload:
+    """
+    Dispatching a flow schedule as iperf transfers from one coroutine.
+
+    Args:
+        traffic (TrafficEngine): Engine the flows are started through (and whose loop runs
+            the dispatcher).
+        schedule (iterable): (offset, src, dst, bytes) tuples in offset order, e.g.
+            poisson_arrivals(); src and dst are host names.
+        hosts (dict): Host name -> Mininet host.
+        port (int): Port of the TCP iperf servers on the destinations.
+        max_active (int): Running workload flows at most; later arrivals are skipped.
+        on_flow (callable): on_flow(record) called on the loop for every dispatched flow.
+        seed: Seed of the schedule, recorded with the results.
+    """
+
+    def __init__(self, traffic, schedule, hosts, port=5002, max_active=500, on_flow=None, seed=None):
+        self.traffic = traffic
+        self.schedule = schedule
+        self.hosts = hosts
+        self.port = port
+        self.max_active = max_active
+        self.on_flow = on_flow
+        self.seed = seed
+        self.arrivals = []
+        self.active = 0
+        self.skipped = 0
+        self.late = 0
+        self.failed = 0
+        self.start_time = None
+        self._task = None
+
+    def start(self, delay=0.0):
+        """Starting the dispatcher on the traffic engine's loop; offsets count from now + delay."""
+        self.traffic.start()
+        self._task = self.traffic.submit(self._dispatch(delay))
+        return self
+
+    def stop(self):
+        """Stopping the dispatch of new flows; running flows are left to the traffic engine."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            info(f'*** Workload: {len(self.arrivals) - self.skipped - self.failed} flows started, '
+                 f'{self.skipped} skipped, {self.failed} failed, {self.late} late (seed {self.seed})\n')
+
+    async def _dispatch(self, delay):
+        loop = asyncio.get_running_loop()
+        start = loop.time() + delay
+        self.start_time = time.time() + delay
+        for offset, src, dst, size in self.schedule:
+            remaining = start + offset - loop.time()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+            elif remaining < -0.1:
+                self.late += 1
+            record = {'scheduled': offset, 'actual': loop.time() - start, 'src': src, 'dst': dst, 'bytes': size,
+                      'flow': None}
+            self.arrivals.append(record)
+            if self.active >= self.max_active:
+                self.skipped += 1
+                continue
+            self.active += 1
+            # Spawning in its own task, so a slow process start does not delay the next arrival
+            loop.create_task(self._launch(record))
+
+    async def _launch(self, record):
+        target = self.hosts[record['dst']].IP()
+        argv = iperf_client_argv(target, self.port, size=record['bytes'])
+        try:
+            record['flow'] = await self.traffic.spawn_flow(self.hosts[record['src']], argv, target=target,
+                                                           label=f"wl-{record['src']}-{record['dst']}")
+        except OSError:
+            # e.g. the host's namespaces are gone while the network shuts down
+            self.active -= 1
+            self.failed += 1
+            return
+        self.traffic.flows[record['flow']].done.add_done_callback(self._finished)
+        if self.on_flow is not None:
+            self.on_flow(record)
+
+    def _finished(self, _):
+        self.active -= 1
+
+    def write(self, path):
+        """Writing the arrivals (including the skipped ones, without a flow id) to a CSV file."""
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=ARRIVAL_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.arrivals)
+
+    def metadata(self):
+        return {'seed': self.seed, 'start_time': self.start_time, 'arrivals': len(self.arrivals),
+                'skipped': self.skipped, 'failed': self.failed, 'late': self.late, 'max_active': self.max_active, 'port': self.port}
+
+
+def preview(schedule, seconds):
+    """Summarizing the first seconds of a schedule: flow count, offered load and size quantiles."""
+    flows = list(itertools.takewhile(lambda arrival: arrival[0] < seconds, schedule))
+    sizes = sorted(size for _, _, _, size in flows)
+    if not sizes:
+        return ['no flows']
+    pairs = {}
+    for _, src, dst, size in flows:
+        count, volume = pairs.get((src, dst), (0, 0))
+        pairs[(src, dst)] = (count + 1, volume + size)
+    quantile = lambda q: sizes[min(len(sizes) - 1, int(q * len(sizes)))]
+    lines = [f'{len(flows)} flows in {seconds:g} s ({len(flows) / seconds * 60:.0f} per minute), '
+             f'offered load {sum(sizes) * 8 / seconds / 1e6:.2f} Mbit/s',
+             f'sizes: median {quantile(0.5)} B, p90 {quantile(0.9)} B, p99 {quantile(0.99)} B, max {sizes[-1]} B']
+    for (src, dst), (count, volume) in sorted(pairs.items()):
+        lines.append(f'  {src} -> {dst}: {count} flows, {volume * 8 / seconds / 1e6:.2f} Mbit/s')
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Preview a stochastic cross-traffic schedule.')
+    parser.add_argument('--rate', type=float, default=1.0, help='Mean flow arrivals per second')
+    parser.add_argument('--size', default='pareto,mean=1M,alpha=1.2', help='Flow size distribution')
+    parser.add_argument('--pairs', default='h3:h6,h4:h5', help="Traffic matrix 'src:dst[:weight],...'")
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the schedule')
+    parser.add_argument('--seconds', type=float, default=60, help='Length of the previewed schedule')
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    print(f'seed {seed}')
+    schedule = poisson_arrivals(args.rate, parse_pairs(args.pairs), parse_size(args.size), seed)
+    print('\n'.join(preview(schedule, args.seconds)))